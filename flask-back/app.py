@@ -2,19 +2,18 @@
 # /usr/bin/python3 -> python3.11
 
 # sudo setcap cap_net_raw+ep /usr/bin/python3.11
-#python3 -m gunicorn --workers 3 --bind 0.0.0.0:2020 --certfile keycloak.crt --keyfile keycloak.key app:app
+# Production: python3 -m gunicorn -c gunicorn.conf.py   (gthread workers, TLS, see gunicorn.conf.py)
 
 from flask import Flask, request, jsonify, Response, stream_with_context, send_file,send_from_directory
 from werkzeug.utils import safe_join
+from werkzeug import formparser
+from werkzeug.wsgi import FileWrapper
 from flask_cors import CORS
 from datetime import datetime
-from scapy.all import ARP, Ether, srp
 from collections import deque, defaultdict
 from pathlib import Path
-import psutil
 import os
 import json
-import paramiko
 import re
 import subprocess
 import time
@@ -25,12 +24,66 @@ import netifaces
 import logging
 import socket
 import pathlib
-import openstack
 import shlex
 from typing import Optional
 import threading
 import uuid
 import zipfile
+import ctypes
+import select
+import signal
+import mmap
+import fcntl
+import bisect
+import hashlib
+import struct
+import io
+import sqlite3
+import shutil
+import multiprocessing
+import concurrent.futures
+import shared_state
+import metrics
+import commands
+import bundle_extract
+import node_agent
+import telemetry
+import rollups
+from node_agent import is_interface_up, is_network_available, is_ip_reachable
+from lazy_imports import LazyModule, lazy_import_times
+
+
+# ----- Lazy imports -----
+# scapy, openstacksdk, paramiko and psutil are only needed by some routes, and
+# scapy/openstack alone take a second or more and a lot of memory to import.
+# They are bound to proxies (see lazy_imports.py); warm_up_imports() loads them
+# in the background once the server is accepting connections.
+psutil = LazyModule("psutil")
+paramiko = LazyModule("paramiko")
+openstack = LazyModule("openstack")
+scapy = LazyModule("scapy.all")
+LAZY_MODULES = (psutil, paramiko, openstack, scapy)
+
+
+def warm_up_imports(port: Optional[int] = None, timeout: float = 60):
+    """Import the lazy modules in a background thread, after `port` accepts connections."""
+    def run():
+        deadline = time.time() + timeout
+        while port and time.time() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.5)
+        for module in LAZY_MODULES:
+            try:
+                module._load()
+            except Exception as e:
+                logging.warning("Warm-up import of %s failed: %s", module._name, e)
+        logging.info("Warm-up imports done: %s", lazy_import_times)
+
+    if os.environ.get("PINAKA_WARMUP_IMPORTS", "1") != "0":
+        threading.Thread(target=run, daemon=True).start()
 
 # SSH Configuration Constants
 SSH_CONFIG = {
@@ -43,6 +96,10 @@ SSH_CONFIG = {
     'allow_agent': False
 }
 
+metrics.describe("pinaka_ssh_seconds", "histogram",
+                 "SSH time per host and phase: connect (TCP), auth (handshake + key auth), exec")
+metrics.describe("pinaka_ssh_errors_total", "counter", "SSH failures per host and phase")
+
 def get_ssh_client(ip, custom_timeout=None):
     """
     Create a standardized SSH client connection with proper error handling.
@@ -73,17 +130,34 @@ def get_ssh_client(ip, custom_timeout=None):
         # Use custom timeout or default
         timeout = custom_timeout if custom_timeout else SSH_CONFIG['timeout']
         
+        # Open the TCP connection ourselves so connect and auth are timed separately
+        started = time.perf_counter()
+        try:
+            sock = socket.create_connection((ip, 22), timeout=timeout)
+        except Exception:
+            metrics.inc("pinaka_ssh_errors_total", host=ip, phase="connect")
+            raise
+        connected = time.perf_counter()
+        metrics.observe("pinaka_ssh_seconds", connected - started, host=ip, phase="connect")
+
         # Connect with standardized parameters
-        ssh.connect(
-            hostname=ip,
-            username=SSH_CONFIG['username'],
-            pkey=key,
-            timeout=timeout,
-            banner_timeout=SSH_CONFIG['banner_timeout'],
-            auth_timeout=SSH_CONFIG['auth_timeout'],
-            look_for_keys=SSH_CONFIG['look_for_keys'],
-            allow_agent=SSH_CONFIG['allow_agent']
-        )
+        try:
+            ssh.connect(
+                hostname=ip,
+                username=SSH_CONFIG['username'],
+                pkey=key,
+                timeout=timeout,
+                banner_timeout=SSH_CONFIG['banner_timeout'],
+                auth_timeout=SSH_CONFIG['auth_timeout'],
+                look_for_keys=SSH_CONFIG['look_for_keys'],
+                allow_agent=SSH_CONFIG['allow_agent'],
+                sock=sock
+            )
+        except Exception:
+            sock.close()
+            metrics.inc("pinaka_ssh_errors_total", host=ip, phase="auth")
+            raise
+        metrics.observe("pinaka_ssh_seconds", time.perf_counter() - connected, host=ip, phase="auth")
         
         return ssh, True, None
         
@@ -114,14 +188,16 @@ def execute_ssh_command(ip, command, timeout=30, custom_ssh_timeout=None):
         return False, "", error, -1
     
     try:
-        stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout)
-        exit_code = stdout.channel.recv_exit_status()
-        stdout_data = stdout.read().decode('utf-8', errors='ignore').strip()
-        stderr_data = stderr.read().decode('utf-8', errors='ignore').strip()
+        with metrics.timer("pinaka_ssh_seconds", host=ip, phase="exec"):
+            stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout)
+            exit_code = stdout.channel.recv_exit_status()
+            stdout_data = stdout.read().decode('utf-8', errors='ignore').strip()
+            stderr_data = stderr.read().decode('utf-8', errors='ignore').strip()
         
         return True, stdout_data, stderr_data, exit_code
         
     except Exception as e:
+        metrics.inc("pinaka_ssh_errors_total", host=ip, phase="exec")
         return False, "", f"Command execution failed: {str(e)}", -1
         
     finally:
@@ -132,42 +208,12 @@ def execute_ssh_command(ip, command, timeout=30, custom_ssh_timeout=None):
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
+metrics.install(app)
+# Host collectors shared with nodeapi.py (licensing, disks, interfaces, utilization, /node-facts)
+app.register_blueprint(node_agent.bp)
 
-# Store last 60 seconds of CPU, Memory, and Bandwidth usage
-timestamped_cpu_history = deque(maxlen=60)
-timestamped_memory_history = deque(maxlen=60)
-
-def add_cpu_history(cpu_percent):
-    # Ensure value is always 0–100, never fraction.
-    cpu_percent = float(cpu_percent)
-    if 0 < cpu_percent <= 1.5:  # Looks like a fraction
-        cpu_percent *= 100
-    timestamped_cpu_history.append({
-        "timestamp": int(time.time()),
-        "cpu": cpu_percent
-    })
-
-def add_memory_history(mem_percent):
-    mem_percent = float(mem_percent)
-    if 0 < mem_percent <= 1.5:
-        mem_percent *= 100
-    timestamped_memory_history.append({
-        "timestamp": int(time.time()),
-        "memory": mem_percent
-    })
-
-def get_cpu_history():
-    return list(timestamped_cpu_history)
 
-def get_memory_history():
-    return list(timestamped_memory_history)
-
-# Ceph data cache
-ceph_cache = {
-    "data": None,
-    "timestamp": 0,
-    "updating": False
-}
+# Ceph data cache; the summary itself lives in shared_state under CEPH_CACHE_KEY
 cache_expiry_seconds = 30  # Cache expires after 30 seconds
 
 # ------------------------------------------------ Server Validation Start --------------------------------------------
@@ -321,244 +367,9 @@ def validate():
 
 # ------------------------------------------------ Server Validation End --------------------------------------------
 
-# ------------------------------------------------ local Interface list Start --------------------------------------------
-
-
-# Retrieves available network interfaces and CPU socket count from the system
-# Returns interface list and hardware information for network configuration
-@app.route("/get-interfaces", methods=["GET"])
-def get_interfaces():
-    # Initialize the interfaces list
-    interfaces = []
-
-    interfaces = get_available_interfaces()
-
-    # Fetch the number of CPU sockets (physical CPUs)
-    cpu_sockets = get_cpu_socket_count()
-
-    # Include the number of CPU sockets in the response
-    response = {"interfaces": interfaces, "cpu_sockets": cpu_sockets}
-
-    return jsonify(response)
-
-
-# Function to get the CPU socket count
-def get_cpu_socket_count():
-    try:
-        if os.path.exists("/proc/cpuinfo"):
-            with open("/proc/cpuinfo", "r") as cpuinfo:
-                sockets = set()
-                for line in cpuinfo:
-                    if line.startswith("physical id"):
-                        sockets.add(line.split(":")[1].strip())
-                return len(sockets)
-        else:
-            print("This script is designed to work on Linux systems.")
-            return None
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
-
-
-# ------------------------------------------------ local Interface list End --------------------------------------------
-
-# ------------------------------------------------ Encryption code run Start --------------------------------------------
-
-
-# @app.route("/trigger-program", methods=["POST"])
-def trigger_program():
-    try:
-        result = subprocess.run(
-            ["python3", "encrypt.py"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        return {"success": True, "output": result.stdout}
-    except subprocess.CalledProcessError as e:
-        return {"success": False, "message": e.stderr}
-    except Exception as e:
-        return {"success": False, "message": str(e)}
-
-
-# ------------------------------------------------ Encryption code run End --------------------------------------------
-
-
-# ------------------------------------------------ Validate License Start --------------------------------------------
-# Function to decrypt a code (lookup MAC address, key, and key type)
-def decrypt_code(code, lookup_table):
-    return lookup_table.get(code, None)  # Return the entire record or None
-
-
-# Load a JSON file and handle errors
-def load_json_file(file_path):
-    try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: {file_path} file not found!")
-    except json.JSONDecodeError:
-        print(f"Error: Failed to decode {file_path}. Ensure it is a valid JSON.")
-    return {}
-
-
-# Check if the MAC address is available on the system
-def is_mac_address_available(mac_address):
-    try:
-        result = subprocess.run(["ip", "link"], capture_output=True, text=True)
-        return mac_address.lower() in result.stdout.lower()
-    except Exception as e:
-        print(f"Error checking MAC address: {e}")
-        return False
-
-
-# Function to remove specified files
-def remove_files():
-    files_to_remove = [
-        "lookup_table.json",
-        "perpetual_keys.json",
-        "trial_keys.json",
-        "yearly_keys.json",
-        "triennial_keys.json",
-    ]
-    for file in files_to_remove:
-        try:
-            if os.path.exists(file):
-                os.remove(file)
-            # print(f"Removed: {file}")
-            else:
-                print(f"File not found: {file}")
-        except Exception as e:
-            print(f"Error removing file {file}: {e}")
-
-
-# Function to export the license period based on the key type
-def export_license_period(key_type):
-    period = None
-    if key_type == "trial":
-        period = 15  # 15 days for trial
-    elif key_type == "yearly":
-        period = 365  # 365 days for yearly
-    elif key_type == "triennial":
-        period = 1095  # 1095 days for triennial
-    elif key_type == "perpetual":
-        period = "null"  # No export for perpetual, it's permanent
-
-    return period
 
 
-# Validates and decrypts license codes using MAC address and socket count verification
-# Returns license details including type, period, and validation status
-@app.route("/decrypt-code", methods=["POST"])
-def decrypt_code_endpoint():
 
-    encrypt_result = trigger_program()
-
-    if not encrypt_result["success"]:
-        return jsonify(encrypt_result), 500 
-        
-    data = request.get_json()
-
-    if not data or "encrypted_code" not in data:
-        return jsonify({"success": False, "message": "Encrypted code is required"}), 400
-
-    encrypted_code = data["encrypted_code"]
-    lookup_table = load_json_file("lookup_table.json")
-    keys = load_json_file("key.json")
-
-    # Get the CPU socket count
-    socket_count_in = get_cpu_socket_count()
-    if socket_count_in is None:
-        return (
-            jsonify(
-                {"success": False, "message": "Unable to retrieve CPU socket count"}
-            ),
-            500,
-        )
-
-    # Attempt to decrypt the provided code
-    decrypted_data = decrypt_code(encrypted_code, lookup_table)
-
-    if decrypted_data is None:
-        return (
-            jsonify(
-                {"success": False, "message": "Decryption failed, data mismatched!"}
-            ),
-            400,
-        )
-
-    mac_address = decrypted_data.get("mac_address")
-    provided_key = decrypted_data.get("key")
-    socket_count = decrypted_data.get("socket_count")
-    license_type = decrypted_data.get(
-        "licensePeriod"
-    )  # Assuming `licensePeriod` contains the license type
-
-    # Check if the MAC address is available on the system
-    if not is_mac_address_available(mac_address):
-        return (
-            jsonify(
-                {"success": False, "message": "MAC address not found on the system"}
-            ),
-            404,
-        )
-
-    if int(socket_count) != int(socket_count_in):
-        return (
-            jsonify({"success": False, "message": "Mismatching in Socket Count"}),
-            400,
-        )
-
-    if not decrypted_data:
-        return jsonify({"success": False, "message": "Code not found!"}), 404
-
-    # Path to the license.txt file
-   #license_file_path = "/home/pinakasupport/Pinaka-ZTi-v1.5/flask-back/license/license.txt"
-
-    # Check if the license code already exists in the license.txt file
-    if check_license_used(license_file_path, encrypted_code):
-        return jsonify({"success": False, "message": "Code already used"}), 400
-
-    # Verify the provided key against key.json and identify the key type
-    key_type = next(
-        (ktype for ktype, kvalue in keys.items() if kvalue == provided_key), None
-    )
-
-    if key_type:
-        # Get the license period based on the key type
-        license_period = export_license_period(key_type)
-
-        remove_files()
-
-        # Send response to frontend
-        return jsonify(
-            {
-                "success": True,
-                "mac_address": mac_address,
-                "key_type": key_type,
-                "license_period": license_period if license_period else "1",
-                "socket_count": socket_count,
-            }
-        )
-    else:
-        return jsonify({"success": False, "message": "Invalid key provided"}), 404
-
-
-# Helper function to check if the license code is already used
-def check_license_used(file_path, license_code):
-    try:
-        if os.path.exists(file_path):
-            with open(file_path, "r") as file:
-                used_codes = file.readlines()
-                return any(license_code.strip() == line.strip() for line in used_codes)
-        return False
-    except Exception as e:
-        app.logger.error(f"Error checking license code in {file_path}: {e}")
-        return False
-
-
-
-# ------------------------------------------------ Validate License End --------------------------------------------
 
 
 # ------------------------------------------------- Save and validate deploy config start----------------------------    
@@ -845,57 +656,6 @@ def submit_network_config():
         return jsonify({"success": False, "message": f"Bad Request: {str(e)}"}), 400
 
 
-def is_interface_up(interface):
-    """Check if the given network interface is up. If not, attempt to bring it up."""
-    # Skip checking interfaces that start with "enx"
-    if interface.startswith("enx"):
-        return True
-    
-    try:
-        result = subprocess.run(
-            ["ip", "link", "show", interface],
-            stdout=subprocess.PIPE,
-            universal_newlines=True,
-        )
-
-        if "state UP" in result.stdout:
-            return True  # Interface is already up
-
-        print(f"Interface {interface} is down. Attempting to bring it up...")
-
-        subprocess.run(["sudo", "ip", "link", "set", interface, "up"], check=False)
-        subprocess.run(["sudo", "systemctl", "restart", "networking"], check=False)
-        time.sleep(10)
-
-        result = subprocess.run(
-            ["ip", "link", "show", interface],
-            stdout=subprocess.PIPE,
-            universal_newlines=True,
-        )
-        if "state UP" in result.stdout:
-            return True
-
-        print(f"Retrying with ifconfig for {interface}...")
-        subprocess.run(["sudo", "ifconfig", interface, "up"], check=False)
-        subprocess.run(["sudo", "systemctl", "restart", "networking"], check=False)
-        time.sleep(10)
-
-        result = subprocess.run(
-            ["ip", "link", "show", interface],
-            stdout=subprocess.PIPE,
-            universal_newlines=True,
-        )
-        if "state UP" in result.stdout:
-            return True
-
-        print(f"Error: Interface {interface} is still down after multiple attempts.")
-        return False
-
-    except Exception as e:
-        print(f"Error checking interface {interface}: {e}")
-        return False
-
-
 # Checks if a Virtual IP (VIP) address is available and not already in use
 # Validates IP format and performs network reachability tests
 @app.route('/is-vip-available', methods=['GET'])
@@ -921,62 +681,6 @@ def is_vip_available_api():
     return jsonify({"success": True, "message": "VIP is available"}), 200
 
 
-
-def is_network_available(ip):
-    try:
-        subnet = ".".join(ip.split(".")[:3])
-        interfaces = psutil.net_if_addrs()
-
-        for interface, addresses in interfaces.items():
-            for addr in addresses:
-                if addr.family.name == "AF_INET":
-                    local_ip = addr.address
-                    local_subnet = ".".join(local_ip.split(".")[:3])
-                    if local_ip == ip:
-                        # It's the host's own IP, so it's fine
-                        return True
-                    if local_subnet == subnet:
-                        # Same subnet, but not the same IP → we need to ping
-                        result = subprocess.run(
-                            ["ping", "-c", "1", "-W", "1", ip],
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL
-                        )
-                        return result.returncode != 0  # True if IP is not reachable (i.e., available)
-        
-        # If no local interface in subnet
-        print(f"Error: No network interface available in the subnet {subnet}.")
-        return False
-
-    except Exception as e:
-        print(f"Error checking network availability: {e}")
-        return False
-
-
-def is_ip_reachable(dns_ip, count=1, timeout=2):
-    """
-    Ping a DNS server IP to check if it's reachable.
-
-    Args:
-        dns_ip (str): The DNS IP address to check.
-        count (int): Number of ping packets to send.
-        timeout (int): Timeout per ping attempt in seconds.
-
-    Returns:
-        bool: True if reachable, False otherwise.
-    """
-    try:
-        result = subprocess.run(
-            ["ping", "-c", str(count), "-W", str(timeout), dns_ip],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-        return result.returncode == 0
-    except Exception as e:
-        print(f"Error pinging DNS {dns_ip}: {e}")
-        return False
-
-
 def is_ip_assigned(ip):
     try:
         interfaces = psutil.net_if_addrs()
@@ -993,138 +697,10 @@ def is_ip_assigned(ip):
 # ------------------------------------------------- Save and validate deploy config end----------------------------
 
 
-# ------------------------------------------------GET DISK LIST FROM THE RUNNING SERVER Start-----------------------
-
-
-def get_root_disk():
-    """Find the root disk name."""
-    try:
-        result = subprocess.run(
-            ["lsblk", "-o", "NAME,MOUNTPOINT", "-J"], capture_output=True, text=True
-        )
-        data = json.loads(result.stdout)
-
-        for disk in data.get("blockdevices", []):
-            if "children" in disk:
-                for part in disk["children"]:
-                    if part.get("mountpoint") == "/":
-                        return disk["name"]  # Root disk name (e.g., "sda")
-
-        return None  # Return None if no root disk is found
-    except Exception as e:
-        return None
-
-
-def get_disk_list():
-    """Fetch disk list using lsblk and exclude the root disk."""
-    try:
-        # Get disk details including WWN
-        result = subprocess.run(
-            ["lsblk", "-o", "NAME,SIZE,WWN", "-J"], capture_output=True, text=True
-        )
-        disks = json.loads(result.stdout).get("blockdevices", [])
-
-        # Get the root disk name
-        root_disk = get_root_disk()
-
-        # Filter out small-sized disks (KB, MB) and the root disk
-        small_size_pattern = re.compile(r"\b(\d+(\.\d+)?)\s*(K|M)\b", re.IGNORECASE)
-        filtered_disks = [
-            {
-                "name": disk["name"],
-                "size": disk["size"],
-                "wwn": disk.get("wwn", "N/A"),  # Some disks may not have WWN
-            }
-            for disk in disks
-            if not small_size_pattern.search(disk["size"]) and disk["name"] != root_disk
-        ]
-
-        return filtered_disks
-    except Exception as e:
-        return str(e)
-
-
-# Retrieves list of available disks excluding the root disk and small partitions
-# Returns disk information including name, size, and WWN identifiers
-@app.route("/get-disks", methods=["GET"])
-def get_disks():
-    """API endpoint to get the list of available disks."""
-    disks = get_disk_list()
-    return jsonify({"disks": disks, "status": "success"})
-
-
-# ------------------------------------------------GET DISK LIST FROM THE RUNNING SERVER End-----------------------
 
 
 # ------------------- System Utilization Endpoint -------------------
-import psutil
-
-# Returns current CPU and memory utilization percentages and absolute values
-# Updates historical data buffers for trending and monitoring purposes
-@app.route('/system-utilization', methods=['GET'])
-def system_utilization():
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        mem = psutil.virtual_memory()
-        mem_percent = mem.percent
-        total_mem_mb = int(mem.total / (1024*1024))
-        used_mem_mb = int(mem.used / (1024*1024))
-        # Add to history buffers
-        add_cpu_history(cpu_percent)
-        add_memory_history(mem_percent)
-        return jsonify({
-            "cpu": cpu_percent,
-            "memory": mem_percent,
-            "total_memory": total_mem_mb,
-            "used_memory": used_mem_mb
-        })
-    except Exception as e:
-        # Always return all keys with safe values, plus error for debugging
-        return jsonify({
-            "cpu": 0,
-            "memory": 0,
-            "total_memory": 0,
-            "used_memory": 0,
-            "error": str(e)
-        }), 200
-
-# Returns historical CPU and memory utilization data from the last 60 samples
-# Provides time-series data for system performance monitoring and analysis
-@app.route('/system-utilization-history', methods=['GET'])
-def system_utilization_history():
-    try:
-        cpu_history = get_cpu_history()
-        memory_history = get_memory_history()
-        return jsonify({
-            "cpu_history": cpu_history,
-            "memory_history": memory_history
-        })
-    except Exception as e:
-        return jsonify({
-            "cpu_history": [],
-            "memory_history": [],
-            "error": str(e)
-        })
-def get_available_interfaces():
-    try:
-        interfaces = []
-        for iface in os.listdir("/sys/class/net/"):
-            # Ignore loopback
-            if iface == "lo":
-                continue
-            real_path = os.path.realpath(f"/sys/class/net/{iface}")
-            if "/devices/virtual/" not in real_path and os.path.exists(f"/sys/class/net/{iface}/device"):
-                interfaces.append(iface)
-        return interfaces
-    except Exception:
-        return []
 
-# Returns list of available network interfaces excluding virtual and loopback interfaces
-# Provides interface names for network configuration and management
-@app.route("/interfaces", methods=["GET"])
-def interfaces():
-    iface_list = get_available_interfaces()
-    return jsonify([{"label": iface, "value": iface} for iface in iface_list])
 
 # Detailed interfaces endpoint: status, IPv4 addresses, and bond membership
 @app.route('/interfaces-detail', methods=['GET'])
@@ -1210,303 +786,6 @@ def interfaces_detail():
     except Exception as e:
         return jsonify({'interfaces': [], 'error': str(e)}), 200
 
-# history of last 60 samples
-timestamped_bandwidth_history = deque(maxlen=60)
-
-# per-interface last sample (rx, tx, ts)
-last_bandwidth = defaultdict(lambda: {'rx': 0, 'tx': 0, 'timestamp': 0})
-
-def get_bandwidth_proc(interface):
-    try:
-        with open('/proc/net/dev', 'r') as f:
-            for line in f:
-                if ':' not in line:
-                    continue
-                name, rest = line.split(':', 1)
-                if name.strip() == interface:
-                    fields = rest.split()
-                    rx_bytes = int(fields)   # first receive field after colon
-                    tx_bytes = int(fields[10])   # ninth transmit field after colon
-                    return rx_bytes, tx_bytes
-        return None, None
-    except Exception:
-        return None, None
-
-# Optionally prefer /sys (slightly simpler, one file per counter)
-def get_bandwidth_sys(interface):
-    try:
-        with open(f'/sys/class/net/{interface}/statistics/rx_bytes', 'r') as f:
-            rx = int(f.read().strip())
-        with open(f'/sys/class/net/{interface}/statistics/tx_bytes', 'r') as f:
-            tx = int(f.read().strip())
-        return rx, tx
-    except Exception:
-        return None, None
-
-# choose one reader; /sys is often the cleanest
-get_bandwidth = get_bandwidth_sys  # or get_bandwidth_proc
-
-def get_latency(host="8.8.8.8", count=3):
-    try:
-        output = subprocess.check_output(["ping", "-c", str(count), host], stderr=subprocess.DEVNULL).decode()
-        match = re.search(r"min/avg/max/(?:mdev|stddev) = [\d\.]+/([\d\.]+)/", output)
-        if match:
-            return float(match.group(1))
-    except Exception:
-        pass
-    return None
-
-def sample_rates(interface, interval_sec=1):
-    # one-shot sampler: get delta over interval_sec
-    rx1, tx1 = get_bandwidth(interface)
-    if rx1 is None or tx1 is None:
-        return None, None
-    time.sleep(interval_sec)
-    rx2, tx2 = get_bandwidth(interface)
-    if rx2 is None or tx2 is None:
-        return None, None
-    rx_kbps = (rx2 - rx1) / 1024.0 / interval_sec
-    tx_kbps = (tx2 - tx1) / 1024.0 / interval_sec
-    return rx_kbps, tx_kbps
-
-def add_bandwidth_history(interface):
-    rx, tx = get_bandwidth(interface)
-    now = int(time.time())
-    if rx is None or tx is None:
-        return
-    last = last_bandwidth[interface]
-    if last['timestamp'] == 0:
-        last_bandwidth[interface] = {'rx': rx, 'tx': tx, 'timestamp': now}
-        return
-    elapsed = now - last['timestamp']
-    if elapsed <= 0:
-        return
-    rx_kbps = (rx - last['rx']) / 1024.0 / elapsed
-    tx_kbps = (tx - last['tx']) / 1024.0 / elapsed
-    timestamped_bandwidth_history.append({
-        "timestamp": now,
-        "rx_kbps": round(rx_kbps, 2),
-        "tx_kbps": round(tx_kbps, 2),
-        "interface": interface
-    })
-    last_bandwidth[interface] = {'rx': rx, 'tx': tx, 'timestamp': now}
-
-def get_bandwidth_history():
-    return list(timestamped_bandwidth_history)
-
-# Monitors network health by measuring bandwidth usage and latency for specified interface
-# Returns real-time network performance metrics including throughput and ping times
-@app.route("/network-health", methods=["GET"])
-def network_health():
-    interfaces = get_available_interfaces()
-    interface = request.args.get("interface")
-    if not interface:
-        if interfaces:
-            interface = interfaces  # pick first available
-        else:
-            return jsonify({"error": "No network interfaces available"}), 500
-
-    ping_host = request.args.get("ping_host", "8.8.8.8")
-
-    rx_kbps, tx_kbps = sample_rates(interface, interval_sec=1)
-    if rx_kbps is None or tx_kbps is None:
-        return jsonify({"error": f"Failed to read bandwidth data for interface {interface}"}), 500
-
-    latency_ms = get_latency(ping_host)
-
-    add_bandwidth_history(interface)
-
-    return jsonify({
-        "time": time.strftime("%H:%M"),
-        "rx_kbps": round(rx_kbps, 2),
-        "tx_kbps": round(tx_kbps, 2),
-        "total_kbps": round(rx_kbps + tx_kbps, 2),
-        "latency_ms": round(latency_ms, 2) if latency_ms is not None else None,
-        "interface": interface
-    })
-
-# Returns historical bandwidth usage data for network interfaces over time
-# Provides network traffic analysis and trending information for capacity planning
-@app.route('/bandwidth-history', methods=['GET'])
-def bandwidth_history():
-    interface = request.args.get('interface')
-    if not interface:
-        interfaces = get_available_interfaces()
-        if interfaces:
-            interface = interfaces
-        else:
-            return jsonify({"bandwidth_history": [], "error": "No interfaces available"})
-    add_bandwidth_history(interface)
-    return jsonify({"bandwidth_history": get_bandwidth_history()})
-
-# Thresholds for health levels
-CPU_WARNING = 80
-CPU_CRITICAL = 90
-MEM_WARNING = 70
-MEM_CRITICAL = 85
-DISK_WARNING = 80
-DISK_CRITICAL = 90
-
-def get_local_health_status():
-    try:
-        # CPU usage (average over 1 second)
-        cpu_usage = psutil.cpu_percent(interval=1)
-
-        # Memory usage
-        mem = psutil.virtual_memory()
-        mem_usage = mem.percent
-
-        # Disk usage
-        disk = psutil.disk_usage('/')
-        disk_usage = disk.percent
-
-        # Determine status
-        status = "Good"
-        if cpu_usage > CPU_CRITICAL or mem_usage > MEM_CRITICAL or disk_usage > DISK_CRITICAL:
-            status = "Critical"
-        elif cpu_usage > CPU_WARNING or mem_usage > MEM_WARNING or disk_usage > DISK_WARNING:
-            status = "Warning"
-
-        # Build reasons per metric
-        reasons = []
-        if cpu_usage > CPU_CRITICAL:
-            reasons.append({"metric": "CPU", "level": "CRITICAL", "actual": round(cpu_usage, 2), "threshold": CPU_CRITICAL})
-        elif cpu_usage > CPU_WARNING:
-            reasons.append({"metric": "CPU", "level": "WARNING", "actual": round(cpu_usage, 2), "threshold": CPU_WARNING})
-
-        if mem_usage > MEM_CRITICAL:
-            reasons.append({"metric": "Memory", "level": "CRITICAL", "actual": round(mem_usage, 2), "threshold": MEM_CRITICAL})
-        elif mem_usage > MEM_WARNING:
-            reasons.append({"metric": "Memory", "level": "WARNING", "actual": round(mem_usage, 2), "threshold": MEM_WARNING})
-
-        if disk_usage > DISK_CRITICAL:
-            reasons.append({"metric": "Disk", "level": "CRITICAL", "actual": round(disk_usage, 2), "threshold": DISK_CRITICAL})
-        elif disk_usage > DISK_WARNING:
-            reasons.append({"metric": "Disk", "level": "WARNING", "actual": round(disk_usage, 2), "threshold": DISK_WARNING})
-
-        return {
-            "status": status,
-            "metrics": {
-                "cpu_usage_percent": round(cpu_usage, 2),
-                "memory_usage_percent": round(mem_usage, 2),
-                "disk_usage_percent": round(disk_usage, 2)
-            },
-            "thresholds": {
-                "cpu": {"warning": CPU_WARNING, "critical": CPU_CRITICAL},
-                "memory": {"warning": MEM_WARNING, "critical": MEM_CRITICAL},
-                "disk": {"warning": DISK_WARNING, "critical": DISK_CRITICAL}
-            },
-            "reasons": reasons
-        }
-
-    except Exception as e:
-        return {"status": "Error", "message": str(e)}
-
-# Performs comprehensive system health check including CPU, memory, and disk usage
-# Returns health status with warning/critical thresholds and detailed metrics
-@app.route('/check-health', methods=['GET'])
-def check_health():
-    result = get_local_health_status()
-    return jsonify(result)
-
-# Returns detailed disk usage information for all partitions on the root disk
-# Provides storage capacity analysis including total, used space, and usage percentages
-@app.route('/disk-usage', methods=['GET'])
-def disk_usage():
-    """Return detailed disk usage for all mount points on the root disk.
-    Response shape:
-    {
-      "root_disk": "sda",
-      "partitions": [
-        {"mountpoint": "/", "device": "/dev/sda2", "fstype": "ext4", "total": 123456, "used": 1234, "percent": 12.3}
-      ]
-    }
-    """
-    try:
-        root_disk = get_root_disk()
-        partitions = []
-        if root_disk:
-            for part in psutil.disk_partitions(all=False):
-                try:
-                    # Consider only partitions that belong to the root disk
-                    if not part.device or not part.mountpoint:
-                        continue
-                    if f"/dev/{root_disk}" not in part.device:
-                        continue
-                    usage = psutil.disk_usage(part.mountpoint)
-                    partitions.append({
-                        "mountpoint": part.mountpoint,
-                        "device": part.device,
-                        "fstype": part.fstype,
-                        "total": int(usage.total),
-                        "used": int(usage.used),
-                        "percent": float(usage.percent),
-                    })
-                except Exception:
-                    # Ignore partitions that cannot be accessed
-                    continue
-            # Stable ordering
-            partitions.sort(key=lambda x: x.get("mountpoint", ""))
-        return jsonify({
-            "root_disk": root_disk,
-            "partitions": partitions
-        })
-    except Exception as e:
-        return jsonify({
-            "root_disk": None,
-            "partitions": [],
-            "error": str(e)
-        }), 200
-
-# Retrieves Docker container status and statistics from the local system
-# Returns container count, status (up/down), and detailed container information
-@app.route('/docker-info', methods=['GET'])
-def docker_info():
-    result = get_docker_info()
-    return jsonify(result)
-
-def get_docker_info():
-    containers = []
-    up_count = 0
-    down_count = 0
-    try:
-        # Get all containers (id, name, status)
-        cmd = [
-            'sudo','docker', 'ps', '-a', '--format', '{{.ID}}||{{.Names}}||{{.Status}}'
-        ]
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
-        for line in output.strip().split('\n'):
-            if not line.strip():
-                continue
-            parts = line.split('||')
-            if len(parts) != 3:
-                continue
-            docker_id, container_name, status_text = parts
-            # Consider "UP" if status starts with "Up", else "DOWN"
-            status = 'UP' if status_text.strip().lower().startswith('up') else 'DOWN'
-            if status == 'UP':
-                up_count += 1
-            else:
-                down_count += 1
-            containers.append({
-                'dockerId': docker_id,
-                'containerName': container_name,
-                'status': status
-            })
-        return {
-            'containers': containers,
-            'total': len(containers),
-            'up': up_count,
-            'down': down_count
-        }
-    except Exception as e:
-        return {
-            'containers': [],
-            'total': 0,
-            'up': 0,
-            'down': 0,
-            'error': str(e)
-        }
 
 # Checks SSH connectivity status of remote nodes using PEM key authentication
 # Returns node status (UP/DOWN) with detailed error information for troubleshooting
@@ -1585,68 +864,539 @@ def get_local_network_ip():
                     return link['addr']
     return None  # Return None if no suitable IP address is found
 
-# Function to get the network range (CIDR)
-def get_network_range(local_ip):
-    ip_interface = ipaddress.IPv4Interface(local_ip + '/24')  # Assuming /24 subnet
-    network = ip_interface.network
-    return network
-
-# Function to scan the network (ARP scan)
-def scan_network(network):
-    arp_request = ARP(pdst=str(network))
-    broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
-    arp_request_broadcast = broadcast / arp_request
-    answered_list = srp(arp_request_broadcast, timeout=5, retry=3, verbose=False)[0]  # Increased timeout and retries
-
-    active_nodes = []
-    for sent, received in answered_list:
-        node_info = {
-            'ip': received.psrc,
-            'mac': received.hwsrc,
-            'last_seen': datetime.now().strftime('%Y-%m-%d')
-        }
-        active_nodes.append(node_info)
-
-    return active_nodes
+# Interfaces that never carry a discoverable provisioning network
+VIRTUAL_INTERFACE_PREFIXES = ("lo", "docker", "veth", "virbr", "tap", "tun", "qvo", "qvb", "qbr",
+                              "vxlan", "genev", "ovs-system", "cni", "flannel", "cali", "kube")
+
+# Every IPv4 network on the local interfaces, with its real prefix length
+def get_local_networks():
+    networks = []
+    for interface in netifaces.interfaces():
+        if interface.startswith(VIRTUAL_INTERFACE_PREFIXES):
+            continue
+        for link in netifaces.ifaddresses(interface).get(netifaces.AF_INET, []):
+            if 'addr' not in link or link['addr'].startswith('127.'):
+                continue
+            try:
+                iface = ipaddress.IPv4Interface(f"{link['addr']}/{link.get('netmask') or '255.255.255.0'}")
+            except ValueError:
+                continue
+            networks.append((interface, iface))
+    return networks
 
-# Performs ARP network scan to discover active nodes in the specified subnet
-# Returns list of discovered devices with IP addresses, MAC addresses, and timestamps
-@app.route('/scan', methods=['GET'])
-def scan_network_api():
-    logging.info("Received scan request")
+# Function to get the network range (CIDR) of a local address, using its real netmask
+def get_network_range(local_ip):
+    for _, iface in get_local_networks():
+        if str(iface.ip) == local_ip:
+            return iface.network
+    ip_interface = ipaddress.IPv4Interface(local_ip + '/24')  # Unknown address: assume /24
+    return ip_interface.network
+
+# ----- Neighbor discovery -----
+# A background discovery service keeps a neighbor table keyed by MAC (IP,
+# vendor, interface, first/last seen), so a host found on several networks
+# or chunks is merged into one entry. Sweeps send ARP who-has requests at a
+# fixed rate while an AsyncSniffer collects replies (and any other ARP seen
+# on the wire) as they arrive; unanswered addresses are retried. Without a
+# subnet, every network on every local interface is swept in parallel with
+# its real prefix. Sweeps are single-flight per network, /scan answers from
+# the table immediately and /scan/stream pushes newly found hosts over SSE.
+# The table, the sweep records and the event feed live in shared_state, so
+# every gunicorn worker answers alike and a network is swept by one worker
+# at a time; each worker fans the feed out to its own SSE subscribers.
+DISCOVERY_RATE_PPS = 300          # ARP requests per second
+DISCOVERY_RETRIES = 2             # extra rounds for addresses that did not answer
+DISCOVERY_REPLY_WAIT = 2.0        # seconds to wait for replies after each round
+DISCOVERY_STALE_SECONDS = 120     # refresh in the background when the last sweep is older
+DISCOVERY_WAIT_SECONDS = 30       # max time /scan waits for a network's first sweep
+DISCOVERY_SUBSCRIBER_QUEUE = 1000
+DISCOVERY_CHUNK_PREFIX = 24       # larger networks are probed in /24 chunks in parallel
+DISCOVERY_MAX_SENDERS = 8         # concurrent chunk senders per sweep
+DISCOVERY_MAX_PREFIX = 16         # refuse to sweep anything larger than a /16
+DISCOVERY_POLL_SECONDS = 0.5      # how often waiters and the SSE feed look at shared_state
+DISCOVERY_EVENTS_MAXLEN = 5000
+NEIGHBOR_PREFIX = "neighbor:"                 # + mac -> entry
+DISCOVERY_SWEEP_PREFIX = "discovery_sweep:"   # + network -> sweep status (owned by "pid")
+DISCOVERY_EVENTS_RING = "discovery_events"    # [event, payload] for /scan/stream
+
+discovery_lock = threading.Lock()
+discovery_subscribers = []   # this worker's /scan/stream queues
+_discovery_feed_started = False
+
+
+def mac_vendor(mac: str) -> Optional[str]:
+    try:
+        _, vendor = scapy.conf.manufdb.lookup(mac)
+    except Exception:
+        return None
+    return vendor if vendor and vendor.lower() != mac.lower() else None
+
+
+def _neighbor_view(entry: dict) -> dict:
+    """Neighbor entry in the /scan response shape."""
+    return {
+        "ip": entry["ip"],
+        "mac": entry["mac"],
+        "vendor": entry["vendor"],
+        "interface": entry["interface"],
+        "first_seen_at": _utc_iso(entry["first_seen"]),
+        "last_seen_at": _utc_iso(entry["last_seen"]),
+        "last_seen": datetime.fromtimestamp(entry["last_seen"]).strftime('%Y-%m-%d'),
+    }
+
+
+def _discovery_publish(event: str, payload: dict):
+    shared_state.append(DISCOVERY_EVENTS_RING, [event, payload], DISCOVERY_EVENTS_MAXLEN)
+
+
+def _discovery_feed(cursor: int):
+    """Hand events from the shared ring (any worker's sweeps) to this worker's subscribers."""
+    while True:
+        time.sleep(DISCOVERY_POLL_SECONDS)
+        try:
+            events = shared_state.since(DISCOVERY_EVENTS_RING, cursor)
+        except Exception as e:
+            logging.warning("Discovery feed read failed: %s", e)
+            continue
+        if not events:
+            continue
+        cursor = events[-1][0]
+        with discovery_lock:
+            subscribers = list(discovery_subscribers)
+        for _, (event, payload) in events:
+            for sub in subscribers:
+                try:
+                    sub.put_nowait((event, payload))
+                except queue.Full:
+                    pass
+
+
+def record_neighbor(ip: str, mac: str, interface: Optional[str]):
+    """Insert/refresh a neighbor; new hosts and IP changes are pushed to subscribers."""
+    mac = mac.lower()
+    if mac in ("00:00:00:00:00:00", "ff:ff:ff:ff:ff:ff") or ip == "0.0.0.0":
+        return
+    # Vendor lookup may import scapy; keep it out of the write transaction
+    vendor = mac_vendor(mac) if shared_state.get(NEIGHBOR_PREFIX + mac) is None else None
+    now = time.time()
+    with shared_state.transaction():
+        entry = shared_state.get(NEIGHBOR_PREFIX + mac)
+        event = None
+        if entry is None:
+            entry = {"mac": mac, "ip": ip, "vendor": vendor, "interface": interface,
+                     "first_seen": now, "last_seen": now}
+            event = "node"
+        else:
+            if entry["ip"] != ip:
+                event = "node"
+            entry.update({"ip": ip, "last_seen": now, "interface": interface or entry["interface"]})
+        shared_state.set(NEIGHBOR_PREFIX + mac, entry)
+    if event:
+        _discovery_publish(event, _neighbor_view(entry))
+
+
+def _interface_for_network(network) -> Optional[str]:
+    """Name of the local interface with an address inside network, if any."""
+    for interface in netifaces.interfaces():
+        for link in netifaces.ifaddresses(interface).get(netifaces.AF_INET, []):
+            try:
+                if ipaddress.IPv4Address(link.get("addr", "")) in network:
+                    return interface
+            except ValueError:
+                continue
+    return None
+
+
+# ----- Kernel neighbor table -----
+# One RTM_GETNEIGH dump over netlink returns every IPv4 neighbor the kernel
+# knows with its NUD state; /proc/net/arp is the fallback (no state, so
+# complete entries count as reachable). Sweeps seed the table from it and
+# only probe addresses that are unknown (broadcast) or stale (unicast).
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NDA_DST = 1
+NDA_LLADDR = 2
+NLMSG_HEADER = struct.Struct("=IHHII")
+NDMSG = struct.Struct("=BBHiHBB")
+NUD_STATES = {0x01: "INCOMPLETE", 0x02: "REACHABLE", 0x04: "STALE", 0x08: "DELAY",
+              0x10: "PROBE", 0x20: "FAILED", 0x40: "NOARP", 0x80: "PERMANENT"}
+NEIGH_FRESH_STATES = ("REACHABLE", "PERMANENT")
+NEIGH_CACHED_STATES = ("STALE", "DELAY", "PROBE")
+
+
+def _netlink_neighbors() -> list:
+    entries = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+        sock.settimeout(2)
+        body = NDMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0)
+        flags = 0x01 | 0x300  # NLM_F_REQUEST | NLM_F_DUMP
+        sock.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(body), RTM_GETNEIGH, flags, 1, 0) + body)
+        while True:
+            data = sock.recv(65536)
+            off = 0
+            while off + NLMSG_HEADER.size <= len(data):
+                length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, off)
+                if msg_type == NLMSG_DONE:
+                    return entries
+                if msg_type == NLMSG_ERROR:
+                    raise OSError("RTM_GETNEIGH dump failed")
+                if msg_type == RTM_NEWNEIGH:
+                    _, _, _, ifindex, state, _, _ = NDMSG.unpack_from(data, off + NLMSG_HEADER.size)
+                    attrs = {}
+                    pos = off + NLMSG_HEADER.size + NDMSG.size
+                    while pos + 4 <= off + length:
+                        rta_len, rta_type = struct.unpack_from("=HH", data, pos)
+                        if rta_len < 4:
+                            break
+                        attrs[rta_type] = data[pos + 4:pos + rta_len]
+                        pos += (rta_len + 3) & ~3
+                    if NDA_DST in attrs and len(attrs.get(NDA_LLADDR, b"")) == 6:
+                        try:
+                            interface = socket.if_indextoname(ifindex)
+                        except OSError:
+                            interface = None
+                        entries.append({
+                            "ip": socket.inet_ntoa(attrs[NDA_DST]),
+                            "mac": ":".join(f"{b:02x}" for b in attrs[NDA_LLADDR]),
+                            "interface": interface,
+                            "state": next((n for bit, n in NUD_STATES.items() if state & bit), "NONE"),
+                        })
+                off += (length + 3) & ~3
+
+
+def _proc_arp_neighbors() -> list:
+    entries = []
+    with open("/proc/net/arp") as f:
+        next(f, None)
+        for line in f:
+            parts = line.split()
+            if len(parts) < 6:
+                continue
+            ip, _, flags, mac, _, device = parts[:6]
+            if int(flags, 16) & 0x2 and mac != "00:00:00:00:00:00":  # ATF_COM: entry is complete
+                entries.append({"ip": ip, "mac": mac.lower(), "interface": device,
+                                "state": "PERMANENT" if int(flags, 16) & 0x4 else "REACHABLE"})
+    return entries
+
+
+def kernel_neighbors() -> list:
+    """IPv4 neighbors from the kernel (netlink, else /proc/net/arp) with their NUD state."""
+    try:
+        return _netlink_neighbors()
+    except (OSError, AttributeError, struct.error):
+        try:
+            return _proc_arp_neighbors()
+        except OSError:
+            return []
+
+
+def seed_from_kernel(network) -> int:
+    """Record the kernel's fresh neighbors inside network; returns how many were seeded."""
+    seeded = 0
+    for n in kernel_neighbors():
+        if n["state"] in NEIGH_FRESH_STATES and ipaddress.IPv4Address(n["ip"]) in network:
+            record_neighbor(n["ip"], n["mac"], n["interface"])
+            seeded += 1
+    return seeded
+
+
+def _discovery_sweep(network, interface: Optional[str], sweep: dict):
+    local_ips = {link.get("addr") for i in netifaces.interfaces()
+                 for link in netifaces.ifaddresses(i).get(netifaces.AF_INET, [])}
+    # Large prefixes are split into /24 chunks that are probed concurrently,
+    # each by its own sender socket bound to the interface
+    if network.prefixlen < DISCOVERY_CHUNK_PREFIX:
+        chunks = list(network.subnets(new_prefix=DISCOVERY_CHUNK_PREFIX))
+    else:
+        chunks = [network]
+    hosts = set(network.hosts()) if network.num_addresses > 2 else set(network)
+    chunk_targets = [[str(ip) for ip in chunk if ip in hosts and str(ip) not in local_ips] for chunk in chunks]
+    total = sum(len(t) for t in chunk_targets)
+    pending = {ip for targets in chunk_targets for ip in targets}
+    interface = interface or scapy.conf.iface
+
+    # Seed from the kernel neighbor table: fresh entries need no probe (unless
+    # confirming), cached ones are checked with a unicast ARP to the known MAC
+    unicast = {}
+    for n in kernel_neighbors():
+        if n["ip"] not in pending:
+            continue
+        if n["state"] in NEIGH_FRESH_STATES and not sweep["confirm"]:
+            record_neighbor(n["ip"], n["mac"], n["interface"])
+            pending.discard(n["ip"])
+            sweep["from_kernel"] += 1
+        elif n["state"] in NEIGH_FRESH_STATES + NEIGH_CACHED_STATES:
+            unicast[n["ip"]] = n["mac"]
+    sweep["found"] = total - len(pending)
+    _save_sweep(str(network), sweep)
+    workers = max(1, min(len(chunks), DISCOVERY_MAX_SENDERS))
+    recorded = set()
+
+    def on_packet(pkt):
+        arp = pkt[scapy.ARP]
+        try:
+            in_network = ipaddress.IPv4Address(arp.psrc) in network
+        except ValueError:
+            return
+        if not in_network or arp.psrc in local_ips:
+            return
+        # Replies answer our probes; requests from other hosts reveal them too.
+        # One table write per host and address per sweep is enough.
+        if (arp.psrc, arp.hwsrc) not in recorded:
+            recorded.add((arp.psrc, arp.hwsrc))
+            record_neighbor(arp.psrc, arp.hwsrc, interface)
+        pending.discard(arp.psrc)
+        sweep["found"] = total - len(pending)
+
+    def probe_chunk(targets):
+        sock = scapy.conf.L2socket(iface=interface)
+        try:
+            for attempt in range(DISCOVERY_RETRIES + 1):
+                batch = [ip for ip in targets if ip in pending]
+                if not batch:
+                    break
+                # Cached MACs get one unicast probe; anything still silent falls back to broadcast
+                packets = [
+                    scapy.Ether(dst=unicast[ip]) / scapy.ARP(pdst=ip, hwdst=unicast[ip])
+                    if attempt == 0 and ip in unicast else
+                    scapy.Ether(dst="ff:ff:ff:ff:ff:ff") / scapy.ARP(pdst=ip)
+                    for ip in batch
+                ]
+                # The interface's rate budget is shared by its concurrent senders
+                scapy.sendp(packets, socket=sock, inter=workers / DISCOVERY_RATE_PPS, verbose=False)
+                with discovery_lock:
+                    sweep["sent"] += len(packets)
+                time.sleep(DISCOVERY_REPLY_WAIT)
+                _save_sweep(str(network), sweep)
+        finally:
+            sock.close()
+
+    # lfilter rather than a BPF filter string, which would need libpcap to compile
+    arp_layer = scapy.ARP
+    sniffer = scapy.AsyncSniffer(iface=interface, lfilter=lambda p: arp_layer in p, store=False, prn=on_packet)
+    sniffer.start()
+    time.sleep(0.2)  # let the capture socket come up before the first request
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(probe_chunk, t) for t in chunk_targets if t]:
+                future.result()
+    finally:
+        sniffer.stop()
+
+
+def _run_discovery(key: str, network, sweep: dict, interface: Optional[str]):
+    try:
+        _discovery_sweep(network, interface or _interface_for_network(network), sweep)
+        sweep["state"] = "completed"
+    except Exception as e:
+        logging.exception("Discovery sweep of %s failed: %s", key, e)
+        sweep.update({"state": "failed", "error": str(e)})
+    sweep["finished_at"] = time.time()
+    _save_sweep(key, sweep)
+    logging.info(f"Discovery sweep of {key} finished: {sweep['found']} hosts, {sweep['sent']} requests")
+    _discovery_publish("sweep", _sweep_view(key, sweep))
+
+
+def _sweep_view(key: str, sweep: Optional[dict]) -> dict:
+    if not sweep:
+        return {"subnet": key, "state": "never"}
+    return {
+        "subnet": key,
+        "state": sweep["state"],
+        "started_at": _utc_iso(sweep["started_at"]),
+        "finished_at": _utc_iso(sweep["finished_at"]) if sweep.get("finished_at") else None,
+        "sent": sweep["sent"],
+        "found": sweep["found"],
+        "from_kernel": sweep["from_kernel"],
+        "error": sweep.get("error"),
+    }
+
+
+def _save_sweep(key: str, sweep: dict):
+    """Publish the progress of a sweep this worker runs."""
+    with discovery_lock:
+        record = dict(sweep)
+    shared_state.set(DISCOVERY_SWEEP_PREFIX + key, record)
+
+
+def _sweep_running(sweep: Optional[dict]) -> bool:
+    """True for a sweep still in progress in a live worker (a dead worker's sweep is abandoned)."""
+    return bool(sweep) and sweep["state"] == "running" and shared_state.pid_alive(sweep.get("pid"))
+
+
+def start_discovery(network, force: bool = False, interface: Optional[str] = None, confirm: bool = False) -> dict:
+    """Start a sweep of network unless one is running (or fresh) in any worker; return its status."""
+    key = str(network)
+    with shared_state.transaction():
+        sweep = shared_state.get(DISCOVERY_SWEEP_PREFIX + key)
+        if sweep and (_sweep_running(sweep) or (
+                not force and sweep["state"] == "completed"
+                and time.time() - sweep["finished_at"] < DISCOVERY_STALE_SECONDS)):
+            return sweep
+        sweep = {"state": "running", "started_at": time.time(), "finished_at": None,
+                 "sent": 0, "found": 0, "from_kernel": 0, "confirm": confirm, "pid": os.getpid()}
+        shared_state.set(DISCOVERY_SWEEP_PREFIX + key, sweep)
+    _discovery_publish("sweep", _sweep_view(key, sweep))
+    threading.Thread(target=_run_discovery, args=(key, network, dict(sweep), interface), daemon=True).start()
+    return sweep
 
-    # Check if a subnet is provided in the query parameters
+
+def wait_for_sweep(key: str, timeout: float) -> Optional[dict]:
+    """Poll the shared sweep record until it is no longer running (or timeout); return it."""
+    deadline = time.time() + timeout
+    sweep = shared_state.get(DISCOVERY_SWEEP_PREFIX + key)
+    while _sweep_running(sweep) and time.time() < deadline:
+        time.sleep(DISCOVERY_POLL_SECONDS)
+        sweep = shared_state.get(DISCOVERY_SWEEP_PREFIX + key)
+    return sweep
+
+
+def neighbors_in(network, since: float = 0) -> list:
+    entries = [e for e, _ in shared_state.items(NEIGHBOR_PREFIX).values()
+               if e["last_seen"] >= since and ipaddress.IPv4Address(e["ip"]) in network]
+    return [_neighbor_view(e) for e in sorted(entries, key=lambda e: ipaddress.IPv4Address(e["ip"]))]
+
+
+def _scan_networks_from_request():
+    """
+    Resolve ?subnet= into [(interface, network)], or every local network when
+    no subnet is given. Returns (targets, local_ip, error_response).
+    """
     subnet = request.args.get('subnet')
     local_ip = get_local_network_ip()  # Ensure the local IP is retrieved before using it
-    
+
     if not local_ip:
         logging.error("Failed to retrieve local network IP address.")
-        return jsonify({"error": "Failed to retrieve local network IP address."}), 500
+        return None, None, (jsonify({"error": "Failed to retrieve local network IP address."}), 500)
 
     if subnet:
         try:
             # Validate and parse the subnet
             network = ipaddress.IPv4Network(subnet, strict=False)
-            logging.info(f"Scanning provided subnet: {network}")
         except ValueError:
             logging.error("Invalid subnet format provided.")
-            return jsonify({"error": "Invalid subnet format."}), 400
+            return None, None, (jsonify({"error": "Invalid subnet format."}), 400)
+        if network.prefixlen < DISCOVERY_MAX_PREFIX:
+            return None, None, (jsonify({"error": f"Subnets larger than /{DISCOVERY_MAX_PREFIX} are not scanned."}), 400)
+        targets = [(_interface_for_network(network), network)]
     else:
-        # Use the local network IP if no subnet is provided
-        network = get_network_range(local_ip)
-        logging.info(f"Scanning local network: {network}")
-    
-    # Perform the scan
-    active_nodes = scan_network(network)
-    logging.info(f"Scan completed. Found {len(active_nodes)} active nodes.")
+        # Every network on every local interface, deduplicated; an oversized one
+        # (docker, VPN, a /8 management net) is narrowed to the /DISCOVERY_MAX_PREFIX
+        # around this host's address on it instead of failing the whole scan
+        seen = {}
+        for interface, iface in get_local_networks():
+            network = iface.network
+            if network.prefixlen < DISCOVERY_MAX_PREFIX:
+                network = ipaddress.IPv4Interface(f"{iface.ip}/{DISCOVERY_MAX_PREFIX}").network
+                logging.warning("Network %s on %s is larger than /%d; scanning only %s",
+                                iface.network, interface, DISCOVERY_MAX_PREFIX, network)
+            seen.setdefault(network, interface)
+        targets = [(interface, network) for network, interface in seen.items()]
+
+    return targets, local_ip, None
+
+
+# Returns the discovered nodes of a subnet (default: all local networks) from the neighbor table
+# ?refresh=1 forces a new sweep, ?wait=1 waits for it, ?all=1 includes hosts missing from the last sweep,
+# ?confirm=1 re-probes (unicast) hosts the kernel already lists as reachable
+@app.route('/scan', methods=['GET'])
+def scan_network_api():
+    logging.info("Received scan request")
+    targets, local_ip, error = _scan_networks_from_request()
+    if error:
+        return error
+
+    refresh = request.args.get('refresh') in ('1', 'true', 'yes')
+    confirm = request.args.get('confirm') in ('1', 'true', 'yes')
+    wait = request.args.get('wait')
+    include_all = request.args.get('all') in ('1', 'true', 'yes')
+    sweeps = []
+    for interface, network in targets:
+        previous = shared_state.get(DISCOVERY_SWEEP_PREFIX + str(network))
+        # Never swept: answer from the kernel neighbor table if it knows this network
+        seeded = seed_from_kernel(network) if previous is None else 0
+        sweep = start_discovery(network, force=refresh, interface=interface, confirm=confirm)
+        sweeps.append((network, previous, sweep, seeded))
+
+    # A network with nothing to show yet waits for its first sweep
+    deadline = time.time() + DISCOVERY_WAIT_SECONDS
+    for i, (network, previous, sweep, seeded) in enumerate(sweeps):
+        if wait in ('1', 'true', 'yes') or (wait is None and previous is None and not seeded):
+            sweep = wait_for_sweep(str(network), max(deadline - time.time(), 0)) or sweep
+        else:
+            sweep = shared_state.get(DISCOVERY_SWEEP_PREFIX + str(network)) or sweep
+        sweeps[i] = (network, previous, sweep, seeded)
+
+    # Hosts seen since the last completed sweep started are the active ones; merged by MAC
+    merged = {}
+    for network, previous, sweep, _ in sweeps:
+        last = sweep if sweep["state"] != "running" else previous
+        since = 0 if include_all or not last else last["started_at"]
+        for node in neighbors_in(network, since):
+            merged[node["mac"]] = node
+    active_nodes = sorted(merged.values(), key=lambda n: ipaddress.IPv4Address(n["ip"]))
+    subnets = [str(network) for _, network in targets]
+    logging.info(f"Scan of {', '.join(subnets)}: {len(active_nodes)} active nodes.")
 
     # Return the results
     return jsonify({
         "active_nodes": active_nodes,
-        "subnet": str(network),
-        "local_ip": local_ip
+        "subnet": ", ".join(subnets),
+        "local_ip": local_ip,
+        "scans": [_sweep_view(str(network), sweep) for network, _, sweep, _ in sweeps],
     })
 
+
+# Provides Server-Sent Events (SSE) stream of newly discovered nodes and sweep progress
+# ?subnet= limits node events to one network; ?refresh=1 starts a sweep on connect
+@app.route('/scan/stream', methods=['GET'])
+def scan_stream():
+    global _discovery_feed_started
+    targets, _, error = _scan_networks_from_request()
+    if error:
+        return error
+    networks = [network for _, network in targets]
+    keys = {str(network) for network in networks}
+    if request.args.get('refresh') in ('1', 'true', 'yes'):
+        for interface, network in targets:
+            start_discovery(network, force=True, interface=interface)
+
+    sub = queue.Queue(maxsize=DISCOVERY_SUBSCRIBER_QUEUE)
+    with discovery_lock:
+        discovery_subscribers.append(sub)
+        if not _discovery_feed_started:
+            _discovery_feed_started = True
+            threading.Thread(target=_discovery_feed, args=(shared_state.last_seq(DISCOVERY_EVENTS_RING),),
+                             daemon=True).start()
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, payload = sub.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event == "node" and not any(ipaddress.IPv4Address(payload["ip"]) in n for n in networks):
+                    continue
+                if event == "sweep" and payload["subnet"] not in keys:
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            with discovery_lock:
+                if sub in discovery_subscribers:
+                    discovery_subscribers.remove(sub)
+
+    headers = {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # disable buffering on some proxies
+    }
+    return Response(stream_with_context(generate()), headers=headers)
+
 # ------------------- Scan Network Endpoint ends -------------------
 
 
@@ -1906,17 +1656,14 @@ def poll_ssh_status():
             
             if ok:
                 # Store success result in global variable with timestamp
-                import time
-                ssh_polling_results[ip] = {"status": "success", "ip": ip, "message": f"SSH successful to {ip}"}
-                ssh_polling_timestamps[ip] = time.time()
+                record_ssh_polling_result(ip, {"status": "success", "ip": ip, "message": f"SSH successful to {ip}"})
                 results[ip] = True
                 stop_flags[ip].set()
                 print(f"DEBUG: SSH SUCCESS for {ip}, stored result with timestamp")
                 break
             else:
                 # Store fail result temporarily (will be overwritten by next attempt)
-                ssh_polling_results[ip] = {"status": "fail", "ip": ip, "message": f"SSH failed to {ip}: {err}"}
-                ssh_polling_timestamps[ip] = time.time()
+                record_ssh_polling_result(ip, {"status": "fail", "ip": ip, "message": f"SSH failed to {ip}: {err}"})
                 print(f"DEBUG: SSH FAIL for {ip}, stored fail result")
             
             if poll_count < max_polls:
@@ -1924,8 +1671,7 @@ def poll_ssh_status():
         
         # If we've exceeded max polls, store timeout result
         if poll_count >= max_polls and not results[ip]:
-            ssh_polling_results[ip] = {"status": "timeout", "ip": ip, "message": f"SSH polling timeout for {ip} after {max_polls} attempts"}
-            ssh_polling_timestamps[ip] = time.time()
+            record_ssh_polling_result(ip, {"status": "timeout", "ip": ip, "message": f"SSH polling timeout for {ip} after {max_polls} attempts"})
             print(f"DEBUG: SSH TIMEOUT for {ip} after {max_polls} attempts")
 
     # Start polling threads after 90 seconds
@@ -1949,9 +1695,17 @@ def poll_ssh_status():
     
     return jsonify({"success": True, "message": f"SSH polling started for {len(ips)} IP(s). Will begin after 90 seconds."})
 
-# Global storage for SSH polling results with timestamp tracking
-ssh_polling_results = {}
-ssh_polling_timestamps = {}  # Track when results were stored
+# SSH polling results live in shared_state ("ssh_poll:<ip>") so that the worker
+# answering /ssh-polling-status sees results written by another worker's poller;
+# the row's updated_at is the time the result was stored.
+SSH_POLL_KEY_PREFIX = "ssh_poll:"
+
+def record_ssh_polling_result(ip, result):
+    shared_state.set(SSH_POLL_KEY_PREFIX + ip, result)
+
+def ssh_polling_results():
+    """Return {ip: (result, stored_at)} for every stored polling result."""
+    return shared_state.items(SSH_POLL_KEY_PREFIX)
 
 # One-shot SSH connectivity check (no background polling)
 @app.route('/check-ssh-status', methods=['GET'])
@@ -1987,13 +1741,7 @@ def check_ssh_status():
     ]
 
     try:
-        proc = subprocess.run(
-            ssh_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=CONNECT_TIMEOUT + 5,
-            text=True,
-        )
+        proc = commands.run(ssh_cmd, timeout=CONNECT_TIMEOUT + 5)
         if proc.returncode == 0:
             print(f"DEBUG: SSH SUCCESS to {ip}")
             return jsonify({
@@ -2054,12 +1802,9 @@ def cleanup_ssh_results():
     cleaned_ips = []
     
     # Clean up results older than 5 minutes
-    for ip in list(ssh_polling_results.keys()):
-        result_time = ssh_polling_timestamps.get(ip, 0)
+    for ip, (_, result_time) in ssh_polling_results().items():
         if current_time - result_time > 300:  # 5 minutes
-            del ssh_polling_results[ip]
-            if ip in ssh_polling_timestamps:
-                del ssh_polling_timestamps[ip]
+            shared_state.delete(SSH_POLL_KEY_PREFIX + ip)
             cleaned_ips.append(ip)
     
     print(f"DEBUG: Cleaned up SSH results for IPs: {cleaned_ips}")
@@ -2080,8 +1825,7 @@ def ssh_polling_status():
     current_time = time.time()
     
     status_info = {}
-    for ip, result in ssh_polling_results.items():
-        result_time = ssh_polling_timestamps.get(ip, 0)
+    for ip, (result, result_time) in ssh_polling_results().items():
         age_seconds = current_time - result_time
         status_info[ip] = {
             'result': result,
@@ -2095,7 +1839,6 @@ def ssh_polling_status():
     })
 
 
-
 # Checks deployment progress status by looking for deployment marker files
 # Returns whether deployment is currently in progress or has completed
 @app.route('/node-deployment-progress', methods=['GET'])
@@ -2435,40 +2178,480 @@ def docker_control():
 #--------------------------------------------Docker Remote Control End-------------------------------------------
 
 #--------------------------------------------Openstack Operation Start-------------------------------------------
+# ----- OpenStack inventory cache -----
+# Servers, volumes, hypervisors and service agents are kept in memory and
+# refreshed by a background thread. Servers and volumes are refreshed
+# incrementally (Nova changes-since / Cinder updated_at filters); a periodic
+# full resync drops volumes that were deleted, which delta queries never report.
+# Only the worker holding INVENTORY_REFRESH_LEASE talks to OpenStack; it
+# publishes the result to shared_state and every worker rebuilds its local
+# tables and indexes from that snapshot when its version moves on.
+OPENSTACK_CLIENT_CONFIG = "/etc/kolla/clouds.yaml"
+OPENSTACK_CLOUD = "kolla-admin"
+CPU_ALLOCATION_RATIO = 4.0
+INVENTORY_REFRESH_SECONDS = 30
+INVENTORY_FULL_RESYNC_SECONDS = 600
+INVENTORY_DELTA_OVERLAP_SECONDS = 60  # re-read a small window to tolerate clock skew
+
+openstack_inventory = {
+    "servers": {},          # server id -> record
+    "volumes": {},          # volume id -> record
+    "hypervisors": {},      # hypervisor id -> record
+    "compute_services": [],
+    "network_agents": [],
+    "volume_services": [],
+    # index name -> key -> set(ids)
+    "server_index": {"project": defaultdict(set), "host": defaultdict(set), "status": defaultdict(set)},
+    "volume_index": {"project": defaultdict(set), "status": defaultdict(set)},
+    "last_full_sync": 0,
+    "last_delta_sync": 0,
+    "version": 0,
+    "error": None,
+}
+openstack_inventory_lock = threading.RLock()
+_openstack_conn = None
+_inventory_refresher_started = False
+# Initial load: one loader, other callers wait on the condition. After a failed
+# load the next attempt is delayed (doubling up to the max) instead of every
+# request retrying a full load back to back.
+INVENTORY_LOAD_WAIT_SECONDS = 120
+INVENTORY_RETRY_SECONDS = 5
+INVENTORY_RETRY_MAX_SECONDS = 300
+_inventory_load = {"loading": False, "failures": 0, "retry_at": 0.0}
+_inventory_load_cond = threading.Condition()
+INVENTORY_REFRESH_LEASE = "openstack_inventory_refresh"
+# A full load on a large cloud may take as long as a waiting reader allows
+INVENTORY_REFRESH_LEASE_SECONDS = INVENTORY_LOAD_WAIT_SECONDS + 30
+INVENTORY_KEY = "openstack_inventory"             # full snapshot
+INVENTORY_META_KEY = "openstack_inventory_meta"   # version and last error, cheap to poll
+INVENTORY_AGENT_TABLES = ("compute_services", "network_agents", "volume_services")
+metrics.describe("pinaka_openstack_refresh_seconds", "histogram", "OpenStack inventory refresh time (full or delta)")
+metrics.describe("pinaka_openstack_refresh_errors_total", "counter", "Failed OpenStack inventory refreshes")
+
+
+def get_openstack_connection():
+    """Return a shared openstacksdk connection, creating it on first use."""
+    global _openstack_conn
+    if _openstack_conn is None:
+        os.environ["OS_CLIENT_CONFIG_FILE"] = OPENSTACK_CLIENT_CONFIG
+        _openstack_conn = openstack.connect(cloud=OPENSTACK_CLOUD)
+    return _openstack_conn
+
+
+def _utc_iso(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+def _server_record(server) -> dict:
+    flavor = server.flavor or {}
+    return {
+        "id": server.id,
+        "name": server.name,
+        "project_id": server.project_id,
+        "host": server.compute_host or server.hypervisor_hostname,
+        "status": server.status,
+        "flavor": flavor.get("original_name") or flavor.get("name") or flavor.get("id"),
+        "vcpus": flavor.get("vcpus") or 0,
+        "ram_mb": flavor.get("ram") or 0,
+        "updated_at": server.updated_at,
+    }
+
+
+def _volume_record(volume) -> dict:
+    return {
+        "id": volume.id,
+        "name": volume.name,
+        "project_id": volume.project_id,
+        "host": volume.host,
+        "status": volume.status,
+        "size_gb": volume.size or 0,
+        "updated_at": volume.updated_at,
+    }
+
+
+def _hypervisor_record(hv: dict) -> dict:
+    service = hv.get("service") or {}
+    return {
+        "id": str(hv.get("id")),
+        "name": hv.get("hypervisor_hostname"),
+        "host": service.get("host") or hv.get("hypervisor_hostname"),
+        "state": hv.get("state"),
+        "status": hv.get("status"),
+        "vcpus": hv.get("vcpus", 0),
+        "vcpus_used": hv.get("vcpus_used", 0),
+        "memory_mb": hv.get("memory_mb", 0),
+        "memory_mb_used": hv.get("memory_mb_used", 0),
+        "running_vms": hv.get("running_vms", 0),
+    }
+
+
+def _index_drop(index: dict, table: dict, record_id: str, keys: dict):
+    old = table.pop(record_id, None)
+    if old is None:
+        return
+    for name, field in keys.items():
+        ids = index[name].get(old.get(field))
+        if ids is not None:
+            ids.discard(record_id)
+            if not ids:
+                del index[name][old.get(field)]
+
+
+def _index_put(index: dict, table: dict, record: dict, keys: dict):
+    """Insert/replace a record in table and keep the secondary indexes in step."""
+    _index_drop(index, table, record["id"], keys)
+    table[record["id"]] = record
+    for name, field in keys.items():
+        index[name][record.get(field)].add(record["id"])
+
+
+SERVER_INDEX_KEYS = {"project": "project_id", "host": "host", "status": "status"}
+VOLUME_INDEX_KEYS = {"project": "project_id", "status": "status"}
+
+
+def _fetch_agents(conn) -> dict:
+    """
+    Service/agent tables in the same column layout as `openstack ... list -f json`.
+    Each table is fetched on its own; one whose API fails is left out of the
+    result so the caller keeps its last good copy.
+    """
+    fetchers = {
+        "compute_services": lambda: [{
+            "ID": s.id,
+            "Binary": s.binary,
+            "Host": s.host,
+            "Zone": s.availability_zone,
+            "Status": s.status,
+            "State": s.state,
+            "Updated At": s.updated_at,
+        } for s in conn.compute.services()],
+        "network_agents": lambda: [{
+            "ID": a.id,
+            "Agent Type": a.agent_type,
+            "Host": a.host,
+            "Availability Zone": a.availability_zone,
+            "Alive": a.is_alive,
+            "State": a.is_admin_state_up,
+            "Binary": a.binary,
+        } for a in conn.network.agents()],
+        "volume_services": lambda: [{
+            "Binary": s.binary,
+            "Host": s.host,
+            "Zone": s.availability_zone,
+            "Status": getattr(s, "status", None),
+            "State": getattr(s, "state", None),
+            "Updated At": getattr(s, "updated_at", None),
+        } for s in conn.block_storage.services()],
+    }
+    tables = {}
+    for name, fetch in fetchers.items():
+        try:
+            tables[name] = fetch()
+        except Exception as e:
+            metrics.inc("pinaka_openstack_refresh_errors_total", mode=name)
+            logging.warning("OpenStack %s refresh failed, keeping the last list: %s", name, e)
+    return tables
+
+
+def _clear_openstack_inventory(inv: dict):
+    inv["servers"].clear()
+    inv["volumes"].clear()
+    for index in (inv["server_index"], inv["volume_index"]):
+        for table in index.values():
+            table.clear()
+
+
+def _publish_openstack_inventory(error: Optional[str] = None):
+    """
+    Write this worker's inventory to shared_state as the next version, or only
+    record the error of a failed refresh. Caller holds INVENTORY_REFRESH_LEASE.
+    """
+    with shared_state.transaction():
+        meta = shared_state.get(INVENTORY_META_KEY) or {"version": 0}
+        if error is not None:
+            meta["error"] = error
+            shared_state.set(INVENTORY_META_KEY, meta)
+            return
+        with openstack_inventory_lock:
+            inv = openstack_inventory
+            inv["version"] = max(inv["version"], meta["version"] + 1)
+            snapshot = {
+                "servers": list(inv["servers"].values()),
+                "volumes": list(inv["volumes"].values()),
+                "hypervisors": list(inv["hypervisors"].values()),
+                "last_full_sync": inv["last_full_sync"],
+                "last_delta_sync": inv["last_delta_sync"],
+                "version": inv["version"],
+            }
+            for name in INVENTORY_AGENT_TABLES:
+                snapshot[name] = inv[name]
+        shared_state.set(INVENTORY_KEY, snapshot)
+        shared_state.set(INVENTORY_META_KEY, {"version": snapshot["version"], "error": None})
+
+
+def _adopt_openstack_inventory():
+    """Rebuild the local tables and indexes from the shared snapshot if its version moved on."""
+    meta = shared_state.get(INVENTORY_META_KEY)
+    if meta is None:
+        return
+    with openstack_inventory_lock:
+        openstack_inventory["error"] = meta.get("error")
+        if meta["version"] == openstack_inventory["version"]:
+            return
+    snapshot = shared_state.get(INVENTORY_KEY)
+    if snapshot is None:
+        return
+    with openstack_inventory_lock:
+        inv = openstack_inventory
+        _clear_openstack_inventory(inv)
+        for record in snapshot["servers"]:
+            _index_put(inv["server_index"], inv["servers"], record, SERVER_INDEX_KEYS)
+        for record in snapshot["volumes"]:
+            _index_put(inv["volume_index"], inv["volumes"], record, VOLUME_INDEX_KEYS)
+        inv["hypervisors"] = {r["id"]: r for r in snapshot["hypervisors"]}
+        for name in INVENTORY_AGENT_TABLES + ("last_full_sync", "last_delta_sync", "version"):
+            inv[name] = snapshot[name]
+
+
+def refresh_openstack_inventory(full: bool = False):
+    """
+    Refresh the in-memory inventory and publish it. API calls run outside the
+    lock; only the merge into the tables is serialized. Caller holds
+    INVENTORY_REFRESH_LEASE (see refresh_shared_openstack_inventory).
+    """
+    global _openstack_conn
+    started = time.time()
+    with openstack_inventory_lock:
+        last_delta = openstack_inventory["last_delta_sync"]
+        full = full or not openstack_inventory["last_full_sync"] or \
+            started - openstack_inventory["last_full_sync"] > INVENTORY_FULL_RESYNC_SECONDS
+
+    try:
+        conn = get_openstack_connection()
+        since = _utc_iso(last_delta - INVENTORY_DELTA_OVERLAP_SECONDS)
+
+        if full:
+            servers = list(conn.compute.servers(all_projects=True))
+            volumes = list(conn.block_storage.volumes(details=True, all_projects=True))
+        else:
+            # Nova also returns servers deleted since the marker (status DELETED)
+            servers = list(conn.compute.servers(all_projects=True, changes_since=since))
+            try:
+                volumes = list(conn.block_storage.volumes(
+                    details=True, all_projects=True, updated_at=f"gte:{since}"))
+            except Exception:
+                # Cinder older than 3.60 rejects time filters; fall back to a full list
+                volumes = list(conn.block_storage.volumes(details=True, all_projects=True))
+
+        # Hypervisor list is small; request it without a microversion so the
+        # legacy vcpus/memory fields are still present.
+        hypervisors = conn.compute.get("/os-hypervisors/detail").json().get("hypervisors", [])
+    except Exception as e:
+        _openstack_conn = None  # force re-auth on the next attempt
+        with openstack_inventory_lock:
+            openstack_inventory["error"] = str(e)
+        metrics.inc("pinaka_openstack_refresh_errors_total", mode="full" if full else "delta")
+        logging.warning("OpenStack inventory refresh failed: %s", e)
+        _publish_openstack_inventory(error=str(e))
+        return False
+    # Agent tables are best effort: a Neutron/Cinder outage must not hold back
+    # the server/hypervisor delta
+    agents = _fetch_agents(conn)
+
+    with openstack_inventory_lock:
+        inv = openstack_inventory
+        if full:
+            _clear_openstack_inventory(inv)
+
+        for server in servers:
+            if (server.status or "").upper() == "DELETED":
+                _index_drop(inv["server_index"], inv["servers"], server.id, SERVER_INDEX_KEYS)
+            else:
+                _index_put(inv["server_index"], inv["servers"], _server_record(server), SERVER_INDEX_KEYS)
+
+        for volume in volumes:
+            if volume.status == "deleting":
+                _index_drop(inv["volume_index"], inv["volumes"], volume.id, VOLUME_INDEX_KEYS)
+            else:
+                _index_put(inv["volume_index"], inv["volumes"], _volume_record(volume), VOLUME_INDEX_KEYS)
+
+        inv["hypervisors"] = {r["id"]: r for r in map(_hypervisor_record, hypervisors)}
+        inv.update(agents)
+        if full:
+            inv["last_full_sync"] = started
+        inv["last_delta_sync"] = started
+        inv["error"] = None
+    _publish_openstack_inventory()
+    metrics.observe("pinaka_openstack_refresh_seconds", time.time() - started, mode="full" if full else "delta")
+    return True
+
+
+def refresh_shared_openstack_inventory(wait: bool = False) -> bool:
+    """
+    Single-flight across workers: the holder of INVENTORY_REFRESH_LEASE
+    refreshes unless another worker did so within the interval; the others
+    adopt the shared snapshot, and with wait=True first wait for an in-flight
+    refresh to land. Returns True when inventory data is available.
+    """
+    if shared_state.acquire_lease(INVENTORY_REFRESH_LEASE, INVENTORY_REFRESH_LEASE_SECONDS):
+        try:
+            # Merge the delta onto the latest snapshot, whoever wrote it
+            _adopt_openstack_inventory()
+            if time.time() - openstack_inventory["last_delta_sync"] >= INVENTORY_REFRESH_SECONDS:
+                refresh_openstack_inventory()
+        finally:
+            shared_state.release_lease(INVENTORY_REFRESH_LEASE)
+    elif wait:
+        since = shared_state.get(INVENTORY_META_KEY)
+        deadline = time.time() + INVENTORY_LOAD_WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(0.5)
+            if (shared_state.get(INVENTORY_META_KEY) != since
+                    or not shared_state.lease_held(INVENTORY_REFRESH_LEASE)):
+                break
+    _adopt_openstack_inventory()
+    return bool(openstack_inventory["last_full_sync"])
+
+
+def _inventory_refresher():
+    while True:
+        time.sleep(INVENTORY_REFRESH_SECONDS)
+        try:
+            _adopt_openstack_inventory()
+            # Until the first load succeeds, ensure_openstack_inventory() owns retries and backoff
+            if not openstack_inventory["last_full_sync"]:
+                continue
+            refresh_shared_openstack_inventory()
+        except Exception as e:
+            logging.exception("OpenStack inventory refresher error: %s", e)
+
+
+def ensure_openstack_inventory() -> bool:
+    """
+    Make sure the inventory has been loaded at least once and that the
+    background refresher is running. Returns True when data is available.
+    """
+    global _inventory_refresher_started
+    with openstack_inventory_lock:
+        if not _inventory_refresher_started:
+            _inventory_refresher_started = True
+            threading.Thread(target=_inventory_refresher, daemon=True).start()
+    _adopt_openstack_inventory()
+    if openstack_inventory["last_full_sync"]:
+        metrics.inc("pinaka_cache_requests_total", cache="openstack", result="hit")
+        return True
+
+    # The initial full load runs outside openstack_inventory_lock, so readers
+    # are not queued behind a slow Keystone/Nova
+    with _inventory_load_cond:
+        if _inventory_load["loading"]:
+            _inventory_load_cond.wait_for(lambda: not _inventory_load["loading"], INVENTORY_LOAD_WAIT_SECONDS)
+            return bool(openstack_inventory["last_full_sync"])
+        if openstack_inventory["last_full_sync"]:
+            return True
+        if time.time() < _inventory_load["retry_at"]:
+            return False
+        _inventory_load["loading"] = True
+
+    metrics.inc("pinaka_cache_requests_total", cache="openstack", result="miss")
+    ok = False
+    try:
+        ok = refresh_shared_openstack_inventory(wait=True)
+    finally:
+        with _inventory_load_cond:
+            _inventory_load["loading"] = False
+            if ok:
+                _inventory_load["failures"] = 0
+            else:
+                _inventory_load["failures"] += 1
+                delay = min(INVENTORY_RETRY_MAX_SECONDS,
+                            INVENTORY_RETRY_SECONDS * 2 ** (_inventory_load["failures"] - 1))
+                _inventory_load["retry_at"] = time.time() + delay
+            _inventory_load_cond.notify_all()
+    return ok
+
+
+def openstack_inventory_aggregates() -> dict:
+    """Per-project, per-host and per-status rollups computed from the indexes."""
+    with openstack_inventory_lock:
+        inv = openstack_inventory
+        servers = inv["servers"]
+        volumes = inv["volumes"]
+
+        per_project = {}
+        for project_id, ids in inv["server_index"]["project"].items():
+            recs = [servers[i] for i in ids]
+            per_project[project_id] = {
+                "instances": len(recs),
+                "vcpus": sum(r["vcpus"] for r in recs),
+                "ram_mb": sum(r["ram_mb"] for r in recs),
+                "volumes": 0,
+                "volume_gb": 0,
+            }
+        for project_id, ids in inv["volume_index"]["project"].items():
+            entry = per_project.setdefault(project_id, {
+                "instances": 0, "vcpus": 0, "ram_mb": 0, "volumes": 0, "volume_gb": 0,
+            })
+            entry["volumes"] = len(ids)
+            entry["volume_gb"] = sum(volumes[i]["size_gb"] for i in ids)
+
+        per_host = {}
+        for host, ids in inv["server_index"]["host"].items():
+            recs = [servers[i] for i in ids]
+            per_host[host or "unscheduled"] = {
+                "instances": len(recs),
+                "vcpus": sum(r["vcpus"] for r in recs),
+                "ram_mb": sum(r["ram_mb"] for r in recs),
+            }
+        for hv in inv["hypervisors"].values():
+            entry = per_host.setdefault(hv["host"], {"instances": 0, "vcpus": 0, "ram_mb": 0})
+            entry.update({
+                "hypervisor_vcpus": hv["vcpus"],
+                "hypervisor_vcpus_used": hv["vcpus_used"],
+                "hypervisor_memory_mb": hv["memory_mb"],
+                "hypervisor_memory_mb_used": hv["memory_mb_used"],
+                "state": hv["state"],
+            })
+
+        return {
+            "per_project": per_project,
+            "per_host": per_host,
+            "servers_by_status": {k: len(v) for k, v in inv["server_index"]["status"].items()},
+            "volumes_by_status": {k: len(v) for k, v in inv["volume_index"]["status"].items()},
+            "totals": {
+                "instances": len(servers),
+                "volumes": len(volumes),
+                "hypervisors": len(inv["hypervisors"]),
+            },
+            "last_full_sync": int(inv["last_full_sync"]),
+            "last_delta_sync": int(inv["last_delta_sync"]),
+            "version": inv["version"],
+            "error": inv["error"],
+        }
+
+
 # Retrieves OpenStack resource usage statistics including instances, vCPU, memory, and volumes
-# Connects to OpenStack API to gather comprehensive cloud resource utilization data
+# Served from the in-memory inventory cache; ?breakdown=1 adds per-project/per-host rollups
 @app.route("/resource-usage", methods=["GET"])
 def get_resource_usage():
-    os.environ["OS_CLIENT_CONFIG_FILE"] = "/etc/kolla/clouds.yaml"
-    conn = openstack.connect(cloud='kolla-admin')
-
-    CPU_ALLOCATION_RATIO = 4.0
-
     try:
-        # --- Instances (all projects) ---
-        instances = list(conn.compute.servers(all_projects=True))
-        instance_count = len(instances)
+        if not ensure_openstack_inventory():
+            return jsonify({"error": openstack_inventory["error"] or "OpenStack inventory unavailable"}), 500
 
-        # --- vCPU & Memory Usage (aggregate stats across hypervisors) ---
-        stats = conn.compute.get("/os-hypervisors/statistics").json()["hypervisor_statistics"]
+        with openstack_inventory_lock:
+            hypervisors = list(openstack_inventory["hypervisors"].values())
+            instance_count = len(openstack_inventory["servers"])
+            volumes_in_use = len(openstack_inventory["volume_index"]["status"].get("in-use", ()))
 
-        physical_vcpus = stats.get("vcpus", 0)
-        used_vcpus = stats.get("vcpus_used", 0)
+        physical_vcpus = sum(h["vcpus"] for h in hypervisors)
+        used_vcpus = sum(h["vcpus_used"] for h in hypervisors)
 
         # Apply allocation ratio
         total_vcpus = int(physical_vcpus * CPU_ALLOCATION_RATIO)
 
-        total_memory = stats.get("memory_mb", 0)   # MB
-        used_memory = stats.get("memory_mb_used", 0)
-
-        total_memory_gib = round(total_memory / 1024, 2)
-        used_memory_gib = round(used_memory / 1024, 2)
+        total_memory = sum(h["memory_mb"] for h in hypervisors)   # MB
+        used_memory = sum(h["memory_mb_used"] for h in hypervisors)
 
-        # --- Volumes (all projects) ---
-        volumes = list(conn.block_storage.volumes(details=True, all_projects=True))
-        volumes_in_use = sum(1 for v in volumes if v.status == "in-use")
-
-        # Response
         data = {
             "instances": instance_count,
             "vcpu": {
@@ -2476,25 +2659,56 @@ def get_resource_usage():
                 "total": total_vcpus      # scaled with allocation ratio
             },
             "memory": {
-                "used": used_memory_gib,
-                "total": total_memory_gib
+                "used": round(used_memory / 1024, 2),
+                "total": round(total_memory / 1024, 2)
             },
             "volumes_in_use": volumes_in_use
         }
 
+        if request.args.get("breakdown") in ("1", "true", "yes"):
+            aggregates = openstack_inventory_aggregates()
+            data["per_project"] = aggregates["per_project"]
+            data["per_host"] = aggregates["per_host"]
+
         return jsonify(data)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# Returns inventory rollups and, when filtered, the matching server records
+# Query: ?project=<id>&host=<name>&status=<ACTIVE|...>
+@app.route("/api/openstack/inventory", methods=["GET"])
+def get_openstack_inventory():
+    if not ensure_openstack_inventory():
+        return jsonify({"error": openstack_inventory["error"] or "OpenStack inventory unavailable"}), 500
+
+    result = openstack_inventory_aggregates()
+
+    filters = {name: request.args.get(name) for name in SERVER_INDEX_KEYS if request.args.get(name)}
+    if filters:
+        with openstack_inventory_lock:
+            index = openstack_inventory["server_index"]
+            ids = None
+            for name, value in filters.items():
+                matched = index[name].get(value, set())
+                ids = set(matched) if ids is None else ids & matched
+            servers = [openstack_inventory["servers"][i] for i in sorted(ids)]
+        result["servers"] = servers
+        result["filters"] = filters
+
+    return jsonify(result)
+
+
 def load_openstack_env():
     """Loads OpenStack environment variables and returns them as a dictionary."""
     env_cmd = "source /home/pinakasupport/.pinaka_wd/vpinakastra_pd/bin/activate && source /etc/kolla/admin-openrc.sh && env"
 
-    result = subprocess.run(
-        env_cmd, shell=True, capture_output=True, text=True, executable="/bin/bash"
-    )
+    try:
+        result = commands.run(env_cmd, shell=True, executable="/bin/bash", timeout=60, name="openstack-env")
+    except subprocess.SubprocessError as e:
+        print("Failed to load OpenStack environment:", e)
+        return None
     if result.returncode != 0:
         print("Failed to load OpenStack environment:", result.stderr)
         return None
@@ -2511,18 +2725,31 @@ def load_openstack_env():
 def run_openstack_command(command, env_vars):
     """Runs an OpenStack CLI command with JSON output."""
     try:
-        output = subprocess.check_output(
-            command, shell=True, text=True, executable="/bin/bash", env=env_vars
-        )
+        output = commands.run(
+            command, shell=True, executable="/bin/bash", env=env_vars, check=True, timeout=120, name="openstack"
+        ).stdout
         return json.loads(output)  # Convert JSON string to Python dictionary
     except subprocess.CalledProcessError as e:
         return {"error": e.output}
+    except subprocess.SubprocessError as e:
+        return {"error": str(e)}
 
 
 # Retrieves OpenStack service status including compute, network, and volume services
-# Uses OpenStack CLI commands to gather service health and availability information
+# Served from the inventory cache; falls back to the OpenStack CLI if the SDK is unavailable
 @app.route("/api/openstack_data")
 def get_openstack_data():
+    try:
+        if ensure_openstack_inventory():
+            with openstack_inventory_lock:
+                return jsonify({
+                    "compute_services": list(openstack_inventory["compute_services"]),
+                    "network_agents": list(openstack_inventory["network_agents"]),
+                    "volume_services": list(openstack_inventory["volume_services"]),
+                })
+    except Exception as e:
+        logging.warning("Inventory lookup failed, using OpenStack CLI: %s", e)
+
     env_vars = load_openstack_env()
     if env_vars is None:
         return jsonify({"error": "Failed to load OpenStack environment"}), 500
@@ -2546,106 +2773,371 @@ def get_openstack_data():
     )
 
 
-# Helper function to fetch Ceph data from cluster
-def fetch_ceph_data():
-    ssh = None
-    try:
-        cred_file = os.path.expanduser("/home/pinakasupport/.pinaka_wd/.markers/ceph_dashboard_credentials.txt")
-        if not os.path.exists(cred_file):
-            return None
-        
-        with open(cred_file, "r") as f:
-            content = f.read()
-        
-        match = re.search(r"https://([^:]+):\d+", content)
-        if not match:
-            return None
-        hostname = match.group(1)
-        
-        ssh_user = "pinakasupport"
-        ssh_key = os.path.expanduser("~/.ssh/id_rsa")
-        if not os.path.exists(ssh_key):
-            return None
-        
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(hostname=hostname, username=ssh_user, key_filename=ssh_key, timeout=20, banner_timeout=30)
-        
-        cmd = "sudo cephadm shell -- ceph -s --format json"
-        stdin, stdout, stderr = ssh.exec_command(cmd, timeout=40)
-        
-        start_time = time.time()
-        while not stdout.channel.exit_status_ready():
-            if time.time() - start_time > 35:
-                raise Exception("Timeout")
-            time.sleep(0.1)
-        
-        output = stdout.read().decode().strip()
-        if not output:
-            return None
-        
-        status = json.loads(output)
-        osdmap = status.get("osdmap", {})
-        pgmap = status.get("pgmap", {})
-        
-        return {
-            "total_osds": osdmap.get("num_osds", 0),
-            "up_osds": osdmap.get("num_up_osds", 0),
-            "in_osds": osdmap.get("num_in_osds", 0),
-            "storage_total_bytes": pgmap.get("bytes_total", 0),
-            "storage_used_bytes": pgmap.get("bytes_used", 0),
-            "storage_available_bytes": pgmap.get("bytes_avail", 0),
-        }
-    except:
+# ----- Ceph status cache -----
+# All Ceph queries go through one persistent SSH channel running a long-lived
+# shell on the Ceph dashboard host. If the host has a usable `ceph` CLI the
+# shell is plain bash; otherwise it is a single `cephadm shell` container that
+# is started once and reused, instead of one container per query.
+# Refreshes are single-flight: one background refresher keeps the cache warm
+# while the dashboard is polling, and requests are answered from the cache
+# (stale-while-revalidate) without ever starting a second query. Across
+# gunicorn workers only the refresher holding CEPH_REFRESH_LEASE queries and
+# keeps a session open; demand (last access) is recorded in shared_state so
+# that refresher sees polling served by any worker.
+CEPH_SSH_USER = "pinakasupport"
+CEPH_SSH_KEY = "~/.ssh/id_rsa"
+CEPH_REFRESH_INTERVAL = 20      # seconds between background refreshes
+CEPH_IDLE_SECONDS = 300         # stop refreshing (and drop the session) when nobody asks
+CEPH_QUERY_TIMEOUT = 40
+# Worst case for one refresh on a cold session: connect (20) + banner (30) +
+# probe (15) + query. The lease is renewed once per interval, so it must
+# outlive an interval plus one such refresh.
+CEPH_SESSION_OPEN_SECONDS = 20 + 30 + 15
+CEPH_REFRESH_LEASE_SECONDS = CEPH_REFRESH_INTERVAL + CEPH_SESSION_OPEN_SECONDS + CEPH_QUERY_TIMEOUT + 15
+CEPH_ACCESS_WRITE_SECONDS = 5   # at most one shared last-access write per worker per this many seconds
+CEPH_SENTINEL = "__PINAKA_CEPH_DONE__"
+CEPH_CACHE_KEY = "ceph_summary"
+CEPH_ATTEMPT_KEY = "ceph_refresh_attempt"   # {"ok": bool}, rewritten after every query
+CEPH_LAST_ACCESS_KEY = "ceph_last_access"
+CEPH_REFRESH_LEASE = "ceph_refresh"
+
+ceph_refresh_wanted = threading.Event()
+metrics.describe("pinaka_ceph_query_seconds", "histogram", "Ceph status query time through the persistent shell")
+metrics.describe("pinaka_ceph_query_errors_total", "counter", "Failed Ceph status queries by reason")
+metrics.describe("pinaka_cache_requests_total", "counter", "Cache lookups by cache and result (hit, stale, miss)")
+ceph_session_lock = threading.Lock()
+ceph_session = {"ssh": None, "channel": None, "host": None, "mode": None, "buffer": b""}
+_ceph_refresher_state = {"started": False, "last_access": 0}
+_ceph_refresher_lock = threading.Lock()
+
+
+def _ceph_dashboard_host() -> Optional[str]:
+    cred_file = os.path.expanduser("/home/pinakasupport/.pinaka_wd/.markers/ceph_dashboard_credentials.txt")
+    if not os.path.exists(cred_file):
         return None
-    finally:
-        if ssh:
+    with open(cred_file, "r") as f:
+        match = re.search(r"https://([^:]+):\d+", f.read())
+    return match.group(1) if match else None
+
+
+def _ceph_close_session():
+    """Close the persistent channel/SSH client. Caller must hold ceph_session_lock."""
+    for key in ("channel", "ssh"):
+        obj = ceph_session.get(key)
+        if obj is not None:
             try:
-                ssh.close()
-            except:
+                obj.close()
+            except Exception:
                 pass
+        ceph_session[key] = None
+    ceph_session["buffer"] = b""
 
-def update_ceph_cache():
-    global ceph_cache
-    try:
-        ceph_cache["updating"] = True
-        new_data = fetch_ceph_data()
-        if new_data:
-            ceph_cache["data"] = new_data
-            ceph_cache["timestamp"] = time.time()
-    finally:
-        ceph_cache["updating"] = False
 
-# Retrieves Ceph OSD (Object Storage Device) statistics from remote Ceph cluster
-# Connects to Ceph dashboard host to gather storage cluster health information
-@app.route("/ceph/osd-count", methods=["GET"])
-def get_osd_count():
-    global ceph_cache
-    current_time = time.time()
-    cache_age = current_time - ceph_cache["timestamp"]
-    cache_valid = ceph_cache["data"] is not None and cache_age < cache_expiry_seconds
-    
-    if cache_valid:
-        if cache_age > 20 and not ceph_cache["updating"]:
-            threading.Thread(target=update_ceph_cache, daemon=True).start()
-        return jsonify(ceph_cache["data"])
-    
-    if not ceph_cache["updating"]:
-        fresh_data = fetch_ceph_data()
-        if fresh_data:
-            ceph_cache["data"] = fresh_data
-            ceph_cache["timestamp"] = current_time
-            return jsonify(fresh_data)
-    
-    if ceph_cache["data"] is not None:
-        if not ceph_cache["updating"]:
-            threading.Thread(target=update_ceph_cache, daemon=True).start()
-        return jsonify(ceph_cache["data"])
-    
-    return jsonify({
-        "total_osds": 0, "up_osds": 0, "in_osds": 0,
-        "storage_total_bytes": 0, "storage_used_bytes": 0, "storage_available_bytes": 0
-    }), 503
+def _ceph_open_session():
+    """Connect to the Ceph host and start the long-lived shell. Caller holds the lock."""
+    hostname = _ceph_dashboard_host()
+    ssh_key = os.path.expanduser(CEPH_SSH_KEY)
+    if not hostname or not os.path.exists(ssh_key):
+        raise RuntimeError("Ceph host or SSH key not available")
+
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    with metrics.timer("pinaka_ssh_seconds", host=hostname, phase="session"):
+        ssh.connect(hostname=hostname, username=CEPH_SSH_USER, key_filename=ssh_key, timeout=20, banner_timeout=30)
+    transport = ssh.get_transport()
+    transport.set_keepalive(30)
+
+    # Prefer the host's own ceph CLI (no container at all); fall back to cephadm shell
+    probe = "command -v ceph >/dev/null 2>&1 && sudo -n test -r /etc/ceph/ceph.client.admin.keyring && echo host"
+    _, stdout, _ = ssh.exec_command(probe, timeout=15)
+    mode = "host" if stdout.read().decode().strip() == "host" else "cephadm"
+    shell = "sudo bash --norc --noprofile" if mode == "host" else "sudo cephadm shell -- bash --norc --noprofile"
+
+    channel = transport.open_session()
+    channel.settimeout(CEPH_QUERY_TIMEOUT)
+    channel.exec_command(shell)
+
+    ceph_session.update({"ssh": ssh, "channel": channel, "host": hostname, "mode": mode, "buffer": b""})
+
+
+def ceph_query(script: str, timeout: int = CEPH_QUERY_TIMEOUT) -> str:
+    """
+    Run a shell snippet inside the persistent Ceph shell and return its stdout.
+    Only one query runs at a time; a broken or timed-out session is discarded
+    and reopened on the next call.
+    """
+    with ceph_session_lock:
+        channel = ceph_session["channel"]
+        if channel is None or channel.closed or channel.exit_status_ready():
+            _ceph_close_session()
+            _ceph_open_session()
+            channel = ceph_session["channel"]
+
+        marker = f"{CEPH_SENTINEL} {uuid.uuid4().hex}".encode()
+        try:
+            channel.settimeout(timeout)
+            channel.sendall(f"{{ {script}\n}} 2>/dev/null; echo; echo {marker.decode()}\n".encode())
+            buf = ceph_session["buffer"]
+            deadline = time.time() + timeout
+            while marker not in buf:
+                if time.time() > deadline:
+                    raise TimeoutError("Ceph query timed out")
+                chunk = channel.recv(65536)
+                if not chunk:
+                    raise ConnectionError("Ceph shell closed")
+                buf += chunk
+        except Exception:
+            _ceph_close_session()
+            raise
+
+        output, _, rest = buf.partition(marker)
+        # Drop the rest of the marker line, keep anything after it
+        ceph_session["buffer"] = rest.partition(b"\n")[2]
+        return output.decode("utf-8", errors="replace").strip()
+
+
+# ----- Ceph telemetry -----
+# Every refresh tick runs `ceph -s`, `ceph df` and `ceph osd perf` in one round
+# trip and appends a compact sample to fixed-size shared_state rings (one for
+# the cluster, one per pool), so storage dashboards read history from there
+# instead of issuing their own Ceph queries. Only the worker holding the
+# refresh lease samples, and every worker serves the same history.
+CEPH_TELEMETRY_SAMPLES = 720    # 4 hours at the 20 s refresh interval
+CEPH_SECTION_SEPARATOR = "__PINAKA_CEPH_SECTION__"
+CEPH_TELEMETRY_SCRIPT = (
+    f"ceph -s --format json; echo {CEPH_SECTION_SEPARATOR}; "
+    f"ceph df --format json; echo {CEPH_SECTION_SEPARATOR}; "
+    "ceph osd perf --format json"
+)
+# Field order of the rows stored in the CEPH_SAMPLES_RING
+CEPH_SAMPLE_FIELDS = (
+    "timestamp", "read_ops", "write_ops", "read_bytes_sec", "write_bytes_sec",
+    "num_pgs", "pgs_active_clean", "used_bytes", "commit_latency_ms_max", "apply_latency_ms_max",
+)
+CEPH_SAMPLES_RING = "ceph_samples"
+CEPH_POOL_RING_PREFIX = "ceph_pool:"           # + name -> (ts, stored, objects, percent_used)
+CEPH_TELEMETRY_KEY = "ceph_telemetry_latest"   # pg_states, pool_stats, osd_perf, last_sample
+
+
+def _parse_json_section(text: str):
+    text = text.strip()
+    if not text:
+        return {}
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {}
+
+
+def record_ceph_telemetry(status: dict, df: dict, perf: dict):
+    """Append one sample built from the three command outputs to the rings."""
+    now = int(time.time())
+    pgmap = status.get("pgmap", {})
+    pg_states = {s.get("state_name"): s.get("count", 0) for s in pgmap.get("pgs_by_state", [])}
+
+    # `ceph osd perf` nests the list under "osdstats" on newer releases
+    perf_infos = perf.get("osdstats", perf).get("osd_perf_infos", [])
+    osd_perf = [{
+        "osd": p.get("id"),
+        "commit_latency_ms": p.get("perf_stats", {}).get("commit_latency_ms", 0),
+        "apply_latency_ms": p.get("perf_stats", {}).get("apply_latency_ms", 0),
+    } for p in perf_infos]
+
+    pool_stats = [{
+        "name": p.get("name"),
+        "id": p.get("id"),
+        "stored_bytes": p.get("stats", {}).get("stored", p.get("stats", {}).get("bytes_used", 0)),
+        "objects": p.get("stats", {}).get("objects", 0),
+        "percent_used": round(p.get("stats", {}).get("percent_used", 0) * 100, 2),
+        "max_avail_bytes": p.get("stats", {}).get("max_avail", 0),
+    } for p in df.get("pools", [])]
+
+    sample = (
+        now,
+        pgmap.get("read_op_per_sec", 0),
+        pgmap.get("write_op_per_sec", 0),
+        pgmap.get("read_bytes_sec", 0),
+        pgmap.get("write_bytes_sec", 0),
+        pgmap.get("num_pgs", 0),
+        pg_states.get("active+clean", 0),
+        pgmap.get("bytes_used", 0),
+        max((o["commit_latency_ms"] for o in osd_perf), default=0),
+        max((o["apply_latency_ms"] for o in osd_perf), default=0),
+    )
+
+    with shared_state.transaction():
+        shared_state.append(CEPH_SAMPLES_RING, sample, CEPH_TELEMETRY_SAMPLES)
+        for pool in pool_stats:
+            shared_state.append(f"{CEPH_POOL_RING_PREFIX}{pool['name']}",
+                                (now, pool["stored_bytes"], pool["objects"], pool["percent_used"]),
+                                CEPH_TELEMETRY_SAMPLES)
+        shared_state.set(CEPH_TELEMETRY_KEY, {
+            "pg_states": pg_states,
+            "pool_stats": pool_stats,
+            "osd_perf": osd_perf,
+            "last_sample": now,
+        })
+
+
+def fetch_ceph_data():
+    """
+    Run the telemetry script through the persistent session, record a
+    telemetry sample and return the OSD/capacity summary used by the cache.
+    """
+    try:
+        with metrics.timer("pinaka_ceph_query_seconds"):
+            output = ceph_query(CEPH_TELEMETRY_SCRIPT)
+        if not output:
+            metrics.inc("pinaka_ceph_query_errors_total", reason="empty")
+            return None
+
+        sections = output.split(CEPH_SECTION_SEPARATOR)
+        status = _parse_json_section(sections[0])
+        if not status:
+            metrics.inc("pinaka_ceph_query_errors_total", reason="empty")
+            return None
+        df = _parse_json_section(sections[1]) if len(sections) > 1 else {}
+        perf = _parse_json_section(sections[2]) if len(sections) > 2 else {}
+        record_ceph_telemetry(status, df, perf)
+
+        osdmap = status.get("osdmap", {})
+        pgmap = status.get("pgmap", {})
+
+        return {
+            "total_osds": osdmap.get("num_osds", 0),
+            "up_osds": osdmap.get("num_up_osds", 0),
+            "in_osds": osdmap.get("num_in_osds", 0),
+            "storage_total_bytes": pgmap.get("bytes_total", 0),
+            "storage_used_bytes": pgmap.get("bytes_used", 0),
+            "storage_available_bytes": pgmap.get("bytes_avail", 0),
+        }
+    except Exception as e:
+        if isinstance(e, (TimeoutError, socket.timeout)):
+            reason = "timeout"
+        elif isinstance(e, (ConnectionError, OSError)):
+            reason = "connection"
+        else:
+            reason = "error"
+        metrics.inc("pinaka_ceph_query_errors_total", reason=reason)
+        logging.warning("Ceph status fetch failed: %s", e)
+        return None
+
+
+def update_ceph_cache(wait: bool = False, timeout: float = CEPH_QUERY_TIMEOUT + 5):
+    """
+    Ask for a refresh and return the shared summary. The query itself only
+    runs in the refresher holding CEPH_REFRESH_LEASE (in this worker or
+    another); wait=True blocks until that refresher reports its next attempt.
+    """
+    _, since = shared_state.get_with_time(CEPH_ATTEMPT_KEY)
+    ceph_refresh_wanted.set()
+    if wait:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(0.5)
+            if shared_state.get_with_time(CEPH_ATTEMPT_KEY)[1] != since:
+                break
+    return shared_state.get(CEPH_CACHE_KEY)
+
+
+def _ceph_refresher():
+    while True:
+        ceph_refresh_wanted.wait(CEPH_REFRESH_INTERVAL)
+        ceph_refresh_wanted.clear()
+        try:
+            idle = time.time() - shared_state.get(CEPH_LAST_ACCESS_KEY, 0) > CEPH_IDLE_SECONDS
+            if idle:
+                shared_state.release_lease(CEPH_REFRESH_LEASE)
+            if idle or not shared_state.acquire_lease(CEPH_REFRESH_LEASE, CEPH_REFRESH_LEASE_SECONDS):
+                # Nobody is watching, or another worker refreshes; release the remote shell/container
+                with ceph_session_lock:
+                    _ceph_close_session()
+                continue
+            if time.time() - shared_state.get_with_time(CEPH_CACHE_KEY)[1] < CEPH_REFRESH_INTERVAL / 2:
+                continue    # the previous holder refreshed just before handing over
+            new_data = fetch_ceph_data()
+            if new_data:
+                shared_state.set(CEPH_CACHE_KEY, new_data)
+            shared_state.set(CEPH_ATTEMPT_KEY, {"ok": bool(new_data)})
+        except Exception as e:
+            logging.exception("Ceph refresher error: %s", e)
+
+
+def touch_ceph_cache():
+    """Record demand for Ceph data and make sure this worker's refresher runs."""
+    now = time.time()
+    with _ceph_refresher_lock:
+        if now - _ceph_refresher_state["last_access"] >= CEPH_ACCESS_WRITE_SECONDS:
+            _ceph_refresher_state["last_access"] = now
+            shared_state.set(CEPH_LAST_ACCESS_KEY, now)
+        if not _ceph_refresher_state["started"]:
+            _ceph_refresher_state["started"] = True
+            threading.Thread(target=_ceph_refresher, daemon=True).start()
+
+
+# Retrieves Ceph OSD (Object Storage Device) statistics from remote Ceph cluster
+# Answers from the single-flight cache; only a cold cache waits for a query
+@app.route("/ceph/osd-count", methods=["GET"])
+def get_osd_count():
+    touch_ceph_cache()
+
+    data, updated_at = shared_state.get_with_time(CEPH_CACHE_KEY)
+    if data is not None:
+        cache_age = time.time() - updated_at
+        if cache_age > cache_expiry_seconds:
+            metrics.inc("pinaka_cache_requests_total", cache="ceph", result="stale")
+            # Refresher fell behind (e.g. just woke from idle); revalidate in background
+            update_ceph_cache()
+        else:
+            metrics.inc("pinaka_cache_requests_total", cache="ceph", result="hit")
+        return jsonify(data)
+
+    metrics.inc("pinaka_cache_requests_total", cache="ceph", result="miss")
+    data = update_ceph_cache(wait=True)
+    if data is not None:
+        return jsonify(data)
+
+    return jsonify({
+        "total_osds": 0, "up_osds": 0, "in_osds": 0,
+        "storage_total_bytes": 0, "storage_used_bytes": 0, "storage_available_bytes": 0
+    }), 503
+
+
+# Returns Ceph telemetry history (IOPS, throughput, PG states, pool usage, OSD latency)
+# Query: ?window=<seconds, default 900>&pool=<name> ; served from the shared rings
+@app.route("/ceph/telemetry", methods=["GET"])
+def get_ceph_telemetry():
+    touch_ceph_cache()
+    latest = shared_state.get(CEPH_TELEMETRY_KEY)
+    if latest is None:
+        update_ceph_cache()
+    latest = latest or {"pg_states": {}, "pool_stats": [], "osd_perf": [], "last_sample": 0}
+    try:
+        window = int(request.args.get("window", 900))
+    except ValueError:
+        return jsonify({"error": "Invalid window"}), 400
+    pool = request.args.get("pool")
+    since = time.time() - window
+
+    # Rings are bounded (CEPH_TELEMETRY_SAMPLES), so select by timestamp over the whole ring
+    samples = [dict(zip(CEPH_SAMPLE_FIELDS, s)) for s in shared_state.tail(CEPH_SAMPLES_RING)
+               if s[0] >= since]
+    names = [p["name"] for p in latest["pool_stats"] if pool is None or p["name"] == pool]
+    pools = {
+        name: [{"timestamp": ts, "stored_bytes": stored, "objects": objects, "percent_used": pct}
+               for ts, stored, objects, pct in shared_state.tail(f"{CEPH_POOL_RING_PREFIX}{name}")
+               if ts >= since]
+        for name in names
+    }
+    return jsonify({
+        "interval_seconds": CEPH_REFRESH_INTERVAL,
+        "last_sample": latest["last_sample"],
+        "samples": samples,
+        "pool_history": pools,
+        "pg_states": latest["pg_states"],
+        "pools": latest["pool_stats"],
+        "osd_perf": latest["osd_perf"],
+    })
 
 
 # ----- Paths & env -----
@@ -2662,20 +3154,167 @@ ENV_CMD = (
 
 INVENTORY = "multinode"  # change if you use another inventory file
 
+# ----- Kolla log writer -----
+# Output is written through persistent append handles with a bounded buffer
+# that is flushed by size or every KOLLA_LOG_FLUSH_SECONDS. Every line goes to
+# the combined LOG_FILE (kept for existing consumers) and, when it belongs to a
+# job, to JOB_LOG_DIR/<job_id>.log as well. The combined log is rotated by size.
+# Several gunicorn workers append to LOG_FILE, so each flush to it (and any
+# rotation) happens under an flock on LOG_FILE.lock, and job byte offsets are
+# taken from where the data actually landed rather than a per-worker counter,
+# together with the inode of the file they point into, so a job's slice can
+# still be found in a rotated backup.
+JOB_LOG_DIR = os.path.join(LOG_DIR, "jobs")
+KOLLA_LOG_FLUSH_SECONDS = 0.5
+KOLLA_LOG_BUFFER_BYTES = 64 * 1024
+KOLLA_LOG_MAX_BYTES = 100 * 1024 * 1024
+KOLLA_LOG_BACKUPS = 3
+
+kolla_log_lock = threading.Lock()
+kolla_log_state = {
+    "handles": {},      # path -> binary append handle (unbuffered; we buffer ourselves)
+    "buffers": {},      # path -> list of pending bytes
+    "buffered": 0,      # pending bytes for LOG_FILE (every write goes there)
+    "job_marks": {},    # job_id -> position of the job's first byte in the pending LOG_FILE data
+    "job_starts": {},   # job_id -> (offset, inode) of the job's first byte in LOG_FILE, once flushed
+    "last_end": (0, None),  # (offset, inode) just past this worker's last write to LOG_FILE
+    "flusher": False,
+}
+
 
 def ensure_paths():
     os.makedirs(LOG_DIR, exist_ok=True)
+    os.makedirs(JOB_LOG_DIR, exist_ok=True)
 
 
 def timestamp():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def log_line(text: str):
-    """Append a single line to the log file with timestamp."""
+def job_log_file(job_id: str) -> str:
+    return os.path.join(JOB_LOG_DIR, f"{job_id}.log")
+
+
+def _kolla_log_handle(path: str):
+    """Return the open handle for path, reopening it if the file was rotated away."""
+    handle = kolla_log_state["handles"].get(path)
+    if handle is not None:
+        try:
+            if os.stat(path).st_ino == os.fstat(handle.fileno()).st_ino:
+                return handle
+        except FileNotFoundError:
+            pass
+        handle.close()
     ensure_paths()
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"[{timestamp()}] {text.rstrip()}\n")
+    handle = open(path, "ab", buffering=0)
+    kolla_log_state["handles"][path] = handle
+    return handle
+
+
+def _kolla_log_rotate():
+    """Shift LOG_FILE -> LOG_FILE.1 -> ... and start a fresh combined log."""
+    handle = kolla_log_state["handles"].pop(LOG_FILE, None)
+    if handle is not None:
+        handle.close()
+    for i in range(KOLLA_LOG_BACKUPS - 1, 0, -1):
+        src = f"{LOG_FILE}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{LOG_FILE}.{i + 1}")
+    if os.path.exists(LOG_FILE):
+        os.replace(LOG_FILE, f"{LOG_FILE}.1")
+
+
+def _kolla_log_append_combined(data: bytes):
+    """Append to LOG_FILE under the cross-worker lock, rotating first if it is full."""
+    ensure_paths()
+    with open(LOG_FILE + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        handle = _kolla_log_handle(LOG_FILE)
+        at_offset = os.fstat(handle.fileno()).st_size
+        if at_offset > 0 and at_offset + len(data) > KOLLA_LOG_MAX_BYTES:
+            _kolla_log_rotate()
+            handle = _kolla_log_handle(LOG_FILE)
+            at_offset = 0
+        handle.write(data)
+        inode = os.fstat(handle.fileno()).st_ino
+    for job_id, mark in kolla_log_state["job_marks"].items():
+        kolla_log_state["job_starts"][job_id] = (at_offset + mark, inode)
+    kolla_log_state["job_marks"].clear()
+    kolla_log_state["last_end"] = (at_offset + len(data), inode)
+    kolla_log_index_feed(data, at_offset, inode)
+
+
+def _kolla_log_flush_locked():
+    for path, chunks in kolla_log_state["buffers"].items():
+        if not chunks:
+            continue
+        data = b"".join(chunks)
+        chunks.clear()
+        if path == LOG_FILE:
+            _kolla_log_append_combined(data)
+        else:
+            _kolla_log_handle(path).write(data)
+    kolla_log_state["buffered"] = 0
+
+
+def kolla_log_flush():
+    with kolla_log_lock:
+        _kolla_log_flush_locked()
+
+
+def _kolla_log_flusher():
+    while True:
+        time.sleep(KOLLA_LOG_FLUSH_SECONDS)
+        try:
+            kolla_log_flush()
+            kolla_progress_publish()
+        except Exception as e:
+            logging.exception("Kolla log flush failed: %s", e)
+
+
+def kolla_log_write(text: str, job_id: Optional[str] = None):
+    """Queue raw text for the combined log (and the job's own log)."""
+    data = text.encode("utf-8", errors="replace")
+    with kolla_log_lock:
+        if not kolla_log_state["flusher"]:
+            kolla_log_state["flusher"] = True
+            threading.Thread(target=_kolla_log_flusher, daemon=True).start()
+        paths = [LOG_FILE]
+        if job_id:
+            paths.append(job_log_file(job_id))
+            if paths[1] not in kolla_log_state["buffers"]:
+                # First output of this job
+                kolla_log_state["job_marks"][job_id] = kolla_log_state["buffered"]
+        for path in paths:
+            kolla_log_state["buffers"].setdefault(path, []).append(data)
+        kolla_log_state["buffered"] += len(data)
+        if kolla_log_state["buffered"] >= KOLLA_LOG_BUFFER_BYTES:
+            _kolla_log_flush_locked()
+
+
+def kolla_log_job_start(job_id: str) -> tuple:
+    """Flush and return (offset, inode) of LOG_FILE where the job's first line landed."""
+    with kolla_log_lock:
+        _kolla_log_flush_locked()
+        return kolla_log_state["job_starts"].pop(job_id, (None, None))
+
+
+def kolla_log_close_job(job_id: str) -> tuple:
+    """Flush everything and release the job's log handle; returns (offset, inode) past its last line."""
+    path = job_log_file(job_id)
+    with kolla_log_lock:
+        _kolla_log_flush_locked()
+        handle = kolla_log_state["handles"].pop(path, None)
+        kolla_log_state["buffers"].pop(path, None)
+        kolla_log_state["job_starts"].pop(job_id, None)
+        if handle is not None:
+            handle.close()
+        return kolla_log_state["last_end"]
+
+
+def log_line(text: str, job_id: Optional[str] = None):
+    """Append a single line to the log file with timestamp."""
+    kolla_log_write(f"[{timestamp()}] {text.rstrip()}\n", job_id)
 
 
 def build_kolla_command(action: str,
@@ -2715,61 +3354,506 @@ def build_kolla_command(action: str,
     raise ValueError(f"Unsupported action '{action}'")
 
 
-def start_background_kolla(command: str) -> dict:
+# ----- Kolla job registry -----
+# Every kolla-ansible run is recorded in shared_state (KOLLA_JOB_PREFIX<job_id>)
+# so all gunicorn workers see the same jobs: pid/process group, owning worker,
+# timings, return code and the byte range the job occupies in the combined log.
+# Jobs whose host sets overlap are not run concurrently; claim_kolla_job()
+# checks for conflicts and records the new job in one transaction, and a
+# conflicting request is rejected (409) or, with "queue": true, started by
+# whichever worker sees the conflicting jobs finish. Jobs with disjoint
+# --limit sets run in parallel. A --limit is expanded to host names by
+# ansible itself (groups, patterns, exclusions); one that cannot be resolved
+# counts as touching every host. Only the Popen objects stay per worker.
+KOLLA_JOBS_FILE = os.path.join(LOG_DIR, "kolla_jobs.json")   # pre-shared_state registry, imported once
+KOLLA_JOB_PREFIX = "kolla_job:"
+KOLLA_JOBS_KEEP = 200
+KOLLA_CANCEL_GRACE_SECONDS = 10
+KOLLA_LIMIT_CACHE_SECONDS = 60
+KOLLA_BUSY_STATES = ("starting", "running", "cancelling")
+KOLLA_ACTIVE_STATES = ("queued",) + KOLLA_BUSY_STATES
+
+kolla_jobs_lock = threading.RLock()
+kolla_job_procs = {}     # job_id -> Popen for jobs started by this worker
+kolla_limit_cache = {}   # --limit expression -> (hosts or None, resolved_at)
+_kolla_jobs_loaded = False
+
+
+def _load_kolla_jobs():
+    """Once per worker: import the legacy jobs file and fail jobs left behind by dead workers."""
+    global _kolla_jobs_loaded
+    if _kolla_jobs_loaded:
+        return
+    _kolla_jobs_loaded = True
+    try:
+        with open(KOLLA_JOBS_FILE, "r") as f:
+            legacy = json.load(f)
+        with shared_state.transaction():
+            for job in legacy:
+                if shared_state.get(KOLLA_JOB_PREFIX + job["job_id"]) is None:
+                    shared_state.set(KOLLA_JOB_PREFIX + job["job_id"], job)
+        os.remove(KOLLA_JOBS_FILE)
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+    with shared_state.transaction():
+        for job in _kolla_job_records().values():
+            _reap_kolla_job(job)
+
+
+def _kolla_job_records() -> dict:
+    """job_id -> record for every job in the registry, oldest first."""
+    records = [job for job, _ in shared_state.items(KOLLA_JOB_PREFIX).values()]
+    records.sort(key=lambda job: (job.get("created_at") or job.get("started_at") or 0, job["job_id"]))
+    return {job["job_id"]: job for job in records}
+
+
+def _reap_kolla_job(job: dict) -> dict:
+    """Mark a job failed when the process (or worker) it depends on is gone; returns the record."""
+    message = None
+    owner = job.get("owner")
+    owner_gone = owner != os.getpid() and not shared_state.pid_alive(owner)
+    if job.get("state") in ("running", "cancelling") and not shared_state.pid_alive(job.get("pid")) \
+            and (owner_gone or (owner == os.getpid() and job["job_id"] not in kolla_job_procs)):
+        # The owning worker records the end itself unless it is gone as well
+        message = "Process ended without recording a result"
+    elif job.get("state") in ("queued", "starting") and owner_gone:
+        message = "Service restarted before job started"
+    if message:
+        job.update({"state": "failed", "message": message, "finished_at": int(time.time())})
+        shared_state.set(KOLLA_JOB_PREFIX + job["job_id"], job)
+    return job
+
+
+def _evict_kolla_jobs():
+    records = _kolla_job_records()
+    finished = [j for j, r in records.items() if r.get("state") not in KOLLA_ACTIVE_STATES]
+    for job_id in finished[:max(0, len(records) - KOLLA_JOBS_KEEP)]:
+        shared_state.delete(KOLLA_JOB_PREFIX + job_id)
+        shared_state.delete(KOLLA_PROGRESS_PREFIX + job_id)
+
+
+def kolla_job_update(job_id: str, **fields) -> dict:
+    _load_kolla_jobs()
+    with shared_state.transaction():
+        job = shared_state.get(KOLLA_JOB_PREFIX + job_id) or {"job_id": job_id}
+        job.update(fields)
+        shared_state.set(KOLLA_JOB_PREFIX + job_id, job)
+    return job
+
+
+def get_kolla_job(job_id: str) -> Optional[dict]:
+    _load_kolla_jobs()
+    with shared_state.transaction():
+        job = shared_state.get(KOLLA_JOB_PREFIX + job_id)
+        return _reap_kolla_job(job) if job else None
+
+
+def list_kolla_jobs() -> list:
+    _load_kolla_jobs()
+    with shared_state.transaction():
+        return [_reap_kolla_job(job) for job in reversed(list(_kolla_job_records().values()))]
+
+
+def new_kolla_job_id() -> str:
+    return f"job-{int(time.time())}-{uuid.uuid4().hex[:6]}"
+
+
+def resolve_kolla_limit(limit: str) -> Optional[list]:
+    """Host names an ansible --limit expression selects in INVENTORY, or None if it cannot be resolved."""
+    cached = kolla_limit_cache.get(limit)
+    if cached and time.time() - cached[1] < KOLLA_LIMIT_CACHE_SECONDS:
+        return cached[0]
+    hosts = None
+    try:
+        result = commands.run(
+            f"cd {shlex.quote(WORK_DIR)} && source bin/activate && "
+            f"ansible -i {INVENTORY} {shlex.quote(limit)} --list-hosts",
+            shell=True, executable="/bin/bash", timeout=30, name="ansible")
+        # "  hosts (2):" followed by one indented host per line
+        _, found, listing = result.stdout.partition("hosts (")
+        if result.returncode == 0 and found:
+            hosts = sorted({line.strip() for line in listing.splitlines()[1:] if line.strip()}) or None
+    except Exception as e:
+        logging.warning("Could not resolve --limit %s: %s", limit, e)
+    kolla_limit_cache[limit] = (hosts, time.time())
+    return hosts
+
+
+def kolla_job_targets(action: str, node: Optional[str]) -> Optional[list]:
+    """Hosts a job touches, or None when it may touch every host."""
+    if action in ("reconfigure_node", "reconfigure_node_service") and node:
+        return resolve_kolla_limit(node)
+    return None
+
+
+def _kolla_jobs_conflict(a: Optional[list], b: Optional[list]) -> bool:
+    return a is None or b is None or bool(set(a) & set(b))
+
+
+def kolla_job_conflicts(targets: Optional[list], states=KOLLA_BUSY_STATES, records=None) -> list:
+    records = _kolla_job_records() if records is None else records
+    return [j["job_id"] for j in records.values()
+            if _reap_kolla_job(j)["state"] in states and _kolla_jobs_conflict(targets, j.get("targets"))]
+
+
+def claim_kolla_job(job_id: str, record: dict, queue: bool) -> list:
+    """
+    Atomically record a new job as "starting" (no conflicts) or "queued"
+    (conflicts and queue=True). Returns the conflicting job ids; with
+    conflicts and queue=False nothing is recorded.
+    """
+    _load_kolla_jobs()
+    with shared_state.transaction():
+        conflicts = kolla_job_conflicts(record.get("targets"), states=KOLLA_ACTIVE_STATES)
+        if conflicts and not queue:
+            return conflicts
+        job = dict(record, job_id=job_id, owner=os.getpid())
+        if conflicts:
+            job.update(state="queued", waiting_for=conflicts)
+        else:
+            job["state"] = "starting"
+        shared_state.set(KOLLA_JOB_PREFIX + job_id, job)
+        _evict_kolla_jobs()
+    return conflicts
+
+
+def _kolla_dispatch_queued():
+    """Start queued jobs, oldest first, whose hosts no longer conflict."""
+    _load_kolla_jobs()
+    with shared_state.transaction():
+        records = _kolla_job_records()
+        blocked = []
+        ready = []
+        for job in records.values():
+            if job["state"] != "queued":
+                continue
+            targets = job.get("targets")
+            if kolla_job_conflicts(targets, records=records) or \
+                    any(_kolla_jobs_conflict(targets, b) for b in blocked):
+                blocked.append(targets)
+                continue
+            # Claimed for this worker inside the transaction, so only one worker starts it
+            job.update(state="starting", owner=os.getpid())
+            shared_state.set(KOLLA_JOB_PREFIX + job["job_id"], job)
+            ready.append(job)
+    for job in ready:
+        try:
+            start_background_kolla(job["command"], job_id=job["job_id"])
+        except Exception as e:
+            kolla_job_update(job["job_id"], state="failed", message=f"Failed to start: {e}",
+                             finished_at=int(time.time()))
+
+
+# ----- Ansible progress parsing -----
+# The runner feeds every output line through parse_ansible_line, which keeps a
+# compact per-job model: current play/task, per-host result counts, PLAY RECAP
+# and per-task durations. Percent complete is estimated from the task count of
+# the last finished run of the same action. The model lives in the worker that
+# runs the job; its log flusher publishes a summary to shared_state every
+# KOLLA_LOG_FLUSH_SECONDS so that /progress answers the same on every worker.
+ANSIBLE_HEADER_RE = re.compile(r"^(PLAY|TASK|RUNNING HANDLER) \[(.*)\]")
+ANSIBLE_RESULT_RE = re.compile(r"^(ok|changed|skipping|failed|fatal|unreachable): \[([^\]]+)\](.*)")
+ANSIBLE_RECAP_RE = re.compile(
+    r"^(\S+)\s*:\s*ok=(\d+)\s+changed=(\d+)\s+unreachable=(\d+)\s+failed=(\d+)"
+    r"(?:\s+skipped=(\d+))?(?:\s+rescued=(\d+))?(?:\s+ignored=(\d+))?"
+)
+ANSIBLE_MAX_TASK_TIMINGS = 5000
+
+KOLLA_PROGRESS_PREFIX = "kolla_progress:"
+
+kolla_progress_lock = threading.Lock()
+kolla_job_progress = {}   # job_id -> progress model, in the worker running the job
+
+
+def new_ansible_progress() -> dict:
+    now = time.time()
+    return {
+        "started_at": now,
+        "updated_at": now,
+        "plays": 0,
+        "current_play": None,
+        "current_task": None,       # {"name", "role", "started_at"}
+        "tasks_completed": 0,
+        "hosts": {},                # host -> {"ok", "changed", "skipped", "failed", "unreachable"}
+        "task_timings": [],         # (name, role, seconds)
+        "role_durations": defaultdict(float),
+        "in_recap": False,
+        "recap": {},
+        "dirty": True,              # changed since last published
+    }
+
+
+def _ansible_close_task(model: dict, now: float):
+    task = model["current_task"]
+    if not task:
+        return
+    duration = round(now - task["started_at"], 3)
+    model["tasks_completed"] += 1
+    model["role_durations"][task["role"] or "(none)"] += duration
+    if len(model["task_timings"]) < ANSIBLE_MAX_TASK_TIMINGS:
+        model["task_timings"].append((task["name"], task["role"], duration))
+    model["current_task"] = None
+
+
+def parse_ansible_line(model: dict, line: str, now: Optional[float] = None):
+    """Update a progress model with one line of ansible output."""
+    now = now or time.time()
+    line = line.rstrip()
+    if not line:
+        return
+    model["updated_at"] = now
+    first = line[0]
+
+    if first in "PTR":
+        m = ANSIBLE_HEADER_RE.match(line)
+        if m:
+            kind, name = m.groups()
+            _ansible_close_task(model, now)
+            if kind == "PLAY":
+                model["plays"] += 1
+                model["current_play"] = name
+                model["in_recap"] = False
+            else:
+                role, _, _ = name.rpartition(" : ")
+                model["current_task"] = {"name": name, "role": role or None, "started_at": now}
+            return
+        if line.startswith("PLAY RECAP"):
+            _ansible_close_task(model, now)
+            model["in_recap"] = True
+            return
+
+    if model["in_recap"]:
+        m = ANSIBLE_RECAP_RE.match(line)
+        if m:
+            host = m.group(1)
+            keys = ("ok", "changed", "unreachable", "failed", "skipped", "rescued", "ignored")
+            model["recap"][host] = {k: int(v or 0) for k, v in zip(keys, m.groups()[1:])}
+        return
+
+    if first in "ocsfu":
+        m = ANSIBLE_RESULT_RE.match(line)
+        if m:
+            status, host, rest = m.groups()
+            host = host.split(" -> ")[0]
+            if status == "fatal":
+                status = "unreachable" if "UNREACHABLE" in rest else "failed"
+            elif status == "skipping":
+                status = "skipped"
+            counts = model["hosts"].setdefault(
+                host, {"ok": 0, "changed": 0, "skipped": 0, "failed": 0, "unreachable": 0})
+            counts[status] += 1
+            counts["last_task"] = (model["current_task"] or {}).get("name")
+
+
+def kolla_progress_feed(job_id: str, line: str):
+    with kolla_progress_lock:
+        model = kolla_job_progress.get(job_id)
+        if model is None:
+            model = kolla_job_progress[job_id] = new_ansible_progress()
+        parse_ansible_line(model, line)
+        model["dirty"] = True
+
+
+def kolla_progress_publish():
+    """Copy changed progress models of this worker's jobs to shared_state."""
+    with kolla_progress_lock:
+        changed = {job_id: (_summarise_progress(model), (model["current_task"] or {}).get("started_at"))
+                   for job_id, model in kolla_job_progress.items() if model["dirty"]}
+        for job_id in changed:
+            kolla_job_progress[job_id]["dirty"] = False
+    for job_id, (summary, task_started_at) in changed.items():
+        shared_state.set(KOLLA_PROGRESS_PREFIX + job_id, {"summary": summary, "task_started_at": task_started_at})
+
+
+def _expected_task_count(job: dict) -> Optional[int]:
+    """Task count of the most recent successful run of the same action/service."""
+    for other in reversed(list(_kolla_job_records().values())):
+        if other["job_id"] != job["job_id"] and other.get("state") == "succeeded" \
+                and other.get("action") == job.get("action") \
+                and other.get("service") == job.get("service") \
+                and (other.get("progress") or {}).get("tasks_completed"):
+            return other["progress"]["tasks_completed"]
+    return None
+
+
+def kolla_progress_summary(job_id: str, top: int = 10) -> Optional[dict]:
+    """Progress of a running job, from this worker's model or the published copy."""
+    with kolla_progress_lock:
+        model = kolla_job_progress.get(job_id)
+        if model is not None:
+            return _summarise_progress(model, top)
+    published = shared_state.get(KOLLA_PROGRESS_PREFIX + job_id)
+    if published is None:
+        return None
+    summary = published["summary"]
+    if published["task_started_at"]:
+        summary["current_task_seconds"] = round(time.time() - published["task_started_at"], 1)
+    summary["slowest_tasks"] = summary["slowest_tasks"][:top]
+    summary["role_durations"] = dict(list(summary["role_durations"].items())[:top])
+    return summary
+
+
+def _summarise_progress(model: dict, top: int = 10) -> dict:
+    """Caller holds kolla_progress_lock."""
+    task = model["current_task"]
+    timings = sorted(model["task_timings"], key=lambda t: t[2], reverse=True)[:top]
+    return {
+        "plays": model["plays"],
+        "current_play": model["current_play"],
+        "current_task": task["name"] if task else None,
+        "current_task_seconds": round(time.time() - task["started_at"], 1) if task else None,
+        "tasks_completed": model["tasks_completed"],
+        "elapsed_seconds": round(model["updated_at"] - model["started_at"], 1),
+        "hosts": {h: dict(c) for h, c in model["hosts"].items()},
+        "recap": dict(model["recap"]),
+        "slowest_tasks": [{"name": n, "role": r, "seconds": d} for n, r, d in timings],
+        "role_durations": dict(sorted(
+            ((r, round(d, 1)) for r, d in model["role_durations"].items()),
+            key=lambda item: item[1], reverse=True)[:top]),
+    }
+
+
+def start_background_kolla(command: str, job_id: Optional[str] = None) -> dict:
     """
     Start the kolla-ansible command in the background:
       - cd to WORK_DIR
       - source virtualenv + openrc
       - run command
-      - append stdout/stderr to LOG_FILE
+      - append stdout/stderr to LOG_FILE and JOB_LOG_DIR/<job_id>.log
     Returns dict with pid and a job_id.
     """
     ensure_paths()
 
     # Full shell command: cd -> source env -> run command
     shell_cmd = f"cd {shlex.quote(WORK_DIR)} && {ENV_CMD} && {command}"
-    job_id = f"job-{int(time.time())}"
+    job_id = job_id or new_kolla_job_id()
 
     # Write prologue to logs
-    log_line("============================================================")
-    log_line(f"JOB START {job_id}")
-    log_line(f"WORK_DIR: {WORK_DIR}")
-    log_line(f"COMMAND: {command}")
+    log_line("============================================================", job_id)
+    log_line(f"JOB START {job_id}", job_id)
+    log_line(f"WORK_DIR: {WORK_DIR}", job_id)
+    log_line(f"COMMAND: {command}", job_id)
+    log_start, log_inode = kolla_log_job_start(job_id)
+
+    # Spawn before the thread so the PID/process group can be recorded
+    try:
+        proc = subprocess.Popen(
+            shell_cmd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            executable="/bin/bash",
+            preexec_fn=os.setpgrp  # detach from flask worker's process group
+        )
+    except Exception as e:
+        log_line(f"JOB ERROR {job_id}: {e}", job_id)
+        kolla_log_close_job(job_id)
+        kolla_job_update(job_id, command=command, state="failed", message=str(e),
+                         finished_at=int(time.time()))
+        raise
+
+    with kolla_jobs_lock:
+        kolla_job_procs[job_id] = proc
+        kolla_job_update(
+            job_id,
+            command=command,
+            state="running",
+            owner=os.getpid(),
+            pid=proc.pid,
+            pgid=proc.pid,  # setpgrp makes the shell its own group leader
+            started_at=int(time.time()),
+            log_file=job_log_file(job_id),
+            log_start=log_start,
+            log_inode=log_inode,
+        )
 
     # We will tee the process output into the log file line-by-line using a thread
+    started = time.time()
+
     def runner():
+        rc = None
         try:
-            with subprocess.Popen(
-                shell_cmd,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                executable="/bin/bash",
-                preexec_fn=os.setpgrp  # detach from flask worker's process group
-            ) as proc:
-                # Stream stdout -> log file
+            with proc:
+                # Stream stdout -> log writer
                 for line in proc.stdout:
                     # Write raw line (not double timestamping the ansible progress lines)
-                    with open(LOG_FILE, "a", encoding="utf-8") as f:
-                        f.write(line)
+                    kolla_log_write(line, job_id)
+                    kolla_progress_feed(job_id, line)
                 rc = proc.wait()
-                log_line(f"JOB END {job_id} (returncode={rc})")
-                log_line("============================================================")
+                log_line(f"JOB END {job_id} (returncode={rc})", job_id)
+                log_line("============================================================", job_id)
         except Exception as e:
-            log_line(f"JOB ERROR {job_id}: {e}")
+            log_line(f"JOB ERROR {job_id}: {e}", job_id)
+        finally:
+            log_end, log_end_inode = kolla_log_close_job(job_id)
+            with kolla_progress_lock:
+                if job_id in kolla_job_progress:
+                    _ansible_close_task(kolla_job_progress[job_id], time.time())
+            with kolla_jobs_lock, shared_state.transaction():
+                kolla_job_procs.pop(job_id, None)
+                cancelled = (shared_state.get(KOLLA_JOB_PREFIX + job_id) or {}).get("state") == "cancelling"
+                if cancelled:
+                    state = "cancelled"
+                else:
+                    state = "succeeded" if rc == 0 else "failed"
+                kolla_job_update(job_id, state=state, returncode=rc, finished_at=int(time.time()),
+                                 log_end=log_end, log_end_inode=log_end_inode,
+                                 progress=kolla_progress_summary(job_id))
+            metrics.observe("pinaka_job_duration_seconds", time.time() - started, kind="kolla", result=state)
+            with kolla_progress_lock:
+                kolla_job_progress.pop(job_id, None)
+            shared_state.delete(KOLLA_PROGRESS_PREFIX + job_id)
+            _kolla_dispatch_queued()
 
     t = threading.Thread(target=runner, daemon=True)
     t.start()
 
-    # We can’t get the child PID easily post-thread; if you want true PID, spawn before thread.
-    # For API, we return the shell_cmd and job_id (frontend will stream logs anyway).
     return {
         "job_id": job_id,
+        "pid": proc.pid,
         "shell_cmd": shell_cmd
     }
 
 
+def cancel_kolla_job(job_id: str) -> Optional[dict]:
+    """Cancel a queued job, or SIGTERM (then SIGKILL) a running job's process group."""
+    _load_kolla_jobs()
+    with shared_state.transaction():
+        job = get_kolla_job(job_id)
+        if not job or job["state"] not in ("queued", "running"):
+            return job
+        if job["state"] == "queued":
+            job = kolla_job_update(job_id, state="cancelled", finished_at=int(time.time()))
+        else:
+            # May have been started by another worker; its process group is on this host either way
+            pgid = job.get("pgid")
+            try:
+                os.killpg(pgid, signal.SIGTERM)
+            except (OSError, TypeError) as e:
+                return kolla_job_update(job_id, message=f"Cancel failed: {e}")
+            job = kolla_job_update(job_id, state="cancelling", cancel_requested_at=int(time.time()))
+            log_line(f"JOB CANCEL {job_id} (SIGTERM to process group {pgid})", job_id)
+    if job["state"] == "cancelled":
+        _kolla_dispatch_queued()
+        return job
+
+    def escalate():
+        time.sleep(KOLLA_CANCEL_GRACE_SECONDS)
+        if (get_kolla_job(job_id) or {}).get("state") == "cancelling":
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except OSError:
+                pass
+            owner = job.get("owner")
+            if job_id not in kolla_job_procs and owner != os.getpid() and not shared_state.pid_alive(owner):
+                # No runner left to record the end (restarted service): record it ourselves
+                kolla_job_update(job_id, state="cancelled", finished_at=int(time.time()))
+
+    threading.Thread(target=escalate, daemon=True).start()
+    return job
+
+
 # Executes kolla-ansible commands in background for OpenStack deployment management
 # Supports various actions like mariadb recovery, reconfiguration, and service management
 @app.route("/kolla/run", methods=["POST"])
@@ -2780,8 +3864,9 @@ def kolla_run():
       {
         "action": "mariadb_recovery" |
                   "reconfigure_all" | "reconfigure_node" | "reconfigure_service" | "reconfigure_node_service",
-        "node": "FD-001",         # optional, required for node actions
-        "service": "nova"         # optional, required for service actions
+        "node": "FD-001",         # optional, required for node actions (comma-separated for several)
+        "service": "nova",        # optional, required for service actions
+        "queue": false            # optional; queue instead of rejecting when hosts overlap a running job
       }
     """
     data = request.get_json(silent=True) or {}
@@ -2797,68 +3882,576 @@ def kolla_run():
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
 
-    # Start background job
-    result = start_background_kolla(cmd)
+    job_id = new_kolla_job_id()
+    record = {"action": action, "node": node, "service": service, "command": cmd,
+              "targets": kolla_job_targets(action, node), "created_at": int(time.time())}
+    # Conflict check and insert are one transaction, so two workers cannot both start
+    conflicts = claim_kolla_job(job_id, record, queue=bool(data.get("queue")))
+    if conflicts and not data.get("queue"):
+        return jsonify({
+            "error": "Conflicting kolla job(s) in progress",
+            "conflicting_jobs": conflicts
+        }), 409
+    if conflicts:
+        return jsonify({
+            "status": "queued",
+            "job_id": job_id,
+            "command": cmd,
+            "waiting_for": conflicts,
+            "log_file": LOG_FILE,
+            "job_log_file": job_log_file(job_id)
+        }), 202
+    try:
+        # Start background job
+        result = start_background_kolla(cmd, job_id=job_id)
+    except Exception as e:
+        return jsonify({"error": f"Failed to start job: {e}", "job_id": job_id}), 500
+
     return jsonify({
         "status": "started",
         "job_id": result["job_id"],
+        "pid": result["pid"],
         "command": cmd,
-        "log_file": LOG_FILE
+        "log_file": LOG_FILE,
+        "job_log_file": job_log_file(result["job_id"])
     })
 
 
-# Returns the last N lines from kolla-ansible command log file for monitoring
-# Provides efficient tail functionality for real-time log monitoring and debugging
+# Lists kolla jobs (newest first) with state, pid, timings and return code
+# Query: ?state=running&limit=50
+@app.route("/kolla/jobs", methods=["GET"])
+def kolla_jobs_list():
+    state = request.args.get("state")
+    limit = request.args.get("limit", 50, type=int)
+    jobs = [j for j in list_kolla_jobs() if not state or j["state"] == state]
+    return jsonify({"jobs": jobs[:limit], "total": len(jobs)})
+
+
+# Returns one kolla job; ?log=1 adds a slice of its own log file
+# Query: ?log=1&offset=0&max_bytes=65536
+@app.route("/kolla/jobs/<job_id>", methods=["GET"])
+def kolla_job_status(job_id):
+    job = get_kolla_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    if request.args.get("log") in ("1", "true", "yes"):
+        offset = request.args.get("offset", 0, type=int)
+        max_bytes = min(request.args.get("max_bytes", 65536, type=int), 4 * 1024 * 1024)
+        kolla_log_flush()
+        path = job_log_file(job_id)
+        chunk = b""
+        size = 0
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            with open(path, "rb") as f:
+                f.seek(max(offset, 0))
+                chunk = f.read(max_bytes)
+        job["log"] = chunk.decode("utf-8", errors="replace")
+        job["log_offset"] = offset
+        job["next_offset"] = offset + len(chunk)
+        job["log_size"] = size
+    return jsonify(job)
+
+
+# Returns structured ansible progress for a kolla job: percent, current task,
+# per-host results, recap and the slowest tasks/roles
+@app.route("/kolla/jobs/<job_id>/progress", methods=["GET"])
+def kolla_job_progress_api(job_id):
+    job = get_kolla_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    running = job["state"] in KOLLA_BUSY_STATES
+    progress = (kolla_progress_summary(job_id) if running else None) or job.get("progress") or {}
+    expected = _expected_task_count(job)
+    if job["state"] == "succeeded":
+        percent = 100.0
+    elif expected and progress.get("tasks_completed") is not None:
+        percent = round(min(99.0, progress["tasks_completed"] * 100.0 / expected), 1)
+    else:
+        percent = None
+    return jsonify({
+        "job_id": job_id,
+        "state": job["state"],
+        "percent": percent,
+        "expected_tasks": expected,
+        **progress,
+    })
+
+
+# Cancels a queued or running kolla job (SIGTERM to its process group, SIGKILL after a grace period)
+@app.route("/kolla/jobs/<job_id>/cancel", methods=["POST"])
+def kolla_job_cancel(job_id):
+    job = cancel_kolla_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+# ----- Kolla log index -----
+# Sparse line index over LOG_FILE: the byte offset of every
+# KOLLA_LOG_INDEX_EVERY-th line, fed by the writer as it flushes and caught up
+# lazily (e.g. after a restart or writes from another worker). Reads go through
+# mmap, so tails, backward paging, line jumps and job slices cost the same on a
+# multi-GB log as on a small one. Job boundaries come from the job registry.
+KOLLA_LOG_INDEX_EVERY = 1000
+KOLLA_LOG_MAX_LINES = 5000
+KOLLA_GREP_MAX_SCAN_BYTES = 64 * 1024 * 1024
+
+kolla_log_index_lock = threading.Lock()
+kolla_log_index = {"inode": None, "size": 0, "lines": 0, "checkpoints": [(0, 0)]}
+
+
+def _kolla_log_index_reset(inode):
+    kolla_log_index.update({"inode": inode, "size": 0, "lines": 0, "checkpoints": [(0, 0)]})
+
+
+def _kolla_log_index_feed_locked(data, at_offset: int):
+    """Account for bytes appended at at_offset (must equal the indexed size)."""
+    idx = kolla_log_index
+    if at_offset != idx["size"]:
+        return
+    count = data.count(b"\n")
+    lines = idx["lines"]
+    next_cp = (lines // KOLLA_LOG_INDEX_EVERY + 1) * KOLLA_LOG_INDEX_EVERY
+    if lines + count >= next_cp:
+        pos = -1
+        for _ in range(count):
+            pos = data.find(b"\n", pos + 1)
+            lines += 1
+            if lines == next_cp:
+                idx["checkpoints"].append((lines, at_offset + pos + 1))
+                next_cp += KOLLA_LOG_INDEX_EVERY
+    else:
+        lines += count
+    idx["lines"] = lines
+    idx["size"] = at_offset + len(data)
+
+
+def kolla_log_index_feed(data: bytes, at_offset: int, inode: int):
+    """Writer hook: index bytes just appended to LOG_FILE."""
+    with kolla_log_index_lock:
+        if kolla_log_index["inode"] != inode:
+            if at_offset != 0:
+                return  # leave it to the lazy sync on the next read
+            _kolla_log_index_reset(inode)
+        _kolla_log_index_feed_locked(data, at_offset)
+
+
+def _kolla_log_index_sync(mm, inode: int):
+    """Bring the index up to the current file size (caller holds the index lock)."""
+    if kolla_log_index["inode"] != inode or kolla_log_index["size"] > len(mm):
+        _kolla_log_index_reset(inode)
+    step = 16 * 1024 * 1024
+    while kolla_log_index["size"] < len(mm):
+        start = kolla_log_index["size"]
+        _kolla_log_index_feed_locked(mm[start:min(start + step, len(mm))], start)
+
+
+def _line_start(mm, offset: int) -> int:
+    return mm.rfind(b"\n", 0, offset) + 1 if offset > 0 else 0
+
+
+def _lines_before(mm, end: int, n: int, floor: int = 0) -> int:
+    """Offset where the n lines ending at `end` begin (not earlier than floor)."""
+    pos = end
+    if pos > floor and mm[pos - 1:pos] == b"\n":
+        pos -= 1  # the newline that terminates the last line
+    start = floor
+    for _ in range(n):
+        nl = mm.rfind(b"\n", floor, pos)
+        if nl < 0:
+            return floor
+        start = pos = nl
+        start += 1
+    return start
+
+
+def _split_lines(mm, start: int, end: int) -> list:
+    """(offset, text) for each line in [start, end)."""
+    result = []
+    pos = start
+    for raw in mm[start:end].split(b"\n"):
+        if pos >= end:
+            break
+        result.append((pos, raw.decode("utf-8", errors="replace").rstrip("\r")))
+        pos += len(raw) + 1
+    return result
+
+
+def _offset_of_line(mm, line_no: int) -> int:
+    """Byte offset of 0-based line_no using the nearest checkpoint, or -1 past EOF."""
+    cps = kolla_log_index["checkpoints"]
+    i = bisect.bisect_right(cps, (line_no, float("inf"))) - 1
+    cp_line, pos = cps[max(i, 0)]
+    for _ in range(line_no - cp_line):
+        nl = mm.find(b"\n", pos)
+        if nl < 0:
+            return -1
+        pos = nl + 1
+    return pos if pos < len(mm) else -1
+
+
+def kolla_job_log_range(job: dict) -> tuple:
+    """
+    (path, start, end) holding a job's output: its byte range in LOG_FILE or in
+    the rotated backup with the recorded inode, else (when the range spans a
+    rotation, the backup is gone or the job predates inodes) its own log file.
+    end is None for "to the end of the file".
+    """
+    inode = job.get("log_inode")
+    if job.get("log_start") is not None and inode is not None:
+        if job.get("log_end") is None:
+            candidates = [LOG_FILE]     # still running: only valid while LOG_FILE was not rotated
+        elif job.get("log_end_inode") == inode:
+            candidates = [LOG_FILE] + [f"{LOG_FILE}.{i}" for i in range(1, KOLLA_LOG_BACKUPS + 1)]
+        else:
+            candidates = []
+        for path in candidates:
+            try:
+                if os.stat(path).st_ino == inode:
+                    return path, job["log_start"], job.get("log_end")
+            except OSError:
+                continue
+    return job_log_file(job["job_id"]), 0, None
+
+
+def _offset_of_line_scan(mm, line_no: int) -> int:
+    """_offset_of_line for a file without an index: walk from the start."""
+    pos = 0
+    for _ in range(line_no):
+        nl = mm.find(b"\n", pos)
+        if nl < 0:
+            return -1
+        pos = nl + 1
+    return pos if pos < len(mm) else -1
+
+
+# Returns lines from the kolla-ansible command log file using the sparse line index
+# Supports exact tails, backward paging, line jumps, per-job slices and server-side grep
 @app.route("/kolla/logs/last", methods=["GET"])
 def kolla_logs_last():
     """
-    Return the last N lines of the log file.
-    Query: ?lines=200
+    Return lines of the log file.
+    Query:
+      ?lines=200                 exact number of lines (max KOLLA_LOG_MAX_LINES)
+      &before=<offset>           page backwards: lines ending before this byte offset
+      &from_line=<n>             page forwards from 0-based line number n
+      &job_id=<id>               restrict to the byte range of one kolla job (in LOG_FILE,
+                                 a rotated backup or the job's own log; see "source")
+      &grep=<regex>&ignore_case=1  only matching lines, with match spans
     """
-    lines = int(request.args.get("lines", 200))
+    lines = max(1, min(request.args.get("lines", 200, type=int), KOLLA_LOG_MAX_LINES))
+    before = request.args.get("before", type=int)
+    from_line = request.args.get("from_line", type=int)
+    job_id = request.args.get("job_id")
+    pattern = request.args.get("grep")
     ensure_paths()
-    if not os.path.exists(LOG_FILE):
-        return jsonify({"log": [], "lines": 0})
-
-    # Efficient tail
-    def tail(filepath, n):
-        with open(filepath, "rb") as f:
-            avg_line_len = 200
-            to_read = n * avg_line_len
+    kolla_log_flush()
+    source, lo, hi = LOG_FILE, 0, None
+    if job_id:
+        job = get_kolla_job(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        source, lo, hi = kolla_job_log_range(job)
+    if not os.path.exists(source) or os.path.getsize(source) == 0:
+        return jsonify({"log": [], "lines": 0, "source": source})
+
+    if pattern:
+        try:
+            regex = re.compile(pattern, re.IGNORECASE if request.args.get("ignore_case") else 0)
+        except re.error as e:
+            return jsonify({"error": f"Invalid grep pattern: {e}"}), 400
+
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        lo = min(lo, size)
+        hi = size if hi is None else min(hi, size)
+        if before is not None:
+            hi = _line_start(mm, max(lo, min(before, hi)))
+
+        with kolla_log_index_lock:
+            if source == LOG_FILE:
+                _kolla_log_index_sync(mm, os.fstat(f.fileno()).st_ino)
+                total_lines = kolla_log_index["lines"]
+            else:
+                total_lines = None   # backups and job logs are not indexed
+            if from_line is not None and not pattern:
+                if source == LOG_FILE:
+                    start = _offset_of_line(mm, max(from_line, 0))
+                else:
+                    start = _offset_of_line_scan(mm, max(from_line, 0))
+                if start < 0:
+                    return jsonify({"log": [], "lines": 0, "total_lines": total_lines, "source": source})
+                end = start
+                for _ in range(lines):
+                    nl = mm.find(b"\n", end)
+                    end = size if nl < 0 else nl + 1
+                    if end >= size:
+                        break
+                picked = _split_lines(mm, start, end)
+                return jsonify({
+                    "log": [t for _, t in picked],
+                    "lines": len(picked),
+                    "offsets": [o for o, _ in picked],
+                    "from_line": from_line,
+                    "next_from_line": from_line + len(picked),
+                    "total_lines": total_lines,
+                    "source": source,
+                })
+
+        if pattern:
+            # Scan backwards in bounded windows until enough matches are found
+            matches = []
+            scan_floor = max(lo, hi - KOLLA_GREP_MAX_SCAN_BYTES)
+            end = hi
+            while end > scan_floor and len(matches) < lines:
+                start = max(lo, _line_start(mm, max(scan_floor, end - 4 * 1024 * 1024)))
+                block = []
+                for offset, text in _split_lines(mm, start, end):
+                    spans = [[m.start(), m.end()] for m in regex.finditer(text)]
+                    if spans:
+                        block.append({"offset": offset, "line": text, "spans": spans})
+                matches = block + matches
+                end = start
+            matches = matches[-lines:]
+            return jsonify({
+                "log": [m["line"] for m in matches],
+                "lines": len(matches),
+                "matches": matches,
+                "scanned_from": end,
+                "next_before": matches[0]["offset"] if matches else end,
+                "total_lines": total_lines,
+                "source": source,
+            })
+
+        start = _lines_before(mm, hi, lines, floor=lo)
+        picked = _split_lines(mm, start, hi)[-lines:]
+        return jsonify({
+            "log": [t for _, t in picked],
+            "lines": len(picked),
+            "offsets": [o for o, _ in picked],
+            "next_before": picked[0][0] if picked and picked[0][0] > lo else None,
+            "total_lines": total_lines,
+            "source": source,
+        })
+
+
+# ----- Kolla log broadcaster -----
+# One tailer thread follows LOG_FILE (woken by inotify on LOG_DIR, or by a
+# short poll where inotify is unavailable), reads new bytes once and fans the
+# complete lines out to every SSE subscriber through a bounded queue. A client
+# that falls behind is marked for resync and catches up from the file itself.
+# Event ids are byte offsets in LOG_FILE, so EventSource reconnects resume via
+# Last-Event-ID.
+KOLLA_STREAM_QUEUE_BATCHES = 256        # batches buffered per client before resync
+KOLLA_STREAM_HEARTBEAT_SECONDS = 15
+KOLLA_STREAM_CATCHUP_BYTES = 1024 * 1024  # max bytes replayed on resume/resync
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+
+KOLLA_STREAM_ROTATED = "rotated"
+
+kolla_stream_lock = threading.Lock()
+kolla_stream_state = {"subscribers": [], "offset": 0, "started": False}
+
+
+def _inotify_watch_dir(path: str, mask: int = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) -> Optional[int]:
+    """Return a non-blocking inotify fd watching path, or None if unsupported."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, path.encode(), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _kolla_stream_publish(lines: list):
+    """Hand a batch of (end_offset, text) lines to every subscriber."""
+    with kolla_stream_lock:
+        kolla_stream_state["offset"] = lines[-1][0]
+        for sub in kolla_stream_state["subscribers"]:
+            if sub["overflow"]:
+                continue
             try:
-                f.seek(0, os.SEEK_END)
-                file_size = f.tell()
-                f.seek(max(file_size - to_read, 0), os.SEEK_SET)
-            except OSError:
-                f.seek(0)
-            lines_bytes = f.read().splitlines()[-n:]
-            return [lb.decode("utf-8", errors="replace") for lb in lines_bytes]
+                sub["queue"].put_nowait(lines)
+            except queue.Full:
+                sub["overflow"] = True
+
+
+def _kolla_stream_publish_rotation():
+    """Offsets restart at zero in a rotated log; tell subscribers to reset."""
+    with kolla_stream_lock:
+        kolla_stream_state["offset"] = 0
+        for sub in kolla_stream_state["subscribers"]:
+            try:
+                sub["queue"].put_nowait(KOLLA_STREAM_ROTATED)
+            except queue.Full:
+                sub["overflow"] = True
+
+
+def _kolla_stream_tailer():
+    ensure_paths()
+    fd = _inotify_watch_dir(LOG_DIR)
+    handle = None
+    inode = None
+    partial = b""
+    while True:
+        try:
+            if fd is not None:
+                ready, _, _ = select.select([fd], [], [], KOLLA_STREAM_HEARTBEAT_SECONDS)
+                if ready:
+                    try:
+                        while os.read(fd, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+            else:
+                time.sleep(0.5)
 
-    last = tail(LOG_FILE, lines)
-    return jsonify({"log": last, "lines": len(last)})
+            try:
+                current_inode = os.stat(LOG_FILE).st_ino
+            except FileNotFoundError:
+                continue
+            if handle is None or current_inode != inode:
+                # First open or the log was rotated: follow the new file from the start
+                if handle is not None:
+                    handle.close()
+                    _kolla_stream_publish_rotation()
+                handle = open(LOG_FILE, "rb")
+                if inode is None:
+                    handle.seek(kolla_stream_state["offset"])
+                inode = current_inode
+                partial = b""
+
+            data = handle.read()
+            if not data:
+                continue
+            base = handle.tell() - len(data) - len(partial)
+            data = partial + data
+            cut = data.rfind(b"\n") + 1
+            partial = data[cut:]
+            lines = []
+            for raw in data[:cut].splitlines(keepends=True):
+                base += len(raw)
+                lines.append((base, raw.decode("utf-8", errors="replace").rstrip("\r\n")))
+            if lines:
+                _kolla_stream_publish(lines)
+        except Exception as e:
+            logging.exception("Kolla log tailer error: %s", e)
+            time.sleep(1)
+
+
+def _ensure_kolla_stream_tailer():
+    with kolla_stream_lock:
+        if kolla_stream_state["started"]:
+            return
+        kolla_stream_state["started"] = True
+        kolla_log_flush()
+        try:
+            kolla_stream_state["offset"] = os.path.getsize(LOG_FILE)
+        except OSError:
+            kolla_stream_state["offset"] = 0
+    threading.Thread(target=_kolla_stream_tailer, daemon=True).start()
+
+
+def read_log_lines(start: int, end: int) -> list:
+    """Return (end_offset, text) for the complete lines between two byte offsets."""
+    if end <= start:
+        return []
+    with open(LOG_FILE, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = []
+    offset = start
+    for raw in data.splitlines(keepends=True):
+        offset += len(raw)
+        lines.append((offset, raw.decode("utf-8", errors="replace").rstrip("\r\n")))
+    return lines
 
 
 # Provides Server-Sent Events (SSE) stream for real-time kolla-ansible log monitoring
-# Enables live log streaming for continuous monitoring of deployment and configuration processes
+# All clients share one tailer; supports Last-Event-ID resume and sends heartbeats
 @app.route("/kolla/logs/stream", methods=["GET"])
 def kolla_logs_stream():
     """
     Server-Sent Events (SSE) endpoint to live-tail the log file.
     Frontend can connect with EventSource('/kolla/logs/stream').
+    Each event id is the byte offset just past the line; a reconnect with
+    Last-Event-ID (or ?offset=N) replays what was missed.
     """
     ensure_paths()
+    _ensure_kolla_stream_tailer()
+
+    resume = request.headers.get("Last-Event-ID") or request.args.get("offset")
+    try:
+        resume = int(resume) if resume is not None else None
+    except ValueError:
+        resume = None
+
+    sub = {"queue": queue.Queue(maxsize=KOLLA_STREAM_QUEUE_BATCHES), "overflow": False}
+    with kolla_stream_lock:
+        kolla_stream_state["subscribers"].append(sub)
+        start = kolla_stream_state["offset"]
+
+    def event(offset, text):
+        return f"id: {offset}\ndata: {text}\n\n"
 
     def generate():
-        # Start at end of file
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            f.seek(0, os.SEEK_END)
+        delivered = start
+        try:
+            yield "retry: 3000\n\n"
+            if resume is not None and start - KOLLA_STREAM_CATCHUP_BYTES <= resume < start:
+                for offset, text in read_log_lines(resume, start):
+                    yield event(offset, text)
+            elif resume is not None and resume < start:
+                yield f"event: resync\ndata: {start - resume} bytes skipped\n\n"
+
             while True:
-                line = f.readline()
-                if line:
-                    # SSE format: "data: <line>\n\n"
-                    yield f"data: {line.rstrip()}\n\n"
-                else:
-                    time.sleep(0.5)
+                if sub["overflow"]:
+                    # Slow client: drop queued batches and catch up from the file
+                    with kolla_stream_lock:
+                        while not sub["queue"].empty():
+                            sub["queue"].get_nowait()
+                        sub["overflow"] = False
+                        target = kolla_stream_state["offset"]
+                    if target < delivered or target - delivered > KOLLA_STREAM_CATCHUP_BYTES:
+                        yield f"event: resync\ndata: {target - delivered} bytes skipped\n\n"
+                    else:
+                        for offset, text in read_log_lines(delivered, target):
+                            yield event(offset, text)
+                    delivered = target
+                    continue
+                try:
+                    batch = sub["queue"].get(timeout=KOLLA_STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Heartbeat comment; a write to a closed connection ends the generator
+                    yield ": keepalive\n\n"
+                    continue
+                if batch == KOLLA_STREAM_ROTATED:
+                    yield "event: resync\ndata: log rotated\n\n"
+                    delivered = 0
+                    continue
+                for offset, text in batch:
+                    if offset <= delivered:
+                        continue
+                    yield event(offset, text)
+                    delivered = offset
+        finally:
+            with kolla_stream_lock:
+                if sub in kolla_stream_state["subscribers"]:
+                    kolla_stream_state["subscribers"].remove(sub)
 
     headers = {
         "Content-Type": "text/event-stream",
@@ -2887,68 +4480,504 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 JOBS_DIR = os.path.join(UPLOAD_FOLDER, "jobs")
 os.makedirs(JOBS_DIR, exist_ok=True)
 
-def _job_file(job_id: str) -> str:
-    return os.path.join(JOBS_DIR, f"{job_id}.json")
+# ----- Lifecycle job store -----
+# Job records live in a small SQLite database (WAL mode) in JOBS_DIR, indexed
+# by kind ("upgrade", "diagnostic"), state and creation time. The "is anything
+# running" check reads the state index rather than process memory, so it holds
+# across gunicorn workers, and claim_job_slot() makes check-and-insert atomic.
+# On first open jobs left queued/running by a dead process are marked failed,
+# legacy <job_id>.json files are imported, and old jobs are evicted together
+# with their logs and extracted folders.
+LIFECYCLE_ACTIVE_STATES = ("queued", "running")
+LIFECYCLE_JOB_RETENTION = 200               # most recent jobs kept
+LIFECYCLE_JOB_MAX_AGE = 30 * 24 * 3600      # finished jobs older than this are evicted
+
+lifecycle_store_lock = threading.RLock()
+lifecycle_store = {"conn": None, "path": None}
+metrics.describe("pinaka_job_duration_seconds", "histogram",
+                 "Background job run time by kind (upgrade, diagnostic, kolla) and final state",
+                 buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400))
+
+
+def _lifecycle_db():
+    """Return the shared connection, opening and recovering the store on first use."""
+    path = os.path.join(JOBS_DIR, "jobs.db")
+    with lifecycle_store_lock:
+        if lifecycle_store["conn"] is not None and lifecycle_store["path"] == path:
+            return lifecycle_store["conn"]
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS lifecycle_jobs ("
+            " job_id TEXT PRIMARY KEY, state TEXT NOT NULL, created_at INTEGER NOT NULL,"
+            " updated_at INTEGER NOT NULL, filename TEXT, data TEXT NOT NULL)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(lifecycle_jobs)")}
+        if "kind" not in columns:
+            conn.execute("ALTER TABLE lifecycle_jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'upgrade'")
+        conn.execute("CREATE INDEX IF NOT EXISTS lifecycle_jobs_kind ON lifecycle_jobs (kind, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS lifecycle_jobs_state ON lifecycle_jobs (state)")
+        conn.execute("CREATE INDEX IF NOT EXISTS lifecycle_jobs_created ON lifecycle_jobs (created_at)")
+        lifecycle_store.update({"conn": conn, "path": path})
+        _import_legacy_jobs(conn)
+        _recover_lifecycle_jobs(conn)
+        evict_lifecycle_jobs()
+        return conn
+
+
+def _write_job_row(conn, job_id: str, data: dict):
+    conn.execute(
+        "INSERT INTO lifecycle_jobs (job_id, kind, state, created_at, updated_at, filename, data)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT(job_id) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at,"
+        " filename=excluded.filename, data=excluded.data",
+        (job_id, data.get("kind", "upgrade"), data.get("state", "queued"),
+         int(data.get("created_at") or time.time()), int(time.time()), data.get("filename"), json.dumps(data)),
+    )
+
+
+def _import_legacy_jobs(conn):
+    """Move job records written as <job_id>.json by older versions into the database."""
+    for fname in os.listdir(JOBS_DIR):
+        if not fname.endswith(".json"):
+            continue
+        path = os.path.join(JOBS_DIR, fname)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            for legacy in ("output", "errors"):
+                data.pop(legacy, None)
+            _write_job_row(conn, data.get("job_id") or fname[:-5], data)
+            os.remove(path)
+        except Exception:
+            # Ignore malformed job files
+            continue
+
+
+def _recover_lifecycle_jobs(conn):
+    """Fail jobs whose owning process is gone (other workers' jobs are left alone)."""
+    rows = conn.execute(
+        "SELECT job_id, data FROM lifecycle_jobs WHERE state IN (?, ?)", LIFECYCLE_ACTIVE_STATES
+    ).fetchall()
+    for job_id, raw in rows:
+        data = json.loads(raw)
+        owner = data.get("pid")
+        if owner and owner != os.getpid() and shared_state.pid_alive(owner):
+            continue
+        data.update({
+            "state": "failed",
+            "message": "Interrupted by service restart",
+            "finished_at": int(time.time()),
+        })
+        _write_job_row(conn, job_id, data)
+
 
 def save_job_status(job_id: str, data: dict):
-    tmp_path = _job_file(job_id) + ".tmp"
-    with open(tmp_path, "w") as f:
-        json.dump(data, f, indent=2)
-    os.replace(tmp_path, _job_file(job_id))
+    data["pid"] = os.getpid()
+    with lifecycle_store_lock:
+        _write_job_row(_lifecycle_db(), job_id, data)
+
+def claim_job_slot(job_id: str, data: dict) -> Optional[str]:
+    """
+    Record a new job unless one of the same kind is already queued/running in
+    any worker. Returns None when recorded, else the id of the active job.
+    """
+    data["pid"] = os.getpid()
+    with lifecycle_store_lock:
+        conn = _lifecycle_db()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT job_id FROM lifecycle_jobs WHERE kind = ? AND state IN (?, ?) LIMIT 1",
+                (data.get("kind", "upgrade"),) + LIFECYCLE_ACTIVE_STATES,
+            ).fetchone()
+            if row:
+                return row[0]
+            _write_job_row(conn, job_id, data)
+    return None
 
 def load_job_status(job_id: str) -> Optional[dict]:
-    path = _job_file(job_id)
+    with lifecycle_store_lock:
+        row = _lifecycle_db().execute(
+            "SELECT data FROM lifecycle_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def list_job_status(state: Optional[str] = None, limit: int = 50, offset: int = 0, kind: str = "upgrade"):
+    """Return (jobs, total) of one kind, newest first."""
+    where, args = "WHERE kind = ?", (kind,)
+    if state:
+        where, args = where + " AND state = ?", args + (state,)
+    with lifecycle_store_lock:
+        conn = _lifecycle_db()
+        total = conn.execute(f"SELECT COUNT(*) FROM lifecycle_jobs {where}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT data FROM lifecycle_jobs {where} ORDER BY created_at DESC, job_id LIMIT ? OFFSET ?",
+            args + (limit, offset),
+        ).fetchall()
+    return [json.loads(r[0]) for r in rows], total
+
+def active_job_ids(kind: str = "upgrade") -> list:
+    """Return the ids of queued/running jobs of one kind."""
+    with lifecycle_store_lock:
+        rows = _lifecycle_db().execute(
+            "SELECT job_id FROM lifecycle_jobs WHERE kind = ? AND state IN (?, ?)",
+            (kind,) + LIFECYCLE_ACTIVE_STATES,
+        ).fetchall()
+    return [r[0] for r in rows]
+
+def any_active_job_running(kind: str = "upgrade") -> bool:
+    """Return True if a lifecycle job of this kind is queued or running."""
+    return bool(active_job_ids(kind))
+
+def evict_lifecycle_jobs():
+    """Drop finished jobs beyond the retention limits, with their logs and extracted folders."""
+    with lifecycle_store_lock:
+        conn = _lifecycle_db()
+        placeholders = ", ".join("?" * len(LIFECYCLE_ACTIVE_STATES))
+        rows = conn.execute(
+            f"SELECT job_id, filename, created_at FROM lifecycle_jobs WHERE state NOT IN ({placeholders})"
+            " ORDER BY created_at DESC",
+            LIFECYCLE_ACTIVE_STATES,
+        ).fetchall()
+        cutoff = time.time() - LIFECYCLE_JOB_MAX_AGE
+        evicted = [r for i, r in enumerate(rows) if i >= LIFECYCLE_JOB_RETENTION or r[2] < cutoff]
+        if not evicted:
+            return 0
+        conn.executemany("DELETE FROM lifecycle_jobs WHERE job_id = ?", [(r[0],) for r in evicted])
+        kept = {r[0] for r in conn.execute("SELECT filename FROM lifecycle_jobs").fetchall()}
+
+    for job_id, filename, _ in evicted:
+        try:
+            os.remove(lifecycle_log_file(job_id))
+        except OSError:
+            pass
+        # Only remove a bundle/folder no surviving job refers to
+        if filename and filename not in kept:
+            folder = os.path.join(UPLOAD_FOLDER, os.path.basename(filename)[:-4])
+            if os.path.isdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
+            bundle = os.path.join(UPLOAD_FOLDER, os.path.basename(filename))
+            if os.path.isfile(bundle):
+                os.remove(bundle)
+    return len(evicted)
+
+# ----- Lifecycle job logs -----
+# Script output (upgrade.sh, diagnostic.sh) is streamed chunk by chunk into
+# JOBS_DIR/<job_id>.log as it is produced; the job JSON only carries the state
+# machine and the log size in bytes (plus a small log tail as "errors" once a
+# job fails), so status polls stay small and memory stays flat for chatty scripts.
+LIFECYCLE_READ_CHUNK = 64 * 1024
+LIFECYCLE_STATUS_SAVE_SECONDS = 2         # how often a running job records its log size
+UPGRADE_HISTORY_LOG_BYTES = 4 * 1024 * 1024  # tail of the log sent to lifecycle history
+LIFECYCLE_STREAM_POLL_SECONDS = 0.5
+LIFECYCLE_STREAM_HEARTBEAT_SECONDS = 15
+LIFECYCLE_TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+LIFECYCLE_ERROR_TAIL_BYTES = 4096         # log tail kept as "errors" on a failed job
+
+def lifecycle_log_file(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.log")
+
+def read_lifecycle_log(job_id: str, offset: int = 0, max_bytes: int = LIFECYCLE_READ_CHUNK) -> bytes:
+    """Return up to max_bytes of the job's log starting at a byte offset."""
+    path = lifecycle_log_file(job_id)
     if not os.path.exists(path):
-        return None
-    with open(path, "r") as f:
-        return json.load(f)
-
-def any_active_job_running() -> bool:
-    """Return True if any job in JOBS_DIR is currently running."""
-    try:
-        for fname in os.listdir(JOBS_DIR):
-            if not fname.endswith(".json"):
-                continue
-            try:
-                with open(os.path.join(JOBS_DIR, fname), "r") as f:
-                    data = json.load(f)
-                    if data.get("state") == "running":
-                        return True
-            except Exception:
-                # Ignore malformed job files
-                continue
-    except FileNotFoundError:
-        return False
-    return False
+        return b""
+    with open(path, "rb") as f:
+        f.seek(max(offset, 0))
+        return f.read(max_bytes)
+
+def lifecycle_log_tail(job_id: str, log_size: int, max_bytes: int = LIFECYCLE_ERROR_TAIL_BYTES) -> str:
+    """Last max_bytes of the job's log as text (what the UI shows for a failed job)."""
+    start = max(log_size - max_bytes, 0)
+    return read_lifecycle_log(job_id, start, max_bytes).decode("utf-8", errors="replace")
+
+def stream_job_output(job_id: str, status: dict, proc) -> int:
+    """Copy a job's merged stdout/stderr into its log as it arrives; return the exit code."""
+    status["log_size"] = 0
+    last_save = time.time()
+    with open(lifecycle_log_file(job_id), "wb", buffering=0) as log_f:
+        for chunk in iter(lambda: proc.stdout.read1(LIFECYCLE_READ_CHUNK), b""):
+            log_f.write(chunk)
+            status["log_size"] += len(chunk)
+            if time.time() - last_save >= LIFECYCLE_STATUS_SAVE_SECONDS:
+                save_job_status(job_id, status)
+                last_save = time.time()
+    return proc.wait()
 
 def is_zip_encrypted(zip_path):
-    """Check if the ZIP file is encrypted."""
+    """Check if the ZIP file is encrypted, from the central directory flags only."""
     with zipfile.ZipFile(zip_path) as zf:
+        members = [zi for zi in zf.infolist() if not zi.is_dir()]
+        return bool(members) and all(zi.flag_bits & 0x1 for zi in members)
+
+
+# ----- Streaming upload ingest -----
+# The uploaded bundle is written straight from the request stream to a .part
+# file of its own (concurrent uploads of the same name never share one)
+# through a bounded buffer, hashed on the fly. Local file headers are
+# inspected as they arrive so a bundle that is not a ZIP, or whose first file
+# member is not encrypted, is rejected before the rest of the upload is read.
+# The part file only replaces the bundle once the upload has claimed the job
+# slot, so a rejected upload never touches a bundle another job is using.
+UPLOAD_BUFFER_BYTES = 1024 * 1024
+UPLOAD_ALLOWED_MIMETYPES = ("application/zip", "application/x-zip-compressed", "application/octet-stream")
+ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+
+class ZipIngestWriter:
+    """Write-only sink for an uploaded ZIP: hashes, sniffs headers and lands the file."""
+
+    def __init__(self, final_path: str):
+        self.final_path = final_path
+        self.part_path = f"{final_path}.{uuid.uuid4().hex[:8]}.part"
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._scan = b""          # bytes not yet consumed by the header walker
+        self._scan_skip = 0       # member data still to skip before the next header
+        self._verified = False
+        self._file = open(self.part_path, "wb", buffering=UPLOAD_BUFFER_BYTES)
+
+    def _walk_local_headers(self, data: bytes):
+        """Find the first file member and require its encryption flag."""
+        self._scan += data
+        while not self._verified:
+            if self._scan_skip:
+                skipped = min(self._scan_skip, len(self._scan))
+                self._scan = self._scan[skipped:]
+                self._scan_skip -= skipped
+                if self._scan_skip:
+                    return
+            if len(self._scan) < ZIP_LOCAL_HEADER.size:
+                return
+            sig, _, flags, _, _, _, _, comp_size, _, name_len, extra_len = ZIP_LOCAL_HEADER.unpack_from(self._scan)
+            if sig != ZIP_LOCAL_SIGNATURE:
+                raise ValueError("Uploaded file is not a ZIP archive")
+            header_len = ZIP_LOCAL_HEADER.size + name_len + extra_len
+            if len(self._scan) < header_len:
+                return
+            name = self._scan[ZIP_LOCAL_HEADER.size:ZIP_LOCAL_HEADER.size + name_len]
+            if not name.endswith(b"/"):
+                if not flags & 0x1:
+                    raise ValueError("ZIP file is not PP")
+                self._verified = True
+            elif flags & 0x8:
+                # Sizes follow the data; leave the decision to the central directory
+                self._verified = True
+            else:
+                self._scan = self._scan[header_len:]
+                self._scan_skip = comp_size
+                continue
+        self._scan = b""
+
+    def write(self, data: bytes):
+        if not self._verified:
+            self._walk_local_headers(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        self._file.write(data)
+        return len(data)
+
+    def seek(self, *args):
+        # werkzeug rewinds file parts before wrapping them; nothing is read back
+        return 0
+
+    def finish(self):
+        """Close the part file and check the central directory."""
+        self._file.close()
+        try:
+            if not zipfile.is_zipfile(self.part_path):
+                raise ValueError("Uploaded file is not a ZIP archive")
+            if not is_zip_encrypted(self.part_path):
+                raise ValueError("ZIP file is not PP")
+        except Exception:
+            self.abort()
+            raise
+
+    def commit(self):
+        """Move the checked part file into place."""
+        os.replace(self.part_path, self.final_path)
+
+    def abort(self):
         try:
-            zf.testzip()  # Try reading without a password
-            return False  # If it succeeds, it's NOT encrypted
-        except RuntimeError:
-            return True  # If it raises an error, it's encrypted
+            self._file.close()
+        except Exception:
+            pass
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+def ingest_upload_stream():
+    """
+    Stream the upload in the current request to a part file in UPLOAD_FOLDER.
+    Accepts multipart/form-data (field "file") or a raw ZIP body with
+    ?filename= / X-Filename. Returns (filename, writer, form); the caller
+    commits or aborts the writer.
+    """
+    writers = []   # every writer opened, so each part file is committed or aborted
+
+    def target_for(filename):
+        filename = os.path.basename(filename or "")
+        if not filename.endswith(".zip"):
+            raise ValueError("Only .zip files are allowed")
+        writer = ZipIngestWriter(os.path.join(UPLOAD_FOLDER, filename))
+        writers.append(writer)
+        return writer
+
+    try:
+        if request.mimetype in UPLOAD_ALLOWED_MIMETYPES:
+            filename = request.args.get("filename") or request.headers.get("X-Filename")
+            writer = target_for(filename)
+            while True:
+                chunk = request.stream.read(UPLOAD_BUFFER_BYTES)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            form = request.args
+        else:
+            def stream_factory(total_content_length, content_type, filename, content_length=None):
+                return target_for(filename)
+
+            _, form, files = formparser.parse_form_data(
+                request.environ, stream_factory=stream_factory, silent=False)
+            if "file" not in files:
+                raise LookupError("No file part")
+            filename = os.path.basename(files["file"].filename)
+            # The stream werkzeug handed back for the "file" field is our writer
+            writer = files["file"].stream
+        for other in writers:
+            if other is not writer:
+                other.abort()
+        writer.finish()
+        return filename, writer, form
+    except Exception:
+        for writer in writers:
+            writer.abort()
+        raise
+
+
+# ----- Bundle extraction -----
+# The central directory is checked first (member count, declared sizes,
+# compression ratio, unsafe paths, pinaka/ layout, only upgrade.sh) so a bad
+# bundle fails before anything is written. Members are then decrypted and
+# inflated by a process pool (forkserver, see bundle_extract.py), each worker
+# opening its own handle on the ZIP, into a staging directory that is renamed
+# into place only when every member landed. Written bytes are counted as they are inflated, so a member whose
+# header lies about its size is caught too.
+BUNDLE_MAX_MEMBERS = 10000
+BUNDLE_MAX_BYTES = 16 * 1024 * 1024 * 1024   # total uncompressed size
+BUNDLE_MAX_RATIO = 200                       # uncompressed/compressed per member
+BUNDLE_PARALLEL_MIN_BYTES = 32 * 1024 * 1024 # below this, extract in-process
+BUNDLE_MAX_WORKERS = 4
+_bundle_mp = {"context": None}
+
+
+def plan_bundle_extraction(zip_path: str) -> list:
+    """Validate the central directory and return the file members to extract."""
+    with zipfile.ZipFile(zip_path) as zf:
+        infos = zf.infolist()
+    if len(infos) > BUNDLE_MAX_MEMBERS:
+        raise ValueError("Bundle has too many members")
+
+    members = []
+    total = 0
+    for zi in infos:
+        name = zi.filename
+        parts = name.replace("\\", "/").split("/")
+        if name.startswith("/") or ".." in parts or ":" in parts[0]:
+            raise ValueError("Invalid file structure")
+        if zi.is_dir():
+            continue
+        total += zi.file_size
+        if total > BUNDLE_MAX_BYTES:
+            raise ValueError("Bundle exceeds the extraction size limit")
+        if zi.file_size > 1024 * 1024 and zi.file_size > BUNDLE_MAX_RATIO * max(zi.compress_size, 1):
+            raise ValueError("Bundle member has a suspicious compression ratio")
+        members.append(zi)
+
+    if not any(zi.filename.startswith("pinaka/") for zi in members):
+        raise ValueError("Invalid file structure")
+    shell_scripts = {
+        zi.filename[len("pinaka/"):] for zi in members
+        if zi.filename.startswith("pinaka/") and zi.filename.count("/") == 1 and zi.filename.endswith(".sh")
+    }
+    if shell_scripts != {"upgrade.sh"}:
+        raise ValueError("Invalid file(s) found")
+    return members
+
+
+def _bundle_pool_context():
+    """forkserver context for the extraction pool (see bundle_extract.py)."""
+    if _bundle_mp["context"] is None:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["bundle_extract"])
+        _bundle_mp["context"] = ctx
+    return _bundle_mp["context"]
+
+
+def extract_bundle(zip_path: str, extract_folder: str, pwd: bytes) -> dict:
+    """Extract a validated bundle into extract_folder via a staging directory."""
+    started = time.time()
+    members = plan_bundle_extraction(zip_path)
+    total = sum(zi.file_size for zi in members)
+    staging = f"{extract_folder}.staging-{uuid.uuid4().hex[:8]}"
+    os.makedirs(staging)
+
+    workers = min(BUNDLE_MAX_WORKERS, os.cpu_count() or 1, len(members))
+    if total < BUNDLE_PARALLEL_MIN_BYTES:
+        workers = 1
+    # Spread members over the workers by compressed size, largest first
+    buckets = [[0, []] for _ in range(max(workers, 1))]
+    for zi in sorted(members, key=lambda zi: zi.compress_size, reverse=True):
+        bucket = min(buckets, key=lambda b: b[0])
+        bucket[0] += zi.compress_size
+        bucket[1].append(zi.filename)
+
+    try:
+        if workers <= 1:
+            written = bundle_extract.extract_members(zip_path, buckets[0][1], staging, pwd)
+        else:
+            ctx = _bundle_pool_context()
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                futures = [pool.submit(bundle_extract.extract_members, zip_path, names, staging, pwd)
+                           for _, names in buckets if names]
+                written = 0
+                for future in concurrent.futures.as_completed(futures):
+                    written += future.result()
+
+        if os.path.exists(extract_folder):
+            shutil.rmtree(extract_folder)
+        os.rename(staging, extract_folder)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return {
+        "members": len(members),
+        "bytes": written,
+        "workers": workers,
+        "seconds": round(time.time() - started, 2),
+    }
+
 
 # Handles encrypted ZIP file uploads for lifecycle management and system updates
-# Extracts, validates, and executes upgrade scripts with comprehensive error handling
+# Streams the bundle to disk with on-the-fly SHA-256 and early rejection of bad bundles
 @app.route("/upload", methods=["POST"])
 def upload_file():
     # Prevent concurrent runs while a script is active
     if any_active_job_running():
         return jsonify({"error": "A script is already running. Please wait for it to finish."}), 409
 
-    if "file" not in request.files:
-        return jsonify({"error": "No file part"}), 400
-
-    file = request.files["file"]
-    if not file.filename.endswith(".zip"):
-        return jsonify({"error": "Only .zip files are allowed"}), 400
+    try:
+        filename, writer, form = ingest_upload_stream()
+    except (LookupError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
 
-    filename = file.filename
     file_path = os.path.join(UPLOAD_FOLDER, filename)
     extract_folder = os.path.join(UPLOAD_FOLDER, filename[:-4])
-    file.save(file_path)
 
     job_id = str(uuid.uuid4())
     job_status = {
@@ -2957,13 +4986,26 @@ def upload_file():
         "created_at": int(time.time()),
         "state": "queued",
         "message": "Upload received",
+        "size_bytes": writer.size,
+        "sha256": writer.sha256.hexdigest(),
     }
-    save_job_status(job_id, job_status)
+    if claim_job_slot(job_id, job_status):
+        # Another worker started a job while this upload was streaming
+        writer.abort()
+        return jsonify({"error": "A script is already running. Please wait for it to finish."}), 409
+    try:
+        writer.commit()
+    except OSError as e:
+        writer.abort()
+        save_job_status(job_id, dict(job_status, state="failed", message=f"Could not store upload: {e}",
+                                     finished_at=int(time.time())))
+        return jsonify({"error": f"Could not store upload: {e}"}), 500
 
     def process_upload(job_id: str, file_path: str, extract_folder: str, host_ip: str):
         is_valid = True
         readme_content = "README file not found."
         status = load_job_status(job_id) or {}
+        started = time.time()
         try:
             # Mark as running
             status.update({
@@ -2977,17 +5019,11 @@ def upload_file():
             if not is_zip_encrypted(file_path):
                 raise ValueError("ZIP file is not PP")
 
-            # Extract using password
-            with zipfile.ZipFile(file_path) as zf:
-                try:
-                    zf.extractall(extract_folder, pwd=ZIP_PASSWORD)
-                except RuntimeError:
-                    raise ValueError("Invalid code")
-
-            # Validate structure
+            # Validate the layout from the central directory, then extract in parallel
+            status["message"] = "Extracting bundle"
+            save_job_status(job_id, status)
+            status["extract"] = extract_bundle(file_path, extract_folder, ZIP_PASSWORD)
             pinaka_folder = os.path.join(extract_folder, "pinaka")
-            if not os.path.exists(pinaka_folder) or not os.path.isdir(pinaka_folder):
-                raise ValueError("Invalid file structure")
 
             # Read README
             readme_file_path = os.path.join(pinaka_folder, "README")
@@ -2995,36 +5031,35 @@ def upload_file():
                 with open(readme_file_path, "r") as readme_file:
                     readme_content = readme_file.read()
 
-            # Ensure only upgrade.sh exists
-            shell_scripts = [f for f in os.listdir(pinaka_folder) if f.endswith(".sh")]
-            if len(shell_scripts) != 1 or "upgrade.sh" not in shell_scripts:
-                raise ValueError("Invalid file(s) found")
-
             upgrade_script = os.path.join(pinaka_folder, "upgrade.sh")
             os.chmod(upgrade_script, 0o755)
 
-            # Run script
-            result = subprocess.run(
+            # Run script, streaming stdout+stderr into the job log as it arrives
+            status.update({"message": "Script running", "log_size": 0})
+            save_job_status(job_id, status)
+            proc = subprocess.Popen(
                 ["bash", upgrade_script],
                 cwd=pinaka_folder,
-                capture_output=True,
-                text=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
             )
+            returncode = stream_job_output(job_id, status, proc)
 
             # Update final status
             terminal = {
                 "finished_at": int(time.time()),
-                "output": result.stdout,
-                "errors": result.stderr,
+                "exit_code": returncode,
                 "readme": readme_content,
             }
-            if result.returncode == 0:
+            if returncode == 0:
                 status.update({"state": "succeeded", "message": "Script finished successfully", **terminal})
             else:
                 is_valid = False
                 status.update({
                     "state": "failed",
-                    "message": f"Script exited with code {result.returncode}",
+                    "message": f"Script exited with code {returncode}",
+                    "errors": lifecycle_log_tail(job_id, status.get("log_size", 0)),
                     **terminal
                 })
             save_job_status(job_id, status)
@@ -3042,11 +5077,15 @@ def upload_file():
                     if not info_line:
                         info_line = "Patch applied"
 
-                    # Combine README, STDOUT, and STDERR into a single log text
+                    # Combine README and the (tail of the) script output into a single log text
+                    log_size = status.get("log_size", 0)
+                    tail_start = max(log_size - UPGRADE_HISTORY_LOG_BYTES, 0)
+                    output = read_lifecycle_log(job_id, tail_start, UPGRADE_HISTORY_LOG_BYTES)
                     log_text = (
                         "=== README ===\n" + (status.get("readme", "") or "") +
-                        "\n\n=== STDOUT ===\n" + (status.get("output", "") or "") +
-                        "\n\n=== STDERR ===\n" + (status.get("errors", "") or "")
+                        "\n\n=== OUTPUT ===\n" +
+                        ("[... earlier output truncated ...]\n" if tail_start else "") +
+                        output.decode("utf-8", errors="replace")
                     )
 
                     payload = {
@@ -3075,6 +5114,8 @@ def upload_file():
                 "message": str(e),
                 "finished_at": int(time.time()),
             })
+            if status.get("log_size"):
+                status["errors"] = lifecycle_log_tail(job_id, status["log_size"])
             save_job_status(job_id, status)
         except Exception as e:
             is_valid = False
@@ -3083,6 +5124,8 @@ def upload_file():
                 "message": f"Unexpected error: {str(e)}",
                 "finished_at": int(time.time()),
             })
+            if status.get("log_size"):
+                status["errors"] = lifecycle_log_tail(job_id, status["log_size"])
             save_job_status(job_id, status)
         finally:
             if not is_valid:
@@ -3092,13 +5135,18 @@ def upload_file():
                     except Exception:
                         pass
                 if os.path.exists(extract_folder):
-                    os.system(f"rm -rf {extract_folder}")
+                    shutil.rmtree(extract_folder, ignore_errors=True)
+            metrics.observe("pinaka_job_duration_seconds", time.time() - started,
+                            kind="upgrade", result=status.get("state", "failed"))
+            try:
+                evict_lifecycle_jobs()
+            except Exception as ex:
+                logging.warning("Lifecycle job eviction failed: %s", ex)
 
     # Accept host_ip from client, fallback to request host header (e.g. 10.0.0.5:2020 -> 10.0.0.5)
     try:
         host_ip = (
-            request.form.get("host_ip") or
-            ((request.get_json(silent=True) or {}).get("host_ip")) or
+            form.get("host_ip") or
             request.args.get("host_ip") or
             request.headers.get("X-Host-IP") or
             (request.host or "").split(":")[0] or
@@ -3108,16 +5156,114 @@ def upload_file():
         host_ip = "localhost"
     threading.Thread(target=process_upload, args=(job_id, file_path, extract_folder, host_ip), daemon=True).start()
 
-    return jsonify({"job_id": job_id, "status": "queued", "message": "Upload received"}), 202
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "message": "Upload received",
+        "sha256": job_status["sha256"],
+    }), 202
+
+# Lists lifecycle jobs newest first, paginated from the job store
+# Query: ?state=running&limit=50&offset=0
+@app.route("/upload/jobs", methods=["GET"])
+def upload_jobs():
+    state = request.args.get("state")
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    jobs, total = list_job_status(state, limit, offset)
+    return jsonify({"jobs": jobs, "total": total, "limit": limit, "offset": offset})
+
+
+def lifecycle_job_response(job_id: str, kind: str):
+    """Job record of one kind as a response; ?log=1&offset=&max_bytes= adds a log slice."""
+    status = load_job_status(job_id)
+    if not status or status.get("kind", "upgrade") != kind:
+        return jsonify({"error": "Job not found"}), 404
+
+    if request.args.get("log") in ("1", "true", "yes"):
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        max_bytes = min(request.args.get("max_bytes", 65536, type=int), 4 * 1024 * 1024)
+        chunk = read_lifecycle_log(job_id, offset, max_bytes)
+        status["log"] = chunk.decode("utf-8", errors="replace")
+        status["log_offset"] = offset
+        status["next_offset"] = offset + len(chunk)
+    return jsonify(status), 200
+
+
+def lifecycle_job_stream(job_id: str, kind: str):
+    """
+    SSE live-tail of a lifecycle job log. Event ids are byte offsets; a reconnect
+    with Last-Event-ID (or ?offset=N) resumes from there. Ends with a "done"
+    event carrying the final state (and the tarball for diagnostic jobs).
+    """
+    status = load_job_status(job_id)
+    if not status or status.get("kind", "upgrade") != kind:
+        return jsonify({"error": "Job not found"}), 404
+
+    resume = request.headers.get("Last-Event-ID") or request.args.get("offset")
+    try:
+        start = max(int(resume), 0) if resume is not None else 0
+    except ValueError:
+        start = 0
+
+    def generate():
+        pos = start
+        partial = b""
+        last_sent = time.time()
+        yield "retry: 3000\n\n"
+        while True:
+            # Read the state before the log: once terminal, the log is complete
+            status = load_job_status(job_id) or {}
+            data = read_lifecycle_log(job_id, pos)
+            if data:
+                base = pos - len(partial)
+                pos += len(data)
+                data = partial + data
+                cut = data.rfind(b"\n") + 1
+                partial = data[cut:]
+                for raw in data[:cut].splitlines(keepends=True):
+                    base += len(raw)
+                    text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                    yield f"id: {base}\ndata: {text}\n\n"
+                last_sent = time.time()
+                continue
+
+            if status.get("state") in LIFECYCLE_TERMINAL_STATES:
+                if partial:
+                    yield f"id: {pos}\ndata: {partial.decode('utf-8', errors='replace')}\n\n"
+                done = {k: status.get(k) for k in ("state", "message", "exit_code", "log_size")}
+                for key in ("tarball", "download_url"):
+                    if status.get(key):
+                        done[key] = status[key]
+                yield f"event: done\ndata: {json.dumps(done)}\n\n"
+                return
+
+            if time.time() - last_sent >= LIFECYCLE_STREAM_HEARTBEAT_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+            time.sleep(LIFECYCLE_STREAM_POLL_SECONDS)
+
+    headers = {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # disable buffering on some proxies
+    }
+    return Response(stream_with_context(generate()), headers=headers)
+
 
 # Retrieves status of uploaded file processing jobs including progress and results
-# Returns detailed job information including execution logs and completion status
+# Returns the job state machine; ?log=1&offset=0&max_bytes=65536 adds a slice of its log
 @app.route("/upload/status/<job_id>", methods=["GET"])
 def upload_status(job_id):
-    status = load_job_status(job_id)
-    if not status:
-        return jsonify({"error": "Job not found"}), 404
-    return jsonify(status), 200
+    return lifecycle_job_response(job_id, "upgrade")
+
+
+# Provides Server-Sent Events (SSE) stream of an upgrade job's script output
+# Event ids are byte offsets in the job log; ends with a "done" event carrying the final state
+@app.route("/upload/stream/<job_id>", methods=["GET"])
+def upload_stream(job_id):
+    """Frontend can connect with EventSource('/upload/stream/<job_id>')."""
+    return lifecycle_job_stream(job_id, "upgrade")
 
 
 #--------------------------------------------Lifecycle Management End-------------------------------------------
@@ -3228,103 +5374,562 @@ def get_client_secret():
 # Configuration - modify these paths as needed
 SCRIPT_PATH = "/home/pinakasupport/.pinaka_wd/.scripts/diagnostic.sh"  # Path to your script that creates tar
 TAR_STORAGE_PATH = "/home/pinakasupport/.pinaka_wd/diagnostic_log/"  # Where script stores tar files
-CHUNK_SIZE = 8192
 
 # Ensure storage directory exists
 os.makedirs(TAR_STORAGE_PATH, exist_ok=True)
-# Executes diagnostic script to collect system logs and create compressed tar archives
-# Manages log collection process with timeout handling and comprehensive error reporting
+
+# ----- Diagnostic log collection jobs -----
+# diagnostic.sh runs as a "diagnostic" job in the lifecycle job store: output
+# is streamed to the job log, one collection runs per node at a time, and the
+# job can be cancelled (SIGTERM, then SIGKILL, to its process group). When it
+# ends, the tarball it produced is found by comparing TAR_STORAGE_PATH before
+# and after the run and recorded on the job.
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tar.bz2', '.tgz')
+DIAGNOSTIC_TIMEOUT_SECONDS = 300
+DIAGNOSTIC_CANCEL_GRACE_SECONDS = 10
+DIAGNOSTIC_STOP_KEY_PREFIX = "diagnostic_stop:"
+
+diagnostic_lock = threading.Lock()
+diagnostic_procs = {}   # job_id -> {"proc": Popen, "stop": None | "cancelled" | "timeout"}
+
+
+def _tar_snapshot() -> dict:
+    snapshot = {}
+    for entry in os.scandir(TAR_STORAGE_PATH):
+        if entry.name.endswith(TAR_EXTENSIONS) and entry.is_file():
+            snapshot[entry.name] = entry.stat().st_mtime
+    return snapshot
+
+
+def _stop_diagnostic_job(job_id: str, reason: str) -> bool:
+    """
+    SIGTERM the job's process group, escalating to SIGKILL after a grace period.
+    A job started by another gunicorn worker is signalled through the
+    script_pid in its record; the reason is left in shared_state for the
+    owning worker to report.
+    """
+    with diagnostic_lock:
+        entry = diagnostic_procs.get(job_id)
+        if entry:
+            if entry["proc"].poll() is not None:
+                return False
+            entry["stop"] = entry["stop"] or reason
+            proc, pgid = entry["proc"], entry["proc"].pid
+        else:
+            status = load_job_status(job_id) or {}
+            pgid = status.get("script_pid")
+            if status.get("state") != "running" or not pgid or not shared_state.pid_alive(status.get("pid")):
+                return False
+            proc = None
+            shared_state.set(DIAGNOSTIC_STOP_KEY_PREFIX + job_id, reason)
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except OSError:
+        return False
+
+    def escalate():
+        if proc is not None:
+            try:
+                proc.wait(timeout=DIAGNOSTIC_CANCEL_GRACE_SECONDS)
+                return
+            except subprocess.TimeoutExpired:
+                pass
+        else:
+            deadline = time.time() + DIAGNOSTIC_CANCEL_GRACE_SECONDS
+            while time.time() < deadline:
+                try:
+                    os.killpg(pgid, 0)
+                except OSError:
+                    return
+                time.sleep(0.5)
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    threading.Thread(target=escalate, daemon=True).start()
+    return True
+
+
+def _run_diagnostic_job(job_id: str, status: dict):
+    started = time.time()
+    try:
+        before = _tar_snapshot()
+        proc = subprocess.Popen(
+            ['bash', SCRIPT_PATH],
+            cwd=os.path.dirname(SCRIPT_PATH),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+        with diagnostic_lock:
+            diagnostic_procs[job_id] = {"proc": proc, "stop": None}
+        status.update({
+            "state": "running",
+            "message": "Collecting logs",
+            "started_at": int(time.time()),
+            "script_pid": proc.pid,
+        })
+        save_job_status(job_id, status)
+
+        timer = threading.Timer(DIAGNOSTIC_TIMEOUT_SECONDS, _stop_diagnostic_job, args=(job_id, "timeout"))
+        timer.daemon = True
+        timer.start()
+        try:
+            returncode = stream_job_output(job_id, status, proc)
+        finally:
+            timer.cancel()
+        with diagnostic_lock:
+            stop = diagnostic_procs.pop(job_id, {}).get("stop")
+        stop = stop or shared_state.get(DIAGNOSTIC_STOP_KEY_PREFIX + job_id)
+        shared_state.delete(DIAGNOSTIC_STOP_KEY_PREFIX + job_id)
+
+        status.update({"finished_at": int(time.time()), "exit_code": returncode})
+        if stop == "cancelled":
+            status.update({"state": "cancelled", "message": "Log collection cancelled"})
+        elif stop == "timeout":
+            status.update({"state": "failed", "message": f"Script execution timed out ({DIAGNOSTIC_TIMEOUT_SECONDS // 60} minutes)"})
+        elif returncode != 0:
+            status.update({"state": "failed", "message": "Script execution failed"})
+        else:
+            after = _tar_snapshot()
+            produced = [name for name, mtime in after.items() if before.get(name) != mtime]
+            status.update({"state": "succeeded", "message": "Log collection script executed successfully"})
+            if produced:
+                tarball = max(produced, key=lambda name: after[name])
+                status.update({"tarball": tarball, "download_url": f"/download-tar/{tarball}"})
+    except Exception as e:
+        with diagnostic_lock:
+            diagnostic_procs.pop(job_id, None)
+        status.update({
+            "state": "failed",
+            "message": f"Failed to run script: {str(e)}",
+            "finished_at": int(time.time()),
+        })
+    save_job_status(job_id, status)
+    metrics.observe("pinaka_job_duration_seconds", time.time() - started,
+                    kind="diagnostic", result=status["state"])
+
+
+def start_diagnostic_job():
+    """Queue a diagnostic run; returns (job_id, None) or (None, id of the running job)."""
+    job_id = str(uuid.uuid4())
+    status = {
+        "job_id": job_id,
+        "kind": "diagnostic",
+        "created_at": int(time.time()),
+        "state": "queued",
+        "message": "Log collection queued",
+    }
+    running = claim_job_slot(job_id, status)
+    if running:
+        return None, running
+    threading.Thread(target=_run_diagnostic_job, args=(job_id, status), daemon=True).start()
+    return job_id, None
+
+
+# Starts the diagnostic script as a background job that collects logs into a tar archive
+# Returns 202 with a job id to poll (/diagnostics/jobs/<id>) or stream; 409 while one is running
 @app.route('/run-log-collection', methods=['POST'])
 def run_log_collection():
     """
-    Endpoint to run the shell script that creates and stores tar file
+    Endpoint to start the shell script that creates and stores tar file
     """
+    # Check if script exists
+    if not os.path.exists(SCRIPT_PATH):
+        return jsonify({"error": f"Script not found at {SCRIPT_PATH}"}), 404
+
+    # Check if script is executable
+    if not os.access(SCRIPT_PATH, os.X_OK):
+        return jsonify({"error": f"Script is not executable: {SCRIPT_PATH}"}), 403
+
     try:
-        # Check if script exists
-        if not os.path.exists(SCRIPT_PATH):
-            return jsonify({"error": f"Script not found at {SCRIPT_PATH}"}), 404
-        
-        # Check if script is executable
-        if not os.access(SCRIPT_PATH, os.X_OK):
-            return jsonify({"error": f"Script is not executable: {SCRIPT_PATH}"}), 403
-        
-        # Run the shell script - it handles tar creation and storage internally
-        result = subprocess.run([
-            'bash', SCRIPT_PATH
-        ], capture_output=True, text=True, timeout=300, cwd=os.path.dirname(SCRIPT_PATH))
-        
-        if result.returncode != 0:
-            return jsonify({
-                "error": "Script execution failed", 
-                "stderr": result.stderr,
-                "stdout": result.stdout,
-                "return_code": result.returncode
-            }), 500
-        
-        return jsonify({
-            "message": "Log collection script executed successfully",
-            "stdout": result.stdout,
-            "stderr": result.stderr if result.stderr else None,
-            "executed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "Script execution timed out (5 minutes)"}), 500
-    except FileNotFoundError:
-        return jsonify({"error": "bash command not found on system"}), 500
+        job_id, running = start_diagnostic_job()
     except Exception as e:
         return jsonify({"error": f"Failed to run script: {str(e)}"}), 500
+    if running:
+        return jsonify({"error": "Log collection is already running", "job_id": running}), 409
+
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "message": "Log collection started",
+        "status_url": f"/diagnostics/jobs/{job_id}",
+        "stream_url": f"/diagnostics/jobs/{job_id}/stream",
+    }), 202
+
+
+# Lists diagnostic log collection jobs newest first
+# Query: ?state=running&limit=50&offset=0
+@app.route('/diagnostics/jobs', methods=['GET'])
+def diagnostic_jobs():
+    state = request.args.get("state")
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    jobs, total = list_job_status(state, limit, offset, kind="diagnostic")
+    return jsonify({"jobs": jobs, "total": total, "limit": limit, "offset": offset})
+
 
+# Returns one diagnostic job, including the produced tarball once it has finished
+# Query: ?log=1&offset=0&max_bytes=65536 adds a slice of the script output
+@app.route('/diagnostics/jobs/<job_id>', methods=['GET'])
+def diagnostic_job_status(job_id):
+    return lifecycle_job_response(job_id, "diagnostic")
 
-# Lists all available tar files in the diagnostic log storage directory
-# Returns file metadata including size, creation time, and download URLs
+
+# Provides Server-Sent Events (SSE) stream of diagnostic script output
+# Ends with a "done" event carrying the final state and the tarball download URL
+@app.route('/diagnostics/jobs/<job_id>/stream', methods=['GET'])
+def diagnostic_job_stream(job_id):
+    return lifecycle_job_stream(job_id, "diagnostic")
+
+
+# Cancels a running diagnostic job (SIGTERM, then SIGKILL after a grace period)
+@app.route('/diagnostics/jobs/<job_id>/cancel', methods=['POST'])
+def diagnostic_job_cancel(job_id):
+    status = load_job_status(job_id)
+    if not status or status.get("kind") != "diagnostic":
+        return jsonify({"error": "Job not found"}), 404
+    if status.get("state") in LIFECYCLE_TERMINAL_STATES:
+        return jsonify(status), 409
+    if not _stop_diagnostic_job(job_id, "cancelled"):
+        return jsonify({"error": "Job is not running"}), 409
+    status["message"] = "Cancelling"
+    return jsonify(status), 202
+
+
+# ----- Diagnostic archive catalog -----
+# One watcher thread keeps an in-memory catalog of the archives in
+# TAR_STORAGE_PATH, updated per file from inotify events (with a periodic full
+# rescan as a safety net, or a short poll where inotify is unavailable).
+# Content hashes are computed once per file version by a background hasher
+# after the file has stopped changing. A retention policy prunes the oldest
+# archives beyond a total size or age so the storage cannot fill the disk.
+# Every gunicorn worker keeps its own listing, but hashing and pruning are
+# done by one worker at a time (shared_state leases); hashes and the prune
+# count live in shared_state, so each file is hashed once per host.
+TAR_RETENTION_MAX_BYTES = int(os.environ.get("DIAG_RETENTION_MAX_BYTES", 20 * 1024 * 1024 * 1024))
+TAR_RETENTION_MAX_AGE = int(os.environ.get("DIAG_RETENTION_MAX_DAYS", 30)) * 24 * 3600
+TAR_SETTLE_SECONDS = 10          # a file unchanged this long is complete (hash/prune eligible)
+TAR_RESCAN_SECONDS = 300
+TAR_POLL_SECONDS = 10            # rescan interval without inotify
+TAR_SORT_KEYS = {"created": "created_ts", "modified": "modified_ts", "size": "size_bytes", "name": "filename"}
+
+TAR_HASH_KEY_PREFIX = "tar_hash:"     # + filename -> {"size_bytes", "modified_ts", "sha256"}
+TAR_PRUNED_KEY = "tar_pruned"
+TAR_HASH_LEASE = "tar_hash"
+TAR_PRUNE_LEASE = "tar_prune"
+TAR_LEASE_SECONDS = 120
+
+tar_catalog_lock = threading.Lock()
+tar_catalog = {"files": {}, "path": None, "started": False, "last_scan": 0}
+tar_hash_queue = queue.Queue()
+
+
+def _tar_catalog_entry(name: str) -> Optional[dict]:
+    try:
+        st = os.stat(os.path.join(TAR_STORAGE_PATH, name))
+    except OSError:
+        return None
+    return {
+        "filename": name,
+        "size_bytes": st.st_size,
+        "size_mb": round(st.st_size / (1024 * 1024), 2),
+        "created_ts": st.st_ctime,
+        "modified_ts": st.st_mtime,
+        "created_at": datetime.fromtimestamp(st.st_ctime).strftime("%Y-%m-%d %H:%M:%S"),
+        "modified_at": datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
+        "download_url": f"/download-tar/{name}",
+        "sha256": None,
+    }
+
+
+def _tar_catalog_update(name: str):
+    """Refresh one catalog entry from disk (or drop it) and queue it for hashing."""
+    if not name.endswith(TAR_EXTENSIONS):
+        return
+    entry = _tar_catalog_entry(name)
+    with tar_catalog_lock:
+        old = tar_catalog["files"].get(name)
+        if entry is None:
+            tar_catalog["files"].pop(name, None)
+            return
+        if old and (old["size_bytes"], old["modified_ts"]) == (entry["size_bytes"], entry["modified_ts"]):
+            return
+        tar_catalog["files"][name] = entry
+    tar_hash_queue.put(name)
+
+
+def _tar_catalog_rescan():
+    names = set()
+    if os.path.isdir(TAR_STORAGE_PATH):
+        names = {n for n in os.listdir(TAR_STORAGE_PATH) if n.endswith(TAR_EXTENSIONS)}
+    with tar_catalog_lock:
+        gone = set(tar_catalog["files"]) - names
+        for name in gone:
+            tar_catalog["files"].pop(name, None)
+        tar_catalog["last_scan"] = time.time()
+    for name in names:
+        _tar_catalog_update(name)
+
+
+def _shared_tar_hash(entry: dict) -> Optional[str]:
+    """Hash another worker (or an earlier run) stored for this version of the file."""
+    known = shared_state.get(TAR_HASH_KEY_PREFIX + entry["filename"])
+    if known and (known["size_bytes"], known["modified_ts"]) == (entry["size_bytes"], entry["modified_ts"]):
+        return known["sha256"]
+    return None
+
+
+def _tar_hasher():
+    while True:
+        name = tar_hash_queue.get()
+        try:
+            with tar_catalog_lock:
+                entry = tar_catalog["files"].get(name)
+            if not entry or entry["sha256"]:
+                continue
+            age = time.time() - entry["modified_ts"]
+            if age < TAR_SETTLE_SECONDS:
+                # Still being written; come back once it has settled
+                threading.Timer(TAR_SETTLE_SECONDS - age + 0.5, tar_hash_queue.put, args=(name,)).start()
+                continue
+            sha256 = _shared_tar_hash(entry)
+            if sha256 is None:
+                if not shared_state.acquire_lease(TAR_HASH_LEASE, TAR_LEASE_SECONDS):
+                    # Another worker is hashing; its result lands in shared_state
+                    threading.Timer(TAR_SETTLE_SECONDS, tar_hash_queue.put, args=(name,)).start()
+                    continue
+                try:
+                    sha256 = _shared_tar_hash(entry)
+                    if sha256 is None:
+                        digest = hashlib.sha256()
+                        renewed = time.time()
+                        with open(os.path.join(TAR_STORAGE_PATH, name), "rb") as f:
+                            for chunk in iter(lambda: f.read(DOWNLOAD_BLOCK_SIZE), b""):
+                                digest.update(chunk)
+                                if time.time() - renewed > TAR_LEASE_SECONDS / 3:
+                                    shared_state.acquire_lease(TAR_HASH_LEASE, TAR_LEASE_SECONDS)
+                                    renewed = time.time()
+                        st = os.stat(os.path.join(TAR_STORAGE_PATH, name))
+                        # Only keep the hash if the file did not change while we read it
+                        if (st.st_size, st.st_mtime) != (entry["size_bytes"], entry["modified_ts"]):
+                            continue
+                        sha256 = digest.hexdigest()
+                        shared_state.set(TAR_HASH_KEY_PREFIX + name, {
+                            "size_bytes": entry["size_bytes"],
+                            "modified_ts": entry["modified_ts"],
+                            "sha256": sha256,
+                        })
+                finally:
+                    shared_state.release_lease(TAR_HASH_LEASE)
+            with tar_catalog_lock:
+                current = tar_catalog["files"].get(name)
+                if current and (current["size_bytes"], current["modified_ts"]) == (entry["size_bytes"], entry["modified_ts"]):
+                    current["sha256"] = sha256
+        except Exception as e:
+            logging.warning("Hashing %s failed: %s", name, e)
+
+
+def prune_tar_catalog() -> list:
+    """Delete settled archives older than the max age, then the oldest beyond the size budget."""
+    if not shared_state.acquire_lease(TAR_PRUNE_LEASE, TAR_LEASE_SECONDS):
+        return []   # another worker is pruning
+    try:
+        return _prune_tar_catalog()
+    finally:
+        shared_state.release_lease(TAR_PRUNE_LEASE)
+
+
+def _prune_tar_catalog() -> list:
+    now = time.time()
+    with tar_catalog_lock:
+        files = sorted(tar_catalog["files"].values(), key=lambda e: e["modified_ts"])
+    total = sum(e["size_bytes"] for e in files)
+    removed = []
+    for entry in files:
+        if now - entry["modified_ts"] < TAR_SETTLE_SECONDS:
+            continue
+        if now - entry["modified_ts"] <= TAR_RETENTION_MAX_AGE and total <= TAR_RETENTION_MAX_BYTES:
+            continue
+        try:
+            os.remove(os.path.join(TAR_STORAGE_PATH, entry["filename"]))
+        except FileNotFoundError:
+            # Already gone (deleted by hand); not ours to count
+            total -= entry["size_bytes"]
+            continue
+        except OSError as e:
+            logging.warning("Pruning %s failed: %s", entry["filename"], e)
+            continue
+        total -= entry["size_bytes"]
+        removed.append(entry["filename"])
+        with tar_catalog_lock:
+            tar_catalog["files"].pop(entry["filename"], None)
+    with shared_state.transaction():
+        if removed:
+            shared_state.set(TAR_PRUNED_KEY, shared_state.get(TAR_PRUNED_KEY, 0) + len(removed))
+        # Drop hashes of files that are no longer there
+        with tar_catalog_lock:
+            present = set(tar_catalog["files"])
+        for name in shared_state.items(TAR_HASH_KEY_PREFIX):
+            if name not in present and not os.path.exists(os.path.join(TAR_STORAGE_PATH, name)):
+                shared_state.delete(TAR_HASH_KEY_PREFIX + name)
+    if removed:
+        logging.info("Pruned diagnostic archives: %s", ", ".join(removed))
+    return removed
+
+
+def _tar_catalog_watcher():
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_CREATE
+    fd = _inotify_watch_dir(TAR_STORAGE_PATH, mask)
+    header = struct.Struct("iIII")
+    last_prune = 0
+    while True:
+        try:
+            if fd is not None:
+                ready, _, _ = select.select([fd], [], [], TAR_SETTLE_SECONDS)
+                changed = set()
+                overflow = False
+                if ready:
+                    try:
+                        while True:
+                            buf = os.read(fd, 65536)
+                            if not buf:
+                                break
+                            pos = 0
+                            while pos + header.size <= len(buf):
+                                _, ev_mask, _, length = header.unpack_from(buf, pos)
+                                name = buf[pos + header.size:pos + header.size + length].split(b"\0", 1)[0]
+                                pos += header.size + length
+                                if ev_mask & IN_Q_OVERFLOW:
+                                    overflow = True
+                                elif name:
+                                    changed.add(os.fsdecode(name))
+                    except BlockingIOError:
+                        pass
+                if overflow or time.time() - tar_catalog["last_scan"] > TAR_RESCAN_SECONDS:
+                    _tar_catalog_rescan()
+                else:
+                    for name in changed:
+                        _tar_catalog_update(name)
+            else:
+                time.sleep(TAR_POLL_SECONDS)
+                _tar_catalog_rescan()
+
+            if time.time() - last_prune > TAR_SETTLE_SECONDS:
+                prune_tar_catalog()
+                last_prune = time.time()
+        except Exception as e:
+            logging.exception("Diagnostic catalog watcher error: %s", e)
+            time.sleep(1)
+
+
+def ensure_tar_catalog():
+    """Build the catalog on first use and start its watcher and hasher threads."""
+    with tar_catalog_lock:
+        if tar_catalog["started"] and tar_catalog["path"] == TAR_STORAGE_PATH:
+            return
+        first = not tar_catalog["started"]
+        tar_catalog.update({"started": True, "path": TAR_STORAGE_PATH, "files": {}})
+    os.makedirs(TAR_STORAGE_PATH, exist_ok=True)
+    _tar_catalog_rescan()
+    if first:
+        threading.Thread(target=_tar_catalog_watcher, daemon=True).start()
+        threading.Thread(target=_tar_hasher, daemon=True).start()
+
+
+def tar_catalog_files() -> list:
+    with tar_catalog_lock:
+        files = [dict(e) for e in tar_catalog["files"].values()]
+    if any(not e["sha256"] for e in files):
+        # Hashes computed by another worker since this one last looked
+        known = shared_state.items(TAR_HASH_KEY_PREFIX)
+        for e in files:
+            value = (known.get(e["filename"]) or (None,))[0]
+            if not e["sha256"] and value and \
+                    (value["size_bytes"], value["modified_ts"]) == (e["size_bytes"], e["modified_ts"]):
+                e["sha256"] = value["sha256"]
+    return files
+
+
+# Lists tar files in the diagnostic log storage directory from the cached catalog
+# Query: ?sort=created|modified|size|name&order=desc|asc&limit=&offset= (all files when no limit)
 @app.route('/list-tar-files', methods=['GET'])
 def list_tar_files():
     """
-    Endpoint to list all tar files in the storage directory
+    Endpoint to list tar files in the storage directory
     """
     try:
-        tar_files = []
-        
-        if not os.path.exists(TAR_STORAGE_PATH):
-            return jsonify({"files": [], "message": "Storage directory not found"})
-        
-        for filename in os.listdir(TAR_STORAGE_PATH):
-            if filename.endswith(('.tar', '.tar.gz', '.tar.bz2', '.tgz')):
-                filepath = os.path.join(TAR_STORAGE_PATH, filename)
-                file_stats = os.stat(filepath)
-                
-                tar_files.append({
-                    "filename": filename,
-                    "size_bytes": file_stats.st_size,
-                    "size_mb": round(file_stats.st_size / (1024 * 1024), 2),
-                    "created_at": datetime.fromtimestamp(file_stats.st_ctime).strftime("%Y-%m-%d %H:%M:%S"),
-                    "modified_at": datetime.fromtimestamp(file_stats.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
-                    "download_url": f"/download-tar/{filename}"
-                })
-        
-        # Sort by creation time (newest first)
-        tar_files.sort(key=lambda x: x['created_at'], reverse=True)
-        
+        ensure_tar_catalog()
+        sort_key = TAR_SORT_KEYS.get(request.args.get("sort", "created"), "created_ts")
+        reverse = request.args.get("order", "desc") != "asc"
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        limit = request.args.get("limit", type=int)
+
+        tar_files = sorted(tar_catalog_files(), key=lambda e: e[sort_key], reverse=reverse)
+        page = tar_files[offset:offset + limit] if limit else tar_files[offset:]
+
         return jsonify({
-            "files": tar_files,
+            "files": page,
             "total_files": len(tar_files),
+            "offset": offset,
+            "limit": limit,
             "storage_path": TAR_STORAGE_PATH
         })
-        
+
     except Exception as e:
         return jsonify({"error": f"Failed to list tar files: {str(e)}"}), 500
 
-def generate_file_stream(filepath):
-    with open(filepath, 'rb') as f:
-        while True:
-            chunk = f.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            yield chunk
+
+# ----- Tarball downloads -----
+# Downloads are served with Content-Length, a strong ETag, Last-Modified and
+# Range/If-Range so interrupted transfers resume. The body is handed to the
+# WSGI server's file_wrapper (gunicorn uses sendfile() for it when it is not
+# terminating TLS itself) with a 1 MiB block size otherwise. When Flask sits
+# behind nginx, setting DIAG_DOWNLOAD_ACCEL_PREFIX to an `internal` location
+# aliased to TAR_STORAGE_PATH lets nginx send the file via X-Accel-Redirect.
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+DOWNLOAD_ACCEL_PREFIX = os.environ.get("DIAG_DOWNLOAD_ACCEL_PREFIX")
+
+download_stats_lock = threading.Lock()
+download_stats = {"recent": deque(maxlen=100), "downloads": 0, "bytes": 0, "seconds": 0.0}
+
+
+def record_download(filename: str, mode: str, status: int, nbytes: int, started: float, byte_range=None):
+    seconds = max(time.time() - started, 1e-6)
+    entry = {
+        "filename": filename,
+        "mode": mode,
+        "status": status,
+        "bytes": nbytes,
+        "range": byte_range,
+        "seconds": round(seconds, 3),
+        "throughput_mbps": round(nbytes * 8 / seconds / 1e6, 2),
+        "finished_at": int(time.time()),
+    }
+    with download_stats_lock:
+        download_stats["recent"].appendleft(entry)
+        download_stats["downloads"] += 1
+        download_stats["bytes"] += nbytes
+        download_stats["seconds"] += seconds
+
+
+class _DownloadFile(io.FileIO):
+    """Tarball handle that reports how far it was read when the server closes it."""
+    on_close = None
+
+    def close(self):
+        if not self.closed and self.on_close is not None:
+            try:
+                self.on_close(self.tell())
+            except Exception as e:
+                logging.warning("Download metrics failed: %s", e)
+        super().close()
+
 
 # Downloads tar files from diagnostic log storage with security validation
-# Prevents path traversal attacks and validates file extensions for secure downloads
+# Prevents path traversal attacks; supports Range/If-Range resume and conditional GETs
 @app.route('/download-tar/<filename>', methods=['GET'])
 def download_tar_file(filename):
     # Prevent path traversal via safe_join
@@ -3335,23 +5940,92 @@ def download_tar_file(filename):
         return jsonify({"error": "Invalid filename"}), 400
 
     # Validate extension
-    if not filename.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2')):
+    if not filename.endswith(TAR_EXTENSIONS):
         return jsonify({"error": "Not a valid tar file"}), 400
 
-    if not os.path.exists(filepath):
+    if filepath is None or not os.path.isfile(filepath):
         return jsonify({"error": "File not found"}), 404
 
+    started = time.time()
     headers = {
         'Content-Disposition': f'attachment; filename="{filename}"'
     }
 
-    return Response(
-        stream_with_context(generate_file_stream(filepath)),
+    if DOWNLOAD_ACCEL_PREFIX:
+        # nginx serves the bytes (sendfile, ranges, validators); we only authorize
+        headers['X-Accel-Redirect'] = DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + filename
+        record_download(filename, "accel", 200, os.path.getsize(filepath), started)
+        return Response(headers=headers, content_type='application/octet-stream')
+
+    f = _DownloadFile(filepath, 'rb')
+    st = os.fstat(f.fileno())
+    wrapper = request.environ.get('wsgi.file_wrapper', FileWrapper)
+    rv = Response(
+        wrapper(f, DOWNLOAD_BLOCK_SIZE),
         headers=headers,
         content_type='application/octet-stream',
         direct_passthrough=True
     )
-    
+    rv.content_length = st.st_size
+    rv.last_modified = int(st.st_mtime)
+    rv.set_etag(f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}")
+    rv.cache_control.no_cache = True
+    # Handles If-None-Match/If-Modified-Since (304), Range/If-Range (206/416)
+    try:
+        rv = rv.make_conditional(request.environ, accept_ranges=True, complete_length=st.st_size)
+    except Exception:
+        f.close()  # 416 for an unsatisfiable range
+        raise
+
+    if rv.status_code == 304:
+        # Not modified: no body, so the handle is never iterated or closed by the server
+        f.close()
+        record_download(filename, "not_modified", 304, 0, started)
+        return rv
+
+    start = rv.content_range.start if rv.status_code == 206 and rv.content_range else 0
+    planned = (rv.content_length or 0) if rv.status_code in (200, 206) else 0
+    if rv.status_code == 206:
+        # werkzeug wraps the body in a range iterator, so the server's file_wrapper
+        # (sendfile) is bypassed and the slice is read and written in Python
+        mode = "range"
+    else:
+        mode = "file_wrapper" if wrapper is not FileWrapper else "stream"
+
+    def on_close(position):
+        # sendfile() in the WSGI server does not move the file position
+        sent = position - start if position > start else planned
+        record_download(filename, mode, rv.status_code, min(sent, planned), started, rv.headers.get('Content-Range'))
+
+    f.on_close = on_close
+    return rv
+
+
+# Returns per-binary run counts and latency of external commands, slowest total first
+# Shows which forks dominate this worker; /metrics has the same data for all workers
+@app.route('/command-stats', methods=['GET'])
+def command_stats():
+    return jsonify({
+        "pid": os.getpid(),
+        "max_concurrent": commands.MAX_CONCURRENT,
+        "binary_limits": commands.BINARY_LIMITS,
+        "commands": commands.stats(),
+    })
+
+
+# Returns throughput metrics for recent tarball downloads
+@app.route('/download-stats', methods=['GET'])
+def download_stats_api():
+    with download_stats_lock:
+        total_seconds = download_stats["seconds"]
+        return jsonify({
+            "downloads": download_stats["downloads"],
+            "bytes": download_stats["bytes"],
+            "avg_throughput_mbps": round(download_stats["bytes"] * 8 / total_seconds / 1e6, 2) if total_seconds else 0,
+            "recent": list(download_stats["recent"]),
+        })
+
+
 # Checks status of diagnostic script and storage directory configuration
 # Returns information about script availability and storage usage statistics
 @app.route('/script-status', methods=['GET'])
@@ -3363,15 +6037,14 @@ def script_status():
         script_exists = os.path.exists(SCRIPT_PATH)
         storage_exists = os.path.exists(TAR_STORAGE_PATH)
         
-        # Get storage directory size
+        # Storage usage from the cached catalog
         total_size = 0
         file_count = 0
         if storage_exists:
-            for filename in os.listdir(TAR_STORAGE_PATH):
-                if filename.endswith(('.tar', '.tar.gz', '.tar.bz2', '.tgz')):
-                    filepath = os.path.join(TAR_STORAGE_PATH, filename)
-                    total_size += os.path.getsize(filepath)
-                    file_count += 1
+            ensure_tar_catalog()
+            files = tar_catalog_files()
+            total_size = sum(e["size_bytes"] for e in files)
+            file_count = len(files)
         
         return jsonify({
             "script_path": SCRIPT_PATH,
@@ -3379,7 +6052,10 @@ def script_status():
             "storage_path": TAR_STORAGE_PATH,
             "storage_exists": storage_exists,
             "tar_files_count": file_count,
-            "total_storage_mb": round(total_size / (1024 * 1024), 2)
+            "total_storage_mb": round(total_size / (1024 * 1024), 2),
+            "retention_max_mb": round(TAR_RETENTION_MAX_BYTES / (1024 * 1024), 2),
+            "retention_max_days": TAR_RETENTION_MAX_AGE // (24 * 3600),
+            "pruned_files": shared_state.get(TAR_PRUNED_KEY, 0)
         })
         
     except Exception as e:
@@ -3433,9 +6109,75 @@ def get_storage_url():
     return jsonify({"storage_url": storage_url, "password": password})
 
 
+# ----- Cluster telemetry -----
+# Node agents push utilization samples and facts deltas here (see telemetry.py),
+# so the dashboard reads one cluster table instead of fanning out to every node.
+
+# Receives a gzip-compressed telemetry batch from a node agent
+# Replies with the acknowledged sequence number and whether a full facts resend is needed
+@app.route('/cluster/telemetry', methods=['POST'])
+def cluster_telemetry():
+    if not telemetry.authorised(request.headers.get("X-Pinaka-Token")):
+        return jsonify({"error": "Unauthorized"}), 401
+    if (request.content_length or 0) > telemetry.MAX_BODY_BYTES:
+        return jsonify({"error": "Payload too large"}), 413
+    try:
+        payload = telemetry.decode_body(request.get_data(), request.headers.get("Content-Encoding"))
+    except telemetry.TelemetryRejected as e:
+        return jsonify({"error": str(e)}), e.status
+    reply, samples = telemetry.ingest(payload, request.remote_addr)
+    rollups.add_samples(str(payload["node"]), samples, telemetry.clock_offset(payload, time.time()))
+    return jsonify(reply)
+
+
+# Returns the state, health and latest utilization of every pushing node
+# Nodes are stale/offline once their pushes stop arriving
+@app.route('/cluster/overview', methods=['GET'])
+def cluster_overview():
+    return jsonify(telemetry.cluster_overview())
+
+
+# Returns everything the controller holds for one node, including all pushed facts
+@app.route('/cluster/nodes/<node>', methods=['GET'])
+def cluster_node(node):
+    record = telemetry.node_record(node)
+    if record is None:
+        return jsonify({"error": f"No telemetry received from {node}"}), 404
+    record["state"] = telemetry.node_state(record, time.time())
+    return jsonify(record)
+
+
+# Returns cluster-wide CPU, memory, disk and bandwidth rollups (avg, p95, max, sum, top nodes)
+# ?window=<seconds> (default 3600), ?metrics=cpu,memory, ?top=<n>, ?step=60|900 (default: finest covering tier)
+@app.route('/cluster/utilization-history', methods=['GET'])
+def cluster_utilization_history():
+    max_window = max(step * keep for step, keep in rollups.ROLLUP_TIERS)
+    try:
+        window = int(request.args.get("window", 3600))
+        top = int(request.args.get("top", rollups.TOP_NODES))
+        step = int(request.args["step"]) if request.args.get("step") else None
+    except ValueError:
+        return jsonify({"error": "window, top and step must be integers"}), 400
+    if not 0 < window <= max_window:
+        return jsonify({"error": f"window must be between 1 and {max_window} seconds"}), 400
+    if step is not None and step not in dict(rollups.ROLLUP_TIERS):
+        return jsonify({"error": f"step must be one of {[s for s, _ in rollups.ROLLUP_TIERS]}"}), 400
+    names = [m.strip() for m in request.args.get("metrics", "").split(",") if m.strip()] or list(rollups.ROLLUP_METRICS)
+    unknown = [m for m in names if m not in rollups.ROLLUP_METRICS]
+    if unknown:
+        return jsonify({"error": f"Unknown metrics: {', '.join(unknown)}"}), 400
+    return jsonify(rollups.query(window, step=step, names=names, top=max(1, min(top, rollups.TOP_NODES))))
+
+
+# Prometheus scrape endpoint: request latency/status per route plus SSH, Ceph,
+# OpenStack, subprocess and job metrics, summed over all gunicorn workers
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
 
 if __name__ == "__main__":
+    warm_up_imports(port=2020)
     app.run(
         host="0.0.0.0",
         port=2020,
@@ -0,0 +1,35 @@
+# Worker side of the parallel bundle extraction in app.py (extract_bundle).
+# Pool workers are started by a forkserver rather than forked from the
+# multithreaded service process, where a child could inherit a lock held by
+# another thread (logging, SQLite, metrics) and deadlock. The forkserver
+# imports only this module, so it has to stay free of app imports.
+
+import os
+import zipfile
+
+COPY_CHUNK = 1024 * 1024
+
+
+def extract_members(zip_path: str, names: list, dest: str, pwd: bytes) -> int:
+    """Extract the named members into dest; returns the bytes written."""
+    written = 0
+    with zipfile.ZipFile(zip_path) as zf:
+        for name in names:
+            zi = zf.getinfo(name)
+            target = os.path.join(dest, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            size = 0
+            try:
+                with zf.open(zi, pwd=pwd) as src, open(target, "wb") as out:
+                    while True:
+                        chunk = src.read(COPY_CHUNK)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > zi.file_size:
+                            raise ValueError("Bundle member is larger than declared")
+                        out.write(chunk)
+            except RuntimeError:
+                raise ValueError("Invalid code")
+            written += size
+    return written
@@ -0,0 +1,247 @@
+# Command execution for the 2020-port Flask services.
+# Every short-lived external command (ping, ip, lsblk, docker, openstack, ...)
+# goes through run(), which adds what bare subprocess.run() calls lacked:
+#   - a default timeout; on expiry the whole process group is killed
+#   - a cap on concurrent commands plus per-binary caps, so a burst of
+#     requests cannot fork-bomb the host or pile up behind one slow binary.
+#     MAX_CONCURRENT applies per worker process; BINARY_LIMITS apply to the
+#     whole host (every gunicorn worker and both services), enforced with
+#     flock'd slot files in SLOT_DIR, which the kernel releases if a worker dies
+#   - a cap on captured output (the rest is drained and dropped)
+#   - per-binary latency, timeout and queueing metrics (see metrics.py) and a
+#     running summary for /command-stats
+# Long-running jobs (kolla, upgrade and diagnostic scripts) keep their own
+# Popen handling and are accounted for as jobs instead.
+
+import fcntl
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+
+import metrics
+import shared_state
+
+DEFAULT_TIMEOUT = 30
+MAX_OUTPUT_BYTES = 4 * 1024 * 1024
+MAX_CONCURRENT = int(os.environ.get("PINAKA_MAX_COMMANDS", 16))
+# Binaries that are slow, heavy or must not run in parallel with themselves
+BINARY_LIMITS = {
+    "systemctl": 1,
+    "lsblk": 2,
+    "docker": 4,
+    "openstack": 4,
+    "ping": 8,
+}
+SLOT_DIR = os.environ.get("PINAKA_COMMAND_SLOT_DIR",
+                          os.path.join(os.path.dirname(shared_state.STATE_DB) or ".", "command_slots"))
+SLOT_POLL_MAX_SECONDS = 0.2
+
+metrics.describe("pinaka_command_seconds", "histogram", "External command run time by binary")
+metrics.describe("pinaka_command_wait_seconds", "histogram", "Time spent waiting for a command slot")
+metrics.describe("pinaka_command_timeouts_total", "counter", "Commands killed on timeout by binary")
+metrics.describe("pinaka_command_truncated_total", "counter", "Commands whose output exceeded the capture limit")
+metrics.describe("pinaka_commands_running", "gauge", "Commands currently running")
+
+
+class CommandBusy(subprocess.SubprocessError):
+    """No execution slot became free before the command's timeout."""
+
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+# In-process first stage, so a worker's own threads queue here instead of polling the slot files
+_binary_slots = {name: threading.BoundedSemaphore(limit) for name, limit in BINARY_LIMITS.items()}
+_stats_lock = threading.Lock()
+_stats = {}   # binary -> {"runs", "seconds", "max_seconds", "timeouts", "failures"}; failures include non-zero exits
+
+
+def binary_name(args, shell: bool = False) -> str:
+    """Label for a command: the executable's basename, skipping sudo."""
+    if shell:
+        return "shell"
+    words = args.split() if isinstance(args, str) else [str(a) for a in args]
+    if words and words[0] == "sudo" and len(words) > 1:
+        words = words[1:]
+    return os.path.basename(words[0]) if words else "?"
+
+
+def _record(name: str, seconds: float, timed_out: bool, failed: bool):
+    metrics.observe("pinaka_command_seconds", seconds, binary=name)
+    if timed_out:
+        metrics.inc("pinaka_command_timeouts_total", binary=name)
+    with _stats_lock:
+        entry = _stats.setdefault(name, {"runs": 0, "seconds": 0.0, "max_seconds": 0.0, "timeouts": 0, "failures": 0})
+        entry["runs"] += 1
+        entry["seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        entry["timeouts"] += timed_out
+        entry["failures"] += failed
+
+
+def stats() -> dict:
+    """Per-binary run counts and times, slowest total first."""
+    with _stats_lock:
+        items = sorted(_stats.items(), key=lambda kv: kv[1]["seconds"], reverse=True)
+        return {
+            name: dict(entry, seconds=round(entry["seconds"], 3), max_seconds=round(entry["max_seconds"], 3),
+                       mean_seconds=round(entry["seconds"] / entry["runs"], 3) if entry["runs"] else 0)
+            for name, entry in items
+        }
+
+
+def _acquire_host_slot(name: str, deadline: float):
+    """flock one of the binary's BINARY_LIMITS slot files; returns the open file, or None at the deadline."""
+    os.makedirs(SLOT_DIR, exist_ok=True)
+    delay = 0.01
+    while True:
+        for i in range(BINARY_LIMITS[name]):
+            slot = open(os.path.join(SLOT_DIR, f"{name}.{i}.lock"), "a")
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot
+            except BlockingIOError:
+                slot.close()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, SLOT_POLL_MAX_SECONDS)
+
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    proc.wait()
+
+
+def _collect(proc, input_bytes, deadline, max_output):
+    """Read stdout/stderr (and feed stdin) until EOF; returns (out, err, truncated) or raises TimeoutError."""
+    buffers = {}
+    truncated = False
+    with selectors.DefaultSelector() as sel:
+        for stream in (proc.stdout, proc.stderr):
+            if stream is not None:
+                sel.register(stream, selectors.EVENT_READ)
+                buffers[stream] = bytearray()
+        if proc.stdin is not None:
+            if input_bytes:
+                sel.register(proc.stdin, selectors.EVENT_WRITE)
+            else:
+                proc.stdin.close()
+        pending = memoryview(input_bytes or b"")
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            for key, _ in sel.select(remaining):
+                if key.fileobj is proc.stdin:
+                    try:
+                        written = os.write(key.fd, pending[:65536])
+                        pending = pending[written:]
+                    except BrokenPipeError:
+                        pending = pending[:0]
+                    if not pending:
+                        sel.unregister(proc.stdin)
+                        proc.stdin.close()
+                    continue
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                buf = buffers[key.fileobj]
+                room = max_output - len(buf)
+                if room > 0:
+                    buf += chunk[:room]
+                if len(chunk) > room:
+                    truncated = True
+    return (bytes(buffers[proc.stdout]) if proc.stdout in buffers else None,
+            bytes(buffers[proc.stderr]) if proc.stderr in buffers else None,
+            truncated)
+
+
+def run(args, timeout: float = DEFAULT_TIMEOUT, check: bool = False, text: bool = True,
+        input=None, env=None, cwd=None, shell: bool = False, executable=None,
+        capture: bool = True, stderr_to_stdout: bool = False,
+        max_output: int = MAX_OUTPUT_BYTES, name=None) -> subprocess.CompletedProcess:
+    """
+    subprocess.run() replacement. Raises subprocess.TimeoutExpired (after
+    killing the process group), CalledProcessError with check=True, or
+    CommandBusy when no slot frees up within the timeout. The result has a
+    `truncated` attribute set when output went over max_output bytes.
+    With capture=False output is discarded.
+    """
+    name = name or binary_name(args, shell)
+    started = time.monotonic()
+    deadline = started + timeout
+    binary_slot = _binary_slots.get(name)
+
+    if not _slots.acquire(timeout=timeout):
+        raise CommandBusy(f"no command slot free for {name}")
+    try:
+        if binary_slot is not None and not binary_slot.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise CommandBusy(f"too many concurrent {name} commands")
+        host_slot = None
+        try:
+            if binary_slot is not None:
+                host_slot = _acquire_host_slot(name, deadline)
+                if host_slot is None:
+                    raise CommandBusy(f"too many concurrent {name} commands on this host")
+            metrics.observe("pinaka_command_wait_seconds", time.monotonic() - started, binary=name)
+            return _execute(args, name, deadline, check, text, input, env, cwd, shell, executable,
+                            capture, stderr_to_stdout, max_output, timeout)
+        finally:
+            if host_slot is not None:
+                host_slot.close()   # drops the flock
+            if binary_slot is not None:
+                binary_slot.release()
+    finally:
+        _slots.release()
+
+
+def _execute(args, name, deadline, check, text, input, env, cwd, shell, executable,
+             capture, stderr_to_stdout, max_output, timeout):
+    if capture:
+        stdout = subprocess.PIPE
+        stderr = subprocess.STDOUT if stderr_to_stdout else subprocess.PIPE
+    else:
+        stdout = stderr = subprocess.DEVNULL
+    if isinstance(input, str):
+        input = input.encode()
+
+    metrics.inc("pinaka_commands_running")
+    started = time.monotonic()
+    timed_out, failed = False, True
+    try:
+        proc = subprocess.Popen(
+            args, shell=shell, executable=executable, env=env, cwd=cwd,
+            stdin=subprocess.PIPE if input else subprocess.DEVNULL,
+            stdout=stdout, stderr=stderr,
+            start_new_session=True,   # own process group, so a timeout kills children too
+        )
+        try:
+            out, err, truncated = _collect(proc, input, deadline, max_output)
+            proc.wait(timeout=max(deadline - time.monotonic(), 0.1))
+        except (TimeoutError, subprocess.TimeoutExpired):
+            timed_out = True
+            _kill_group(proc)
+            raise subprocess.TimeoutExpired(args, timeout)
+        failed = proc.returncode != 0
+    finally:
+        metrics.inc("pinaka_commands_running", -1)
+        _record(name, time.monotonic() - started, timed_out, failed)
+
+    if truncated:
+        metrics.inc("pinaka_command_truncated_total", binary=name)
+    if text:
+        out = out.decode("utf-8", errors="replace") if out is not None else None
+        err = err.decode("utf-8", errors="replace") if err is not None else None
+    result = subprocess.CompletedProcess(args, proc.returncode, out, err)
+    result.truncated = truncated
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args, out, err)
+    return result
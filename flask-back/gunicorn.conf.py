@@ -0,0 +1,64 @@
+# Production serving for the 2020-port Flask services.
+#
+#   python3 -m gunicorn -c gunicorn.conf.py                    # app.py (controller)
+#   PINAKA_WSGI_APP=nodeapi:app python3 -m gunicorn -c gunicorn.conf.py
+#
+# gthread workers: each worker process serves many requests at once on a
+# thread pool, which suits these routes (mostly waiting on SSH, subprocesses
+# and long-lived SSE streams, each of which holds a thread while open).
+# State that must agree between workers (metric histories, SSH polling
+# results, the Ceph summary, lifecycle jobs, kolla jobs and their progress,
+# pushed node telemetry, the discovery neighbor table and sweeps, the
+# OpenStack inventory, archive hashes) is kept in SQLite, see shared_state.py.
+# Background refreshers (Ceph, OpenStack inventory) run in whichever worker
+# holds their lease; the others read the shared result. Kolla output is
+# appended to the combined log under an flock.
+#
+# Environment:
+#   PINAKA_WSGI_APP   module:app to serve (default app:app)
+#   PINAKA_BIND       listen address (default 0.0.0.0:2020)
+#   PINAKA_WORKERS    worker processes (default 2)
+#   PINAKA_THREADS    threads per worker (default 32)
+#   PINAKA_TLS        "0" to serve plain HTTP behind a TLS-terminating proxy
+#   PINAKA_TLS_CERT / PINAKA_TLS_KEY  certificate and key (default per service)
+
+import os
+
+wsgi_app = os.environ.get("PINAKA_WSGI_APP", "app:app")
+bind = os.environ.get("PINAKA_BIND", "0.0.0.0:2020")
+
+worker_class = "gthread"
+workers = int(os.environ.get("PINAKA_WORKERS", 2))
+threads = int(os.environ.get("PINAKA_THREADS", 32))
+# Workers heartbeat from their main thread, so long SSE streams and uploads
+# are not cut off by this; it only catches a hung worker.
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Not preloaded: the app starts background threads and opens SQLite
+# connections at import, which must not be shared across fork.
+preload_app = False
+
+# Default certificates match what each service used with app.run()
+_default_tls = {
+    "app:app": ("keycloak.crt", "keycloak.key"),
+    "nodeapi:app": ("cert.pem", "key.pem"),
+}.get(wsgi_app, ("keycloak.crt", "keycloak.key"))
+if os.environ.get("PINAKA_TLS", "1") != "0":
+    certfile = os.environ.get("PINAKA_TLS_CERT", _default_tls[0])
+    keyfile = os.environ.get("PINAKA_TLS_KEY", _default_tls[1])
+else:
+    forwarded_allow_ips = "127.0.0.1"
+
+accesslog = "-"
+errorlog = "-"
+loglevel = "info"
+
+
+def post_worker_init(worker):
+    # The listener is already bound, so warm the lazy imports right away
+    module = __import__(wsgi_app.split(":")[0])
+    warm_up = getattr(module, "warm_up_imports", None)
+    if warm_up is not None:
+        warm_up()
@@ -0,0 +1,34 @@
+# Deferred imports for the 2020-port Flask services.
+# scapy, openstacksdk, paramiko and psutil are only needed by some routes, and
+# scapy/openstack alone take a second or more and a lot of memory to import.
+# Modules that use them bind a LazyModule proxy instead, which imports the real
+# module on first attribute access; app.warm_up_imports() loads them in the
+# background once the server is accepting connections.
+
+import importlib
+import threading
+import time
+
+lazy_import_times = {}   # module name -> seconds its import took
+
+
+class LazyModule:
+    """Module proxy that imports `name` on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.time()
+                    module = importlib.import_module(self._name)
+                    lazy_import_times[self._name] = round(time.time() - started, 3)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Load-test harness for the 2020-port Flask service.
+# Drives a mix of dashboard GET endpoints from N concurrent clients for a fixed
+# duration and reports throughput, error rate and latency percentiles per
+# endpoint; exits non-zero when the p95 or error rate exceeds the limits.
+# Use it to compare `python3 app.py` with gunicorn (see gunicorn.conf.py).
+#
+#   python3 load_test.py --url https://127.0.0.1:2020 --clients 50 --seconds 30
+#   python3 load_test.py --path /system-utilization-history --path /list-tar-files
+
+import argparse
+import json
+import ssl
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Cheap, read-only endpoints the dashboard polls
+DEFAULT_PATHS = (
+    "/system-utilization-history",
+    "/bandwidth-history",
+    "/ssh-polling-status",
+    "/list-tar-files",
+    "/upload/jobs",
+    "/diagnostics/jobs",
+    "/download-stats",
+    "/cluster/overview",
+    "/cluster/utilization-history",
+)
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def client(base_url: str, paths: list, deadline: float, context, results: dict, lock: threading.Lock, index: int):
+    n = index
+    while time.time() < deadline:
+        path = paths[n % len(paths)]
+        n += 1
+        started = time.perf_counter()
+        ok = True
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=30, context=context) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            ok = e.code < 500
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            entry = results.setdefault(path, {"latencies": [], "errors": 0})
+            entry["latencies"].append(elapsed)
+            entry["errors"] += 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for flask-back")
+    parser.add_argument("--url", default="https://127.0.0.1:2020", help="base URL of the service")
+    parser.add_argument("--path", action="append", help="endpoint to request (repeatable)")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--max-p95-ms", type=float, default=1000,
+                        help="fail when the overall p95 latency is above this")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    paths = args.path or list(DEFAULT_PATHS)
+    # The services use self-signed certificates
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    results, lock = {}, threading.Lock()
+    deadline = time.time() + args.seconds
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for i in range(args.clients):
+            pool.submit(client, args.url.rstrip("/"), paths, deadline, context, results, lock, i)
+    wall = time.time() - started
+
+    report = {"clients": args.clients, "seconds": round(wall, 1), "endpoints": {}}
+    all_latencies, all_errors = [], 0
+    for path in paths:
+        entry = results.get(path, {"latencies": [], "errors": 0})
+        lat = entry["latencies"]
+        all_latencies += lat
+        all_errors += entry["errors"]
+        report["endpoints"][path] = {
+            "requests": len(lat),
+            "errors": entry["errors"],
+            "p50_ms": round(percentile(lat, 50) * 1000, 1),
+            "p95_ms": round(percentile(lat, 95) * 1000, 1),
+            "p99_ms": round(percentile(lat, 99) * 1000, 1),
+        }
+    total = len(all_latencies)
+    report.update({
+        "requests": total,
+        "rps": round(total / wall, 1) if wall else 0,
+        "error_rate": round(all_errors / total, 4) if total else 1.0,
+        "p50_ms": round(percentile(all_latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(all_latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(all_latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.mean(all_latencies) * 1000, 1) if total else 0,
+    })
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for path, e in report["endpoints"].items():
+            print(f"{path:40s} {e['requests']:7d} req {e['errors']:5d} err "
+                  f"p50 {e['p50_ms']:8.1f} ms  p95 {e['p95_ms']:8.1f} ms  p99 {e['p99_ms']:8.1f} ms")
+        print(f"total: {total} requests in {report['seconds']}s ({report['rps']} req/s), "
+              f"error rate {report['error_rate']:.2%}, p50 {report['p50_ms']} ms, "
+              f"p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms")
+
+    failed = report["p95_ms"] > args.max_p95_ms or report["error_rate"] > args.max_error_rate
+    if failed:
+        print("FAIL: latency or error budget exceeded")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# In-process metrics for the 2020-port Flask services, exported in the
+# Prometheus text format (0.0.4) on /metrics.
+#
+# Counters, gauges and histograms are plain dicts behind one lock, keyed by
+# (name, labels); recording is a dict update and a bisect. install(app) adds
+# per-route request latency, status counts and in-flight requests. Under
+# gunicorn each worker periodically publishes its snapshot to shared_state and
+# render() sums the snapshots of all live workers, so any worker can answer a
+# scrape for the whole service.
+
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import shared_state
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_FLUSH_SECONDS = 10
+METRICS_KEY_PREFIX = "metrics:"
+
+_lock = threading.Lock()
+_meta = {}          # name -> (type, help, buckets)
+_values = {}        # (name, labels) -> float                  counters and gauges
+_histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+_flusher = {"started": False}
+
+
+def describe(name: str, kind: str, help_text: str, buckets=LATENCY_BUCKETS):
+    """Declare a metric's type ("counter", "gauge" or "histogram") and help text."""
+    _meta[name] = (kind, help_text, tuple(buckets))
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def gauge_set(name: str, value: float, **labels):
+    with _lock:
+        _values[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    buckets = _meta.get(name, (None, None, LATENCY_BUCKETS))[2]
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(buckets) + 3)
+        hist[bisect.bisect_left(buckets, value)] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe the duration of the with-block into histogram `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+# ----- Flask integration -----
+describe("pinaka_http_request_duration_seconds", "histogram", "Request latency by route")
+describe("pinaka_http_requests_total", "counter", "Requests by route and status")
+describe("pinaka_http_requests_in_flight", "gauge", "Requests currently being served (includes open streams)")
+describe("pinaka_subprocess_spawns_total", "counter", "Child processes spawned, by executable")
+
+
+def install(app):
+    """Record latency, status and in-flight count for every request of `app`."""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_started = time.perf_counter()
+        inc("pinaka_http_requests_in_flight")
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    # Teardown runs once the response (including a streamed body) is finished
+    @app.teardown_request
+    def _metrics_finish(exc):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return
+        inc("pinaka_http_requests_in_flight", -1)
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        status = 500 if exc is not None else g.pop("_metrics_status", 500)
+        observe("pinaka_http_request_duration_seconds", time.perf_counter() - started,
+                route=route, method=request.method)
+        inc("pinaka_http_requests_total", route=route, method=request.method, status=status)
+
+    _start_background()
+
+
+def _spawn_hook(event, args):
+    # Audit hooks see every Popen/os.system/posix_spawn without wrapping the
+    # subprocess module; only the event name is compared on the hot path.
+    if event == "subprocess.Popen":
+        inc("pinaka_subprocess_spawns_total", executable=os.path.basename(str(args[0])))
+    elif event in ("os.system", "os.posix_spawn"):
+        inc("pinaka_subprocess_spawns_total", executable=event)
+
+
+# ----- Aggregation across workers -----
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "values": [[name, list(labels), value] for (name, labels), value in _values.items()],
+            "histograms": [[name, list(labels), list(hist)] for (name, labels), hist in _histograms.items()],
+        }
+
+
+def _flush():
+    shared_state.set(f"{METRICS_KEY_PREFIX}{os.getpid()}", snapshot())
+
+
+def _run_flusher():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            _flush()
+        except Exception:
+            pass
+
+
+def _start_background():
+    with _lock:
+        if _flusher["started"]:
+            return
+        _flusher["started"] = True
+    sys.addaudithook(_spawn_hook)
+    threading.Thread(target=_run_flusher, daemon=True).start()
+
+
+def _merged() -> tuple:
+    values, histograms = {}, {}
+    snapshots = [snapshot()]
+    try:
+        for pid, (snap, _) in shared_state.items(METRICS_KEY_PREFIX).items():
+            if int(pid) == os.getpid():
+                continue
+            if not shared_state.pid_alive(pid):
+                shared_state.delete(METRICS_KEY_PREFIX + pid)
+                continue
+            snapshots.append(snap)
+    except Exception:
+        pass
+    for snap in snapshots:
+        for name, labels, value in snap["values"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            values[key] = values.get(key, 0) + value
+        for name, labels, hist in snap["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            histograms[key] = list(hist) if merged is None else [a + b for a, b in zip(merged, hist)]
+    return values, histograms
+
+
+# ----- Exposition -----
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    values, histograms = _merged()
+    series = {}
+    for (name, labels), value in sorted(values.items()):
+        series.setdefault(name, []).append((labels, value))
+    for (name, labels), hist in sorted(histograms.items()):
+        series.setdefault(name, []).append((labels, hist))
+    lines = []
+    for name in sorted(series):
+        kind, help_text, buckets = _meta.get(name, ("untyped", "", LATENCY_BUCKETS))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series[name]:
+            if not isinstance(value, list):
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
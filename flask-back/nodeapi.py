@@ -1,241 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from datetime import datetime
-from scapy.all import ARP, Ether, srp
 import psutil
 import os
 import json
-import paramiko
-import re
-import subprocess
-import time
 import ipaddress
 import netifaces
 import logging
-from collections import deque, defaultdict
-
+import metrics
+import node_agent
+import telemetry
+from node_agent import get_cpu_socket_count, is_interface_up, is_network_available, is_ip_reachable
 
 
 app = Flask(__name__)
 CORS(app)
-
-# Store last 60 seconds of CPU, Memory, and Bandwidth usage
-timestamped_cpu_history = deque(maxlen=60)
-timestamped_memory_history = deque(maxlen=60)
-def add_cpu_history(cpu_percent):
-    # Ensure value is always 0–100, never fraction.
-    cpu_percent = float(cpu_percent)
-    if 0 < cpu_percent <= 1.5:  # Looks like a fraction
-        cpu_percent *= 100
-    timestamped_cpu_history.append({
-        "timestamp": int(time.time()),
-        "cpu": cpu_percent
-    })
-
-def add_memory_history(mem_percent):
-    mem_percent = float(mem_percent)
-    if 0 < mem_percent <= 1.5:
-        mem_percent *= 100
-    timestamped_memory_history.append({
-        "timestamp": int(time.time()),
-        "memory": mem_percent
-    })
-
-def get_cpu_history():
-    return list(timestamped_cpu_history)
-
-def get_memory_history():
-    return list(timestamped_memory_history)
-
-# ------------------------------------------------ Validate License Start --------------------------------------------
-# Function to decrypt a code (lookup MAC address, key, and key type)
-def decrypt_code(code, lookup_table):
-    return lookup_table.get(code, None)  # Return the entire record or None
-
-
-# Load a JSON file and handle errors
-def load_json_file(file_path):
-    try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: {file_path} file not found!")
-    except json.JSONDecodeError:
-        print(f"Error: Failed to decode {file_path}. Ensure it is a valid JSON.")
-    return {}
-
-
-# Check if the MAC address is available on the system
-def is_mac_address_available(mac_address):
-    try:
-        result = subprocess.run(["ip", "link"], capture_output=True, text=True)
-        return mac_address.lower() in result.stdout.lower()
-    except Exception as e:
-        print(f"Error checking MAC address: {e}")
-        return False
-
-
-# Function to remove specified files
-def remove_files():
-    files_to_remove = [
-        "lookup_table.json",
-        "perpetual_keys.json",
-        "trial_keys.json",
-        "yearly_keys.json",
-        "triennial_keys.json",
-    ]
-    for file in files_to_remove:
-        try:
-            if os.path.exists(file):
-                os.remove(file)
-            # print(f"Removed: {file}")
-            else:
-                print(f"File not found: {file}")
-        except Exception as e:
-            print(f"Error removing file {file}: {e}")
-
-
-# Function to export the license period based on the key type
-def export_license_period(key_type):
-    period = None
-    if key_type == "trial":
-        period = 15  # 15 days for trial
-    elif key_type == "yearly":
-        period = 365  # 365 days for yearly
-    elif key_type == "triennial":
-        period = 1095  # 1095 days for triennial
-    elif key_type == "perpetual":
-        period = "null"  # No export for perpetual, it's permanent
-
-    return period
-
-def trigger_program():
-    try:
-        result = subprocess.run(
-            ["python3", "encrypt.py"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        return {"success": True, "output": result.stdout}
-    except subprocess.CalledProcessError as e:
-        return {"success": False, "message": e.stderr}
-    except Exception as e:
-        return {"success": False, "message": str(e)}
-
-
-# Validates and decrypts license codes using MAC address and socket count verification
-# Returns license details including type, period, and validation status
-@app.route("/decrypt-code", methods=["POST"])
-def decrypt_code_endpoint():
-
-    encrypt_result = trigger_program()
-
-    if not encrypt_result["success"]:
-        return jsonify(encrypt_result), 500 
-        
-    data = request.get_json()
-
-    if not data or "encrypted_code" not in data:
-        return jsonify({"success": False, "message": "Encrypted code is required"}), 400
-
-    encrypted_code = data["encrypted_code"]
-    lookup_table = load_json_file("lookup_table.json")
-    keys = load_json_file("key.json")
-
-    # Get the CPU socket count
-    socket_count_in = get_cpu_socket_count()
-    if socket_count_in is None:
-        return (
-            jsonify(
-                {"success": False, "message": "Unable to retrieve CPU socket count"}
-            ),
-            500,
-        )
-
-    # Attempt to decrypt the provided code
-    decrypted_data = decrypt_code(encrypted_code, lookup_table)
-
-    if decrypted_data is None:
-        return (
-            jsonify(
-                {"success": False, "message": "Decryption failed, data mismatched!"}
-            ),
-            400,
-        )
-
-    mac_address = decrypted_data.get("mac_address")
-    provided_key = decrypted_data.get("key")
-    socket_count = decrypted_data.get("socket_count")
-    license_type = decrypted_data.get(
-        "licensePeriod"
-    )  # Assuming `licensePeriod` contains the license type
-
-    # Check if the MAC address is available on the system
-    if not is_mac_address_available(mac_address):
-        return (
-            jsonify(
-                {"success": False, "message": "MAC address not found on the system"}
-            ),
-            404,
-        )
-
-    if int(socket_count) != int(socket_count_in):
-        return (
-            jsonify({"success": False, "message": "Mismatching in Socket Count"}),
-            400,
-        )
-
-    if not decrypted_data:
-        return jsonify({"success": False, "message": "Code not found!"}), 404
-
-    # Path to the license.txt file
-    license_file_path = "/home/pinakasupport/license.txt"
-
-    # Check if the license code already exists in the license.txt file
-    if check_license_used(license_file_path, encrypted_code):
-        return jsonify({"success": False, "message": "Code already used"}), 400
-
-    # Verify the provided key against key.json and identify the key type
-    key_type = next(
-        (ktype for ktype, kvalue in keys.items() if kvalue == provided_key), None
-    )
-
-    if key_type:
-        # Get the license period based on the key type
-        license_period = export_license_period(key_type)
-
-        remove_files()
-
-        # Send response to frontend
-        return jsonify(
-            {
-                "success": True,
-                "mac_address": mac_address,
-                "key_type": key_type,
-                "license_period": license_period if license_period else "1",
-                "socket_count": socket_count,
-            }
-        )
-    else:
-        return jsonify({"success": False, "message": "Invalid key provided"}), 404
-
-
-# Helper function to check if the license code is already used
-def check_license_used(file_path, license_code):
-    try:
-        if os.path.exists(file_path):
-            with open(file_path, "r") as file:
-                used_codes = file.readlines()
-                return any(license_code.strip() == line.strip() for line in used_codes)
-        return False
-    except Exception as e:
-        app.logger.error(f"Error checking license code in {file_path}: {e}")
-        return False
-
-
-
-# ------------------------------------------------ Validate License End --------------------------------------------
+metrics.install(app)
+# Host collectors shared with app.py (licensing, disks, interfaces, utilization, /node-facts)
+app.register_blueprint(node_agent.bp)
+# Push metrics and facts to the controller when PINAKA_CONTROLLER_URL is set
+telemetry.start_push()
 
 
 # ------------------------------------------------- Save and validate deploy config start----------------------------
@@ -479,174 +263,8 @@ def submit_network_config():
         return jsonify({"success": False, "message": f"Bad Request: {str(e)}"}), 400
 
 
-def is_interface_up(interface):
-    """Check if the given network interface is up. If not, attempt to bring it up."""
-    # Skip checking interfaces that start with "enx"
-    if interface.startswith("enx"):
-        return True
-    
-    try:
-        result = subprocess.run(
-            ["ip", "link", "show", interface],
-            stdout=subprocess.PIPE,
-            universal_newlines=True,
-        )
-
-        if "state UP" in result.stdout:
-            return True  # Interface is already up
-
-        print(f"Interface {interface} is down. Attempting to bring it up...")
-
-        subprocess.run(["sudo", "ip", "link", "set", interface, "up"], check=False)
-        subprocess.run(["sudo", "systemctl", "restart", "networking"], check=False)
-        time.sleep(10)
-
-        result = subprocess.run(
-            ["ip", "link", "show", interface],
-            stdout=subprocess.PIPE,
-            universal_newlines=True,
-        )
-        if "state UP" in result.stdout:
-            return True
-
-        print(f"Retrying with ifconfig for {interface}...")
-        subprocess.run(["sudo", "ifconfig", interface, "up"], check=False)
-        subprocess.run(["sudo", "systemctl", "restart", "networking"], check=False)
-        time.sleep(10)
-
-        result = subprocess.run(
-            ["ip", "link", "show", interface],
-            stdout=subprocess.PIPE,
-            universal_newlines=True,
-        )
-        if "state UP" in result.stdout:
-            return True
-
-        print(f"Error: Interface {interface} is still down after multiple attempts.")
-        return False
-
-    except Exception as e:
-        print(f"Error checking interface {interface}: {e}")
-        return False
-
-
-def is_network_available(ip):
-    try:
-        subnet = ".".join(ip.split(".")[:3])
-        interfaces = psutil.net_if_addrs()
-
-        for interface, addresses in interfaces.items():
-            for addr in addresses:
-                if addr.family.name == "AF_INET":
-                    local_ip = addr.address
-                    local_subnet = ".".join(local_ip.split(".")[:3])
-                    if local_ip == ip:
-                        # It's the host's own IP, so it's fine
-                        return True
-                    if local_subnet == subnet:
-                        # Same subnet, but not the same IP → we need to ping
-                        result = subprocess.run(
-                            ["ping", "-c", "1", "-W", "1", ip],
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL
-                        )
-                        return result.returncode != 0  # True if IP is not reachable (i.e., available)
-        
-        # If no local interface in subnet
-        print(f"Error: No network interface available in the subnet {subnet}.")
-        return False
-
-    except Exception as e:
-        print(f"Error checking network availability: {e}")
-        return False
-
-
-def is_ip_reachable(dns_ip, count=1, timeout=2):
-    """
-    Ping a DNS server IP to check if it's reachable.
-
-    Args:
-        dns_ip (str): The DNS IP address to check.
-        count (int): Number of ping packets to send.
-        timeout (int): Timeout per ping attempt in seconds.
-
-    Returns:
-        bool: True if reachable, False otherwise.
-    """
-    try:
-        result = subprocess.run(
-            ["ping", "-c", str(count), "-W", str(timeout), dns_ip],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-        return result.returncode == 0
-    except Exception as e:
-        print(f"Error pinging DNS {dns_ip}: {e}")
-        return False
-
 # ------------------------------------------------- Save and validate deploy config end----------------------------
 
-# ------------------------------------------------GET DISK LIST FROM THE RUNNING SERVER Start-----------------------
-
-
-def get_root_disk():
-    """Find the root disk name."""
-    try:
-        result = subprocess.run(
-            ["lsblk", "-o", "NAME,MOUNTPOINT", "-J"], capture_output=True, text=True
-        )
-        data = json.loads(result.stdout)
-
-        for disk in data.get("blockdevices", []):
-            if "children" in disk:
-                for part in disk["children"]:
-                    if part.get("mountpoint") == "/":
-                        return disk["name"]  # Root disk name (e.g., "sda")
-
-        return None  # Return None if no root disk is found
-    except Exception as e:
-        return None
-
-
-def get_disk_list():
-    """Fetch disk list using lsblk and exclude the root disk."""
-    try:
-        # Get disk details including WWN
-        result = subprocess.run(
-            ["lsblk", "-o", "NAME,SIZE,WWN", "-J"], capture_output=True, text=True
-        )
-        disks = json.loads(result.stdout).get("blockdevices", [])
-
-        # Get the root disk name
-        root_disk = get_root_disk()
-
-        # Filter out small-sized disks (KB, MB) and the root disk
-        small_size_pattern = re.compile(r"\b(\d+(\.\d+)?)\s*(K|M)\b", re.IGNORECASE)
-        filtered_disks = [
-            {
-                "name": disk["name"],
-                "size": disk["size"],
-                "wwn": disk.get("wwn", "N/A"),  # Some disks may not have WWN
-            }
-            for disk in disks
-            if not small_size_pattern.search(disk["size"]) and disk["name"] != root_disk
-        ]
-
-        return filtered_disks
-    except Exception as e:
-        return str(e)
-
-
-# Retrieves list of available disks excluding the root disk and small partitions
-# Returns disk information including name, size, and WWN identifiers
-@app.route("/get-disks", methods=["GET"])
-def get_disks():
-    """API endpoint to get the list of available disks."""
-    disks = get_disk_list()
-    return jsonify({"disks": disks, "status": "success"})
-
-# ------------------------------------------------GET DISK LIST FROM THE RUNNING SERVER End-----------------------
-
 # ------------------------------------------------ local Interface list Start --------------------------------------------
 
 
@@ -695,413 +313,16 @@ def get_interfacesdetails():
 
     return jsonify(response)
 
-# Retrieves available network interfaces and CPU socket count from the system
-# Returns interface list and hardware information for network configuration
-@app.route("/get-interfaces", methods=["GET"])
-def get_interfaces():
-    # Initialize the interfaces list
-    interfaces = []
-
-    interfaces = get_available_interfaces()
-
-    # Fetch the number of CPU sockets (physical CPUs)
-    cpu_sockets = get_cpu_socket_count()
-
-    # Include the number of CPU sockets in the response
-    response = {"interfaces": interfaces, "cpu_sockets": cpu_sockets}
-
-    return jsonify(response)
-
-# Function to get the CPU socket count
-def get_cpu_socket_count():
-    try:
-        if os.path.exists("/proc/cpuinfo"):
-            with open("/proc/cpuinfo", "r") as cpuinfo:
-                sockets = set()
-                for line in cpuinfo:
-                    if line.startswith("physical id"):
-                        sockets.add(line.split(":")[1].strip())
-                return len(sockets)
-        else:
-            print("This script is designed to work on Linux systems.")
-            return None
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
-
-# ------------------- System Utilization Endpoint -------------------
-import psutil
-# Returns current CPU and memory utilization percentages and absolute values
-# Updates historical data buffers for trending and monitoring purposes
-@app.route('/system-utilization', methods=['GET'])
-def system_utilization():
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        mem = psutil.virtual_memory()
-        mem_percent = mem.percent
-        total_mem_mb = int(mem.total / (1024*1024))
-        used_mem_mb = int(mem.used / (1024*1024))
-        # Add to history buffers
-        add_cpu_history(cpu_percent)
-        add_memory_history(mem_percent)
-        return jsonify({
-            "cpu": cpu_percent,
-            "memory": mem_percent,
-            "total_memory": total_mem_mb,
-            "used_memory": used_mem_mb
-        })
-    except Exception as e:
-        # Always return all keys with safe values, plus error for debugging
-        return jsonify({
-            "cpu": 0,
-            "memory": 0,
-            "total_memory": 0,
-            "used_memory": 0,
-            "error": str(e)
-        }), 200
-
-# Returns historical CPU and memory utilization data from the last 60 samples
-# Provides time-series data for system performance monitoring and analysis
-@app.route('/system-utilization-history', methods=['GET'])
-def system_utilization_history():
-    try:
-        cpu_history = get_cpu_history()
-        memory_history = get_memory_history()
-        return jsonify({
-            "cpu_history": cpu_history,
-            "memory_history": memory_history
-        })
-    except Exception as e:
-        return jsonify({
-            "cpu_history": [],
-            "memory_history": [],
-            "error": str(e)
-        })
-
-def get_available_interfaces():
-    try:
-        interfaces = []
-        for iface in os.listdir("/sys/class/net/"):
-            # Ignore loopback
-            if iface == "lo":
-                continue
-            real_path = os.path.realpath(f"/sys/class/net/{iface}")
-            if "/devices/virtual/" not in real_path and os.path.exists(f"/sys/class/net/{iface}/device"):
-                interfaces.append(iface)
-        return interfaces
-    except Exception:
-        return []
-
-# Returns list of available network interfaces excluding virtual and loopback interfaces
-# Provides interface names for network configuration and management
-@app.route("/interfaces", methods=["GET"])
-def interfaces():
-    iface_list = get_available_interfaces()
-    return jsonify([{"label": iface, "value": iface} for iface in iface_list])
-
-# history of last 60 samples
-timestamped_bandwidth_history = deque(maxlen=60)
 
-# per-interface last sample (rx, tx, ts)
-last_bandwidth = defaultdict(lambda: {'rx': 0, 'tx': 0, 'timestamp': 0})
 
-def get_bandwidth_proc(interface):
-    try:
-        with open('/proc/net/dev', 'r') as f:
-            for line in f:
-                if ':' not in line:
-                    continue
-                name, rest = line.split(':', 1)
-                if name.strip() == interface:
-                    fields = rest.split()
-                    rx_bytes = int(fields)   # first receive field after colon
-                    tx_bytes = int(fields[10])   # ninth transmit field after colon
-                    return rx_bytes, tx_bytes
-        return None, None
-    except Exception:
-        return None, None
-
-# Optionally prefer /sys (slightly simpler, one file per counter)
-def get_bandwidth_sys(interface):
-    try:
-        with open(f'/sys/class/net/{interface}/statistics/rx_bytes', 'r') as f:
-            rx = int(f.read().strip())
-        with open(f'/sys/class/net/{interface}/statistics/tx_bytes', 'r') as f:
-            tx = int(f.read().strip())
-        return rx, tx
-    except Exception:
-        return None, None
-
-# choose one reader; /sys is often the cleanest
-get_bandwidth = get_bandwidth_sys  # or get_bandwidth_proc
-
-def get_latency(host="8.8.8.8", count=3):
-    try:
-        output = subprocess.check_output(["ping", "-c", str(count), host], stderr=subprocess.DEVNULL).decode()
-        match = re.search(r"min/avg/max/(?:mdev|stddev) = [\d\.]+/([\d\.]+)/", output)
-        if match:
-            return float(match.group(1))
-    except Exception:
-        pass
-    return None
-
-def sample_rates(interface, interval_sec=1):
-    # one-shot sampler: get delta over interval_sec
-    rx1, tx1 = get_bandwidth(interface)
-    if rx1 is None or tx1 is None:
-        return None, None
-    time.sleep(interval_sec)
-    rx2, tx2 = get_bandwidth(interface)
-    if rx2 is None or tx2 is None:
-        return None, None
-    rx_kbps = (rx2 - rx1) / 1024.0 / interval_sec
-    tx_kbps = (tx2 - tx1) / 1024.0 / interval_sec
-    return rx_kbps, tx_kbps
-
-def add_bandwidth_history(interface):
-    rx, tx = get_bandwidth(interface)
-    now = int(time.time())
-    if rx is None or tx is None:
-        return
-    last = last_bandwidth[interface]
-    if last['timestamp'] == 0:
-        last_bandwidth[interface] = {'rx': rx, 'tx': tx, 'timestamp': now}
-        return
-    elapsed = now - last['timestamp']
-    if elapsed <= 0:
-        return
-    rx_kbps = (rx - last['rx']) / 1024.0 / elapsed
-    tx_kbps = (tx - last['tx']) / 1024.0 / elapsed
-    timestamped_bandwidth_history.append({
-        "timestamp": now,
-        "rx_kbps": round(rx_kbps, 2),
-        "tx_kbps": round(tx_kbps, 2),
-        "interface": interface
-    })
-    last_bandwidth[interface] = {'rx': rx, 'tx': tx, 'timestamp': now}
-
-def get_bandwidth_history():
-    return list(timestamped_bandwidth_history)
-
-# Monitors network health by measuring bandwidth usage and latency for specified interface
-# Returns real-time network performance metrics including throughput and ping times
-@app.route("/network-health", methods=["GET"])
-def network_health():
-    interfaces = get_available_interfaces()
-    interface = request.args.get("interface")
-    if not interface:
-        if interfaces:
-            interface = interfaces  # pick first available
-        else:
-            return jsonify({"error": "No network interfaces available"}), 500
-
-    ping_host = request.args.get("ping_host", "8.8.8.8")
-
-    rx_kbps, tx_kbps = sample_rates(interface, interval_sec=1)
-    if rx_kbps is None or tx_kbps is None:
-        return jsonify({"error": f"Failed to read bandwidth data for interface {interface}"}), 500
-
-    latency_ms = get_latency(ping_host)
-
-    add_bandwidth_history(interface)
-
-    return jsonify({
-        "time": time.strftime("%H:%M"),
-        "rx_kbps": round(rx_kbps, 2),
-        "tx_kbps": round(tx_kbps, 2),
-        "total_kbps": round(rx_kbps + tx_kbps, 2),
-        "latency_ms": round(latency_ms, 2) if latency_ms is not None else None,
-        "interface": interface
-    })
-
-# Returns historical bandwidth usage data for network interfaces over time
-# Provides network traffic analysis and trending information for capacity planning
-@app.route('/bandwidth-history', methods=['GET'])
-def bandwidth_history():
-    interface = request.args.get('interface')
-    if not interface:
-        interfaces = get_available_interfaces()
-        if interfaces:
-            interface = interfaces
-        else:
-            return jsonify({"bandwidth_history": [], "error": "No interfaces available"})
-    add_bandwidth_history(interface)
-    return jsonify({"bandwidth_history": get_bandwidth_history()})
-
-# Thresholds for health levels
-CPU_WARNING = 80
-CPU_CRITICAL = 90
-MEM_WARNING = 70
-MEM_CRITICAL = 85
-DISK_WARNING = 80
-DISK_CRITICAL = 90
-
-def get_local_health_status():
-    try:
-        # CPU usage (average over 1 second)
-        cpu_usage = psutil.cpu_percent(interval=1)
-
-        # Memory usage
-        mem = psutil.virtual_memory()
-        mem_usage = mem.percent
-
-        # Disk usage
-        disk = psutil.disk_usage('/')
-        disk_usage = disk.percent
-
-        # Determine status
-        status = "Good"
-        if cpu_usage > CPU_CRITICAL or mem_usage > MEM_CRITICAL or disk_usage > DISK_CRITICAL:
-            status = "Critical"
-        elif cpu_usage > CPU_WARNING or mem_usage > MEM_WARNING or disk_usage > DISK_WARNING:
-            status = "Warning"
-
-        # Build reasons per metric
-        reasons = []
-        if cpu_usage > CPU_CRITICAL:
-            reasons.append({"metric": "CPU", "level": "CRITICAL", "actual": round(cpu_usage, 2), "threshold": CPU_CRITICAL})
-        elif cpu_usage > CPU_WARNING:
-            reasons.append({"metric": "CPU", "level": "WARNING", "actual": round(cpu_usage, 2), "threshold": CPU_WARNING})
-
-        if mem_usage > MEM_CRITICAL:
-            reasons.append({"metric": "Memory", "level": "CRITICAL", "actual": round(mem_usage, 2), "threshold": MEM_CRITICAL})
-        elif mem_usage > MEM_WARNING:
-            reasons.append({"metric": "Memory", "level": "WARNING", "actual": round(mem_usage, 2), "threshold": MEM_WARNING})
-
-        if disk_usage > DISK_CRITICAL:
-            reasons.append({"metric": "Disk", "level": "CRITICAL", "actual": round(disk_usage, 2), "threshold": DISK_CRITICAL})
-        elif disk_usage > DISK_WARNING:
-            reasons.append({"metric": "Disk", "level": "WARNING", "actual": round(disk_usage, 2), "threshold": DISK_WARNING})
-
-        return {
-            "status": status,
-            "metrics": {
-                "cpu_usage_percent": round(cpu_usage, 2),
-                "memory_usage_percent": round(mem_usage, 2),
-                "disk_usage_percent": round(disk_usage, 2)
-            },
-            "thresholds": {
-                "cpu": {"warning": CPU_WARNING, "critical": CPU_CRITICAL},
-                "memory": {"warning": MEM_WARNING, "critical": MEM_CRITICAL},
-                "disk": {"warning": DISK_WARNING, "critical": DISK_CRITICAL}
-            },
-            "reasons": reasons
-        }
-
-    except Exception as e:
-        return {"status": "Error", "message": str(e)}
-
-# Performs comprehensive system health check including CPU, memory, and disk usage
-# Returns health status with warning/critical thresholds and detailed metrics
-@app.route('/check-health', methods=['GET'])
-def check_health():
-    result = get_local_health_status()
-    return jsonify(result)
-
-
-# Returns detailed disk usage information for all partitions on the root disk
-# Provides storage capacity analysis including total, used space, and usage percentages
-@app.route('/disk-usage', methods=['GET'])
-def disk_usage():
-    """Return detailed disk usage for all mount points on the root disk.
-    Response shape:
-    {
-      "root_disk": "sda",
-      "partitions": [
-        {"mountpoint": "/", "device": "/dev/sda2", "fstype": "ext4", "total": 123456, "used": 1234, "percent": 12.3}
-      ]
-    }
-    """
-    try:
-        root_disk = get_root_disk()
-        partitions = []
-        if root_disk:
-            for part in psutil.disk_partitions(all=False):
-                try:
-                    # Consider only partitions that belong to the root disk
-                    if not part.device or not part.mountpoint:
-                        continue
-                    if f"/dev/{root_disk}" not in part.device:
-                        continue
-                    usage = psutil.disk_usage(part.mountpoint)
-                    partitions.append({
-                        "mountpoint": part.mountpoint,
-                        "device": part.device,
-                        "fstype": part.fstype,
-                        "total": int(usage.total),
-                        "used": int(usage.used),
-                        "percent": float(usage.percent),
-                    })
-                except Exception:
-                    # Ignore partitions that cannot be accessed
-                    continue
-            # Stable ordering
-            partitions.sort(key=lambda x: x.get("mountpoint", ""))
-        return jsonify({
-            "root_disk": root_disk,
-            "partitions": partitions
-        })
-    except Exception as e:
-        return jsonify({
-            "root_disk": None,
-            "partitions": [],
-            "error": str(e)
-        }), 200
-
-
-# Retrieves Docker container status and statistics from the local system
-# Returns container count, status (up/down), and detailed container information
-@app.route('/docker-info', methods=['GET'])
-def docker_info():
-    result = get_docker_info()
-    return jsonify(result)
+# ------------------------------------------------ local Interface list End --------------------------------------------
 
-def get_docker_info():
-    containers = []
-    up_count = 0
-    down_count = 0
-    try:
-        # Get all containers (id, name, status)
-        cmd = [
-            'sudo','docker', 'ps', '-a', '--format', '{{.ID}}||{{.Names}}||{{.Status}}'
-        ]
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
-        for line in output.strip().split('\n'):
-            if not line.strip():
-                continue
-            parts = line.split('||')
-            if len(parts) != 3:
-                continue
-            docker_id, container_name, status_text = parts
-            # Consider "UP" if status starts with "Up", else "DOWN"
-            status = 'UP' if status_text.strip().lower().startswith('up') else 'DOWN'
-            if status == 'UP':
-                up_count += 1
-            else:
-                down_count += 1
-            containers.append({
-                'dockerId': docker_id,
-                'containerName': container_name,
-                'status': status
-            })
-        return {
-            'containers': containers,
-            'total': len(containers),
-            'up': up_count,
-            'down': down_count
-        }
-    except Exception as e:
-        return {
-            'containers': [],
-            'total': 0,
-            'up': 0,
-            'down': 0,
-            'error': str(e)
-        }
-# ------------------- System Utilization End -------------------
+# Prometheus scrape endpoint: request latency/status per route, summed over all gunicorn workers
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
 
-# ------------------------------------------------ local Interface list End --------------------------------------------
 if __name__ == "__main__":
     app.run(
         host="0.0.0.0",
@@ -0,0 +1,210 @@
+# Cluster-wide utilization rollups on the controller.
+# Samples pushed by node agents (telemetry.py) are folded into per-node
+# partials for fixed time buckets as they arrive: one shared_state key per
+# (tier, bucket, node) holding sum/count/max per metric. Sample timestamps are
+# first moved onto the controller's clock using the push's sent_at, so a node
+# with a skewed clock lands in the right buckets.
+#
+# Once a bucket is ROLLUP_GRACE_SECONDS past its end it is closed: the node
+# partials become one compact row (avg, p95, max and sum across nodes plus the
+# top-N nodes per metric), appended to that tier's bounded ring, the partials
+# are deleted and the bucket is recorded as the tier's last closed one. One
+# worker at a time closes buckets (lease). Only samples for a bucket at or
+# before the last closed one are late (counted and dropped); a backlog resent
+# after an outage is kept as long as its buckets are still open. Ingest and
+# closing each run in one transaction, so a sample cannot land in a bucket
+# that is being closed.
+#
+# Tiers: 1-minute rows for 24 hours and 15-minute rows for 14 days, so a
+# capacity dashboard reads at most ~1,500 rows however many nodes there are.
+
+import math
+import threading
+import time
+
+import metrics
+import shared_state
+
+ROLLUP_METRICS = ("cpu", "memory", "disk", "rx_kbps", "tx_kbps")
+# (bucket seconds, rows kept)
+ROLLUP_TIERS = ((60, 1440), (900, 1344))
+ROLLUP_GRACE_SECONDS = 90       # pushes arrive every 30 s by default
+TOP_NODES = 5
+
+PARTIAL_KEY_PREFIX = "rollup_open:"
+RING_PREFIX = "rollup:"
+CLOSED_KEY_PREFIX = "rollup_closed:"    # + step -> start of the tier's last closed bucket
+CLOSE_LEASE = "rollup_close"
+
+metrics.describe("pinaka_rollup_late_samples_total", "counter", "Samples too late for their (closed) rollup bucket")
+metrics.describe("pinaka_rollup_close_seconds", "histogram", "Time to close finished rollup buckets")
+
+_close = {"last": 0.0, "lock": threading.Lock()}
+
+
+def _partial_prefix(step: int, bucket=None) -> str:
+    prefix = f"{PARTIAL_KEY_PREFIX}{step}:"
+    # Zero-padded so that keys sort by bucket start
+    return prefix if bucket is None else f"{prefix}{int(bucket):012d}:"
+
+
+def last_closed(step: int) -> int:
+    """Start of the tier's most recently closed bucket (-1 before the first)."""
+    closed = shared_state.get(f"{CLOSED_KEY_PREFIX}{step}")
+    if closed is None:
+        # Ring written before the marker was kept
+        rows = shared_state.tail(f"{RING_PREFIX}{step}", 1)
+        closed = rows[-1]["t"] if rows else -1
+    return closed
+
+
+def add_samples(node: str, samples: list, clock_offset: float = 0.0):
+    """Fold a node's new samples into the open buckets of every tier.
+
+    clock_offset is added to each sample's ts to put it on this host's clock.
+    """
+    if not samples:
+        return
+    with shared_state.transaction():
+        for step, _ in ROLLUP_TIERS:
+            closed = last_closed(step)
+            by_bucket = {}
+            for sample in samples:
+                bucket = int((sample["ts"] + clock_offset) // step * step)
+                if bucket <= closed:
+                    metrics.inc("pinaka_rollup_late_samples_total", step=step)
+                    continue
+                by_bucket.setdefault(bucket, []).append(sample)
+            for bucket, bucket_samples in by_bucket.items():
+                key = _partial_prefix(step, bucket) + node
+                partial = shared_state.get(key) or {}
+                for sample in bucket_samples:
+                    for name in ROLLUP_METRICS:
+                        value = sample.get(name)
+                        if value is None:
+                            continue
+                        entry = partial.setdefault(name, [0.0, 0, value])
+                        entry[0] += value
+                        entry[1] += 1
+                        entry[2] = max(entry[2], value)
+                shared_state.set(key, partial)
+    maybe_close()
+
+
+def _p95(values: list) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def summarise(bucket: int, partials: dict, top: int = TOP_NODES) -> dict:
+    """Collapse {node: partial} for one bucket into a rollup row."""
+    row = {"t": bucket, "nodes": len(partials)}
+    for name in ROLLUP_METRICS:
+        means = {node: p[name][0] / p[name][1] for node, p in partials.items() if p.get(name) and p[name][1]}
+        if not means:
+            continue
+        values = list(means.values())
+        hottest = sorted(means.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        row[name] = {
+            "avg": round(sum(values) / len(values), 2),
+            "p95": round(_p95(values), 2),
+            "max": round(max(p[name][2] for p in partials.values() if p.get(name)), 2),
+            "sum": round(sum(values), 2),
+            "top": [[node, round(value, 2)] for node, value in hottest],
+        }
+    return row
+
+
+def _open_buckets(step: int) -> dict:
+    """{bucket: {node: partial}} for the tier's not yet closed buckets."""
+    buckets = {}
+    prefix = _partial_prefix(step)
+    for suffix, (partial, _) in shared_state.items(prefix).items():
+        bucket, node = suffix.split(":", 1)
+        buckets.setdefault(int(bucket), {})[node] = partial
+    return buckets
+
+
+def close_buckets(now=None):
+    """Turn every bucket past its grace period into a ring row."""
+    now = time.time() if now is None else now
+    for step, keep in ROLLUP_TIERS:
+        with shared_state.transaction():
+            for bucket, partials in sorted(_open_buckets(step).items()):
+                if bucket + step + ROLLUP_GRACE_SECONDS > now:
+                    break
+                shared_state.append(f"{RING_PREFIX}{step}", summarise(bucket, partials), keep)
+                shared_state.set(f"{CLOSED_KEY_PREFIX}{step}", bucket)
+                for node in partials:
+                    shared_state.delete(_partial_prefix(step, bucket) + node)
+
+
+def maybe_close():
+    """Close finished buckets at most every few seconds per worker, one worker at a time."""
+    with _close["lock"]:
+        if time.time() - _close["last"] < min(step for step, _ in ROLLUP_TIERS) / 4:
+            return
+        _close["last"] = time.time()
+    if not shared_state.acquire_lease(CLOSE_LEASE, 60):
+        return
+    try:
+        with metrics.timer("pinaka_rollup_close_seconds"):
+            close_buckets()
+    finally:
+        shared_state.release_lease(CLOSE_LEASE)
+
+
+def pick_step(window: float) -> int:
+    """Finest tier whose ring covers the window."""
+    for step, keep in ROLLUP_TIERS:
+        if window <= step * keep:
+            return step
+    return ROLLUP_TIERS[-1][0]
+
+
+def query(window: float, step=None, names=None, top: int = TOP_NODES) -> dict:
+    """Rollup rows of the last `window` seconds, plus the open buckets and a window summary."""
+    maybe_close()
+    step = step or pick_step(window)
+    keep = dict(ROLLUP_TIERS)[step]
+    names = names or ROLLUP_METRICS
+    since = time.time() - window
+    rows = [r for r in shared_state.tail(f"{RING_PREFIX}{step}", min(keep, int(window // step) + 1))
+            if r["t"] + step > since]
+    closed = last_closed(step)
+    for bucket, partials in sorted(_open_buckets(step).items()):
+        if bucket > closed and bucket + step > since:
+            rows.append(dict(summarise(bucket, partials, top), partial=True))
+
+    series = []
+    for row in rows:
+        entry = {"t": row["t"], "nodes": row["nodes"]}
+        if row.get("partial"):
+            entry["partial"] = True
+        for name in names:
+            if name in row:
+                entry[name] = dict(row[name], top=row[name]["top"][:top])
+        series.append(entry)
+    return {"step": step, "window": int(window), "series": series, "summary": _window_summary(series, names, top)}
+
+
+def _window_summary(series: list, names, top: int) -> dict:
+    summary = {}
+    for name in names:
+        points = [row[name] for row in series if name in row]
+        if not points:
+            continue
+        # Hottest nodes: mean of a node's values over the buckets where it ranked in the top-N
+        seen = {}
+        for point in points:
+            for node, value in point["top"]:
+                seen.setdefault(node, []).append(value)
+        hottest = sorted(((node, sum(v) / len(v), len(v)) for node, v in seen.items()),
+                         key=lambda item: (item[2], item[1]), reverse=True)[:top]
+        summary[name] = {
+            "avg": round(sum(p["avg"] for p in points) / len(points), 2),
+            "p95": round(_p95([p["p95"] for p in points]), 2),
+            "max": max(p["max"] for p in points),
+            "hottest": [{"node": node, "avg": round(avg, 2), "buckets": count} for node, avg, count in hottest],
+        }
+    return summary
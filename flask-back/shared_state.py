@@ -0,0 +1,167 @@
+# Cross-process state for the 2020-port Flask services.
+# Under gunicorn every worker is its own process, so module-level dicts and
+# deques would give each worker a different view of the metric histories,
+# the SSH polling results and the Ceph summary. Those live here instead, in a
+# small SQLite database in WAL mode that every worker on the host opens.
+#
+#   kv     key -> JSON value (+ time it was written)
+#   ring   bounded, ordered lists (metric histories, event feeds)
+#   lease  named, expiring locks for cross-process single-flight work
+#
+# transaction() groups reads and writes into one BEGIN IMMEDIATE transaction
+# for check-then-write updates that must be atomic across workers.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+STATE_DB = os.environ.get("PINAKA_STATE_DB", "/home/pinakasupport/.pinaka_wd/flask_state.db")
+BUSY_TIMEOUT_SECONDS = 10
+
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    """Per-thread connection (sqlite3 connections must not cross threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+    # New thread, or a forked worker that inherited the parent's connection
+    os.makedirs(os.path.dirname(STATE_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(STATE_DB, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS kv (
+            key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS ring (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, value TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS ring_name ON ring (name, seq);
+        CREATE TABLE IF NOT EXISTS lease (
+            name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+    """)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def pid_alive(pid) -> bool:
+    """True when a process with this pid exists on the host (None/garbage: False)."""
+    try:
+        pid = int(pid)
+        if pid <= 0:
+            return False
+        os.kill(pid, 0)
+        return True
+    except (OSError, TypeError, ValueError):
+        return False
+
+
+def _owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+
+@contextmanager
+def transaction():
+    """Make the enclosed calls (on this thread) one atomic transaction; nested use joins the outer one."""
+    conn = _db()
+    if conn.in_transaction:
+        yield
+        return
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        yield
+
+
+def get(key: str, default=None):
+    value, _ = get_with_time(key)
+    return default if value is None else value
+
+
+def get_with_time(key: str):
+    """Return (value, updated_at); (None, 0) when the key is missing."""
+    row = _db().execute("SELECT value, updated_at FROM kv WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None, 0
+    return json.loads(row[0]), row[1]
+
+
+def set(key: str, value):
+    _db().execute(
+        "INSERT OR REPLACE INTO kv (key, value, updated_at) VALUES (?, ?, ?)",
+        (key, json.dumps(value), time.time()),
+    )
+
+
+def delete(key: str):
+    _db().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+def items(prefix: str) -> dict:
+    """Return {key_without_prefix: (value, updated_at)} for keys under prefix."""
+    rows = _db().execute(
+        "SELECT key, value, updated_at FROM kv WHERE key >= ? AND key < ?",
+        (prefix, prefix + "\uffff"),
+    ).fetchall()
+    return {key[len(prefix):]: (json.loads(value), updated) for key, value, updated in rows}
+
+
+def append(name: str, value, maxlen: int):
+    """Append to the named ring and drop entries beyond the newest maxlen."""
+    conn = _db()
+    with transaction():
+        conn.execute("INSERT INTO ring (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+        conn.execute(
+            "DELETE FROM ring WHERE name = ? AND seq <= "
+            "(SELECT seq FROM ring WHERE name = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+            (name, name, maxlen),
+        )
+
+
+def tail(name: str, limit: Optional[int] = None) -> list:
+    """Return the ring oldest-first (optionally only the newest `limit` entries)."""
+    rows = _db().execute(
+        "SELECT value FROM ring WHERE name = ? ORDER BY seq DESC LIMIT ?",
+        (name, -1 if limit is None else limit),
+    ).fetchall()
+    return [json.loads(row[0]) for row in reversed(rows)]
+
+
+def since(name: str, seq: int) -> list:
+    """Return [(seq, value)] for ring entries newer than seq, oldest first (a follower's cursor)."""
+    rows = _db().execute(
+        "SELECT seq, value FROM ring WHERE name = ? AND seq > ? ORDER BY seq", (name, seq),
+    ).fetchall()
+    return [(row[0], json.loads(row[1])) for row in rows]
+
+
+def last_seq(name: str) -> int:
+    """Sequence number of the newest entry in the ring (0 when empty)."""
+    row = _db().execute("SELECT MAX(seq) FROM ring WHERE name = ?", (name,)).fetchone()
+    return row[0] or 0
+
+
+def acquire_lease(name: str, seconds: float) -> bool:
+    """Take (or extend) a named lease; False while another owner holds it."""
+    now = time.time()
+    conn = _db()
+    cursor = conn.execute(
+        "INSERT INTO lease (name, owner, expires) VALUES (?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+        "WHERE lease.expires < ? OR lease.owner = excluded.owner",
+        (name, _owner(), now + seconds, now),
+    )
+    return cursor.rowcount == 1
+
+
+def release_lease(name: str):
+    _db().execute("DELETE FROM lease WHERE name = ? AND owner = ?", (name, _owner()))
+
+
+def lease_held(name: str) -> bool:
+    row = _db().execute("SELECT expires FROM lease WHERE name = ?", (name,)).fetchone()
+    return row is not None and row[0] >= time.time()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Startup-time benchmark for the 2020-port Flask service.
+# Imports app.py (or nodeapi.py) in fresh interpreters and reports import time
+# and RSS; exits non-zero when the median exceeds --max-seconds or when one of
+# the heavy modules that must stay lazy gets imported at module load again.
+#
+#   python3 startup_benchmark.py --runs 5 --max-seconds 1.0
+#   python3 startup_benchmark.py --module nodeapi
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules each service must not import at startup
+HEAVY_MODULES = {
+    "app": ("scapy", "openstack", "paramiko", "psutil"),
+    "nodeapi": ("scapy", "openstack", "paramiko"),
+}
+
+PROBE = r"""
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(module: str) -> dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PINAKA_WARMUP_IMPORTS="0")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES.get(module, ()))],
+        cwd=here, env=env, capture_output=True, text=True, timeout=120,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure flask-back import time")
+    parser.add_argument("--module", default="app", help="module to import (app or nodeapi)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0,
+                        help="fail when the median import time is above this")
+    parser.add_argument("--allow-heavy", action="store_true",
+                        help="do not fail when heavy modules are imported eagerly")
+    args = parser.parse_args()
+
+    samples = [measure(args.module) for _ in range(args.runs)]
+    seconds = [s["seconds"] for s in samples]
+    median = statistics.median(seconds)
+    rss = statistics.median(s["rss_mb"] for s in samples)
+    heavy = sorted({m for s in samples for m in s["heavy"]})
+
+    print(f"import {args.module}: median {median:.3f}s, min {min(seconds):.3f}s, "
+          f"max {max(seconds):.3f}s, rss {rss:.0f} MB over {args.runs} runs")
+    if heavy:
+        print(f"heavy modules imported at startup: {', '.join(heavy)}")
+
+    failed = median > args.max_seconds or (heavy and not args.allow_heavy)
+    if failed:
+        print("FAIL: startup regression")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# Push-mode node telemetry.
+# Instead of the controller (or the browser) polling every node over SSH or
+# the 2020 port, each node agent (nodeapi.py) pushes a batch to the controller
+# (app.py) every PUSH seconds:
+#
+#   {"node", "agent", "seq", "interval", "full", "facts": {...}, "samples": [...]}
+#
+# - samples: utilization/bandwidth readings taken every SAMPLE seconds since
+#   the last acknowledged push (kept, bounded, while the controller is down)
+# - facts: the node_agent facts sections whose content changed since the last
+#   acknowledged push; all of them when "full" is set
+# - agent/seq: a random id per push loop and a sequence number that only
+#   advances on success, so a resend after a lost reply reuses its seq and the
+#   controller can drop samples it already has
+#
+# Bodies are gzip-compressed JSON. Failed pushes back off exponentially (with
+# jitter) up to MAX_BACKOFF_SECONDS. The controller keeps one record per node
+# in shared_state, so every gunicorn worker serves the same /cluster/overview,
+# and answers "need_full" when it has no base to apply a delta to.
+#
+# Node environment:
+#   PINAKA_CONTROLLER_URL            controller base URL; pushing is off when unset
+#   PINAKA_TELEMETRY_SAMPLE_SECONDS  sampling interval (default 10)
+#   PINAKA_TELEMETRY_PUSH_SECONDS    push interval (default 30)
+# Both sides:
+#   PINAKA_TELEMETRY_TOKEN           shared secret sent as X-Pinaka-Token (optional)
+
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import ssl
+import threading
+import time
+import urllib.request
+import uuid
+import zlib
+from collections import deque
+
+import metrics
+import node_agent
+import shared_state
+
+SAMPLE_SECONDS = float(os.environ.get("PINAKA_TELEMETRY_SAMPLE_SECONDS", 10))
+PUSH_SECONDS = float(os.environ.get("PINAKA_TELEMETRY_PUSH_SECONDS", 30))
+MAX_BACKOFF_SECONDS = 300
+MAX_PENDING_SAMPLES = 720           # two hours at the default sample rate
+PUSH_TIMEOUT_SECONDS = 10
+MAX_BODY_BYTES = 8 * 1024 * 1024    # after decompression
+TOKEN = os.environ.get("PINAKA_TELEMETRY_TOKEN", "")
+
+# Facts sections pushed as deltas; utilization travels as samples instead
+PUSHED_FACTS = ("hardware", "interfaces", "disks", "containers", "license")
+
+PUSH_LEASE = "telemetry_push"
+TELEMETRY_KEY_PREFIX = "telemetry:"
+# A node is stale after missing this many pushes, offline after OFFLINE_AFTER
+STALE_AFTER = 2
+OFFLINE_AFTER = 5
+
+metrics.describe("pinaka_telemetry_pushes_total", "counter", "Telemetry pushes by result")
+metrics.describe("pinaka_telemetry_push_bytes", "histogram", "Compressed telemetry push size",
+                 buckets=(1024, 4096, 16384, 65536, 262144, 1048576))
+metrics.describe("pinaka_telemetry_received_total", "counter", "Telemetry batches received by result")
+
+
+# ----- Node side: push loop -----
+_push = {"started": False}
+
+
+def _facts_hash(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _Sampler:
+    """Utilization readings, with bandwidth as the rate since the previous reading."""
+
+    def __init__(self):
+        self.last_counters = None
+        self.last_cpu_times = None
+
+    def cpu_percent(self) -> float:
+        # Own delta of cpu_times, so other psutil.cpu_percent() callers in this
+        # process do not reset the interval this reading covers
+        times = node_agent.psutil.cpu_times()
+        total, idle = sum(times), times.idle + getattr(times, "iowait", 0)
+        last, self.last_cpu_times = self.last_cpu_times, (total, idle)
+        if last is None or total <= last[0]:
+            return node_agent.psutil.cpu_percent(interval=0.2)
+        return round(100.0 * (1 - (idle - last[1]) / (total - last[0])), 1)
+
+    def sample(self) -> dict:
+        psutil = node_agent.psutil
+        now = time.time()
+        rx = tx = 0
+        for iface in node_agent.get_available_interfaces():
+            r, t = node_agent.get_bandwidth(iface)
+            if r is not None and t is not None:
+                rx, tx = rx + r, tx + t
+        rx_kbps = tx_kbps = None
+        if self.last_counters is not None:
+            elapsed = now - self.last_counters[2]
+            if elapsed > 0 and rx >= self.last_counters[0] and tx >= self.last_counters[1]:
+                rx_kbps = round((rx - self.last_counters[0]) / 1024.0 / elapsed, 2)
+                tx_kbps = round((tx - self.last_counters[1]) / 1024.0 / elapsed, 2)
+        self.last_counters = (rx, tx, now)
+        return {
+            "ts": round(now, 3),
+            "cpu": self.cpu_percent(),
+            "memory": psutil.virtual_memory().percent,
+            "disk": psutil.disk_usage("/").percent,
+            "rx_kbps": rx_kbps,
+            "tx_kbps": tx_kbps,
+        }
+
+
+def _post(url: str, body: bytes) -> dict:
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    if TOKEN:
+        headers["X-Pinaka-Token"] = TOKEN
+    req = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    # The controller uses a self-signed certificate
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    with urllib.request.urlopen(req, context=ctx, timeout=PUSH_TIMEOUT_SECONDS) as resp:
+        return json.loads(resp.read() or b"{}")
+
+
+def _push_loop(controller_url: str):
+    url = controller_url.rstrip("/") + "/cluster/telemetry"
+    node = socket.gethostname()
+    agent = uuid.uuid4().hex
+    sampler = _Sampler()
+    pending = deque(maxlen=MAX_PENDING_SAMPLES)
+    acked_hashes = {}       # section -> hash the controller has
+    seq, full, failures = 1, True, 0
+    next_push = time.time()
+
+    while True:
+        # Only one worker per host pushes; the others keep checking the lease
+        if not shared_state.acquire_lease(PUSH_LEASE, max(PUSH_SECONDS, SAMPLE_SECONDS) * 3):
+            time.sleep(SAMPLE_SECONDS)
+            continue
+        try:
+            pending.append(sampler.sample())
+        except Exception as e:
+            print(f"Telemetry sample failed: {e}")
+
+        if time.time() >= next_push:
+            facts, hashes = {}, {}
+            for name in PUSHED_FACTS:
+                value, _ = node_agent.fact_section(name)
+                hashes[name] = _facts_hash(value)
+                if full or acked_hashes.get(name) != hashes[name]:
+                    facts[name] = value
+            payload = {
+                "node": node, "agent": agent, "seq": seq, "interval": PUSH_SECONDS,
+                "full": full, "sent_at": round(time.time(), 3),
+                "facts": facts, "samples": list(pending),
+            }
+            body = gzip.compress(json.dumps(payload).encode())
+            metrics.observe("pinaka_telemetry_push_bytes", len(body))
+            try:
+                reply = _post(url, body)
+                sent = len(payload["samples"])
+                for _ in range(sent):
+                    pending.popleft()
+                acked_hashes.update({name: hashes[name] for name in facts})
+                seq += 1
+                full = bool(reply.get("need_full"))
+                failures = 0
+                next_push = time.time() + PUSH_SECONDS
+                metrics.inc("pinaka_telemetry_pushes_total", result="ok")
+            except Exception as e:
+                failures += 1
+                backoff = min(MAX_BACKOFF_SECONDS, PUSH_SECONDS * 2 ** failures)
+                next_push = time.time() + backoff * random.uniform(0.8, 1.2)
+                metrics.inc("pinaka_telemetry_pushes_total", result="error")
+                if failures == 1 or failures % 10 == 0:
+                    print(f"Telemetry push to {url} failed ({failures}x), retrying in {backoff:.0f}s: {e}")
+
+        time.sleep(SAMPLE_SECONDS)
+
+
+def start_push(controller_url=None):
+    """Start the push loop when a controller URL is configured."""
+    controller_url = controller_url or os.environ.get("PINAKA_CONTROLLER_URL")
+    if not controller_url or _push["started"]:
+        return
+    _push["started"] = True
+    threading.Thread(target=_push_loop, args=(controller_url,), daemon=True).start()
+
+
+# ----- Controller side: cluster table -----
+class TelemetryRejected(ValueError):
+    """The batch is malformed or not authorised; carries the HTTP status."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def authorised(token) -> bool:
+    return not TOKEN or hmac.compare_digest(str(token or ""), TOKEN)
+
+
+def decode_body(body: bytes, encoding) -> dict:
+    """Decompress (bounded) and parse a pushed batch."""
+    if (encoding or "").lower() == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = inflater.decompress(body, MAX_BODY_BYTES)
+        if inflater.unconsumed_tail:
+            raise TelemetryRejected("Payload too large", 413)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise TelemetryRejected("Invalid JSON payload")
+    if not isinstance(payload, dict) or not payload.get("node") or not isinstance(payload.get("seq"), int):
+        raise TelemetryRejected("Missing node or seq")
+    return payload
+
+
+def clock_offset(payload: dict, received_at: float) -> float:
+    """Seconds to add to the batch's sample timestamps to put them on this host's clock."""
+    sent_at = payload.get("sent_at")
+    if isinstance(sent_at, bool) or not isinstance(sent_at, (int, float)):
+        return 0.0
+    return received_at - sent_at
+
+
+def ingest(payload: dict, remote_addr=None) -> tuple:
+    """Merge a batch into the node's record; returns (reply, new samples)."""
+    node = str(payload["node"])
+    key = TELEMETRY_KEY_PREFIX + node
+    record = shared_state.get(key) or {}
+    same_agent = record.get("agent") == payload.get("agent")
+
+    if same_agent and payload["seq"] < record.get("seq", 0):
+        metrics.inc("pinaka_telemetry_received_total", result="stale")
+        return {"ack": record["seq"], "need_full": False, "stale": True}, []
+
+    if not same_agent:
+        # New push loop (agent restart) or a node this controller has not seen
+        record = {"facts": {}, "facts_at": {}, "last_sample_ts": record.get("last_sample_ts", 0)}
+    now = time.time()
+    for name, value in (payload.get("facts") or {}).items():
+        record["facts"][name] = value
+        record["facts_at"][name] = now
+
+    # A resend after a lost reply carries samples we already have
+    samples = [s for s in payload.get("samples") or []
+               if isinstance(s, dict) and s.get("ts", 0) > record["last_sample_ts"]]
+    if samples:
+        record["last_sample_ts"] = samples[-1]["ts"]
+        record["latest"] = samples[-1]
+
+    record.update({
+        "agent": payload.get("agent"),
+        "seq": payload["seq"],
+        "interval": payload.get("interval") or PUSH_SECONDS,
+        "ip": remote_addr,
+        "received_at": now,
+    })
+    need_full = not same_agent and not payload.get("full")
+    shared_state.set(key, record)
+    metrics.inc("pinaka_telemetry_received_total", result="ok")
+    return {"ack": payload["seq"], "need_full": need_full}, samples
+
+
+def node_state(record: dict, now: float) -> str:
+    age = now - record.get("received_at", 0)
+    interval = record.get("interval") or PUSH_SECONDS
+    if age > interval * OFFLINE_AFTER:
+        return "offline"
+    if age > interval * STALE_AFTER:
+        return "stale"
+    return "online"
+
+
+def cluster_overview() -> dict:
+    """One row per pushing node plus cluster totals."""
+    now = time.time()
+    nodes = []
+    summary = {"total": 0, "online": 0, "stale": 0, "offline": 0, "health": {}}
+    for node, (record, _) in sorted(shared_state.items(TELEMETRY_KEY_PREFIX).items()):
+        facts = record.get("facts", {})
+        hardware = facts.get("hardware", {})
+        containers = facts.get("containers", {})
+        latest = record.get("latest") or {}
+        state = node_state(record, now)
+        health = (node_agent.health_level(latest["cpu"], latest["memory"], latest["disk"])
+                  if state == "online" and latest else "Unknown")
+        nodes.append({
+            "node": node,
+            "ip": record.get("ip"),
+            "state": state,
+            "health": health,
+            "last_seen": int(record.get("received_at", 0)),
+            "seconds_since_push": round(now - record.get("received_at", 0), 1),
+            "utilization": latest,
+            "cpu_sockets": hardware.get("cpu_sockets"),
+            "total_memory": hardware.get("total_memory"),
+            "interfaces": len(facts.get("interfaces") or []),
+            "disks": len((facts.get("disks") or {}).get("disks") or []),
+            "containers": {k: containers.get(k) for k in ("total", "up", "down")} if containers else None,
+            "license": facts.get("license"),
+        })
+        summary["total"] += 1
+        summary[state] += 1
+        summary["health"][health] = summary["health"].get(health, 0) + 1
+    return {"generated_at": int(now), "summary": summary, "nodes": nodes}
+
+
+def node_record(node: str):
+    """Full stored record (all facts) for one node, or None."""
+    return shared_state.get(TELEMETRY_KEY_PREFIX + node)
@@ -55,12 +55,24 @@ const Lifecyclemgmt = () => {
         method: 'POST',
       });
       const data = await res.json();
-      if (res.ok) {
-        message.success('Diagnosis started successfully');
-        // Refresh the tar files list after successful execution
+      if (!res.ok) {
+        message.error(data.error || 'Failed to start diagnosis');
+        return;
+      }
+      message.success('Diagnosis started successfully');
+      // Collection runs as a background job; wait for it before refreshing the tar list
+      let job = data;
+      while (job.state !== 'succeeded' && job.state !== 'failed' && job.state !== 'cancelled') {
+        await new Promise((resolve) => setTimeout(resolve, 3000));
+        const statusRes = await fetch(`https://${hostIP}:2020/diagnostics/jobs/${data.job_id}`);
+        if (!statusRes.ok) throw new Error('diagnostic status request failed');
+        job = await statusRes.json();
+      }
+      if (job.state === 'succeeded') {
+        message.success('Diagnosis completed successfully');
         fetchTarFiles();
       } else {
-        message.error(data.error || 'Failed to start diagnosis');
+        message.error(job.message || 'Diagnosis failed');
       }
     } catch (error) {
       message.error('Failed to start diagnosis');